@@ -9,6 +9,7 @@ from pydantic import BaseModel, Field
 from fastapi import HTTPException
 import json
 from database import get_db
+from prompt_registry import prompt_registry
 import logging
 import os
 
@@ -66,6 +67,7 @@ async def create_prompt(request: Request, request_data: PromptCreate = Body(...)
     try:
         logger.debug(f"请求头: {request.headers}")
         new_id = str(uuid.uuid4())
+        created_at = datetime.now().isoformat()
         with get_db() as conn:
             logger.debug("获取数据库连接成功")
             cursor = conn.cursor()
@@ -81,16 +83,17 @@ async def create_prompt(request: Request, request_data: PromptCreate = Body(...)
                 request_data.scope,
                 request_data.task,
                 json.dumps(request_data.templates),
-                datetime.now().isoformat()
+                created_at
             ))
             conn.commit()
             logger.info("数据插入成功，ID: %s", new_id)
+        prompt_registry.refresh(new_id)
 
         # 构造响应数据
         return {
             "id": new_id,
             **request_data.dict(),
-            "created_at": datetime.now().isoformat()
+            "created_at": created_at
         }
 
     except Exception as e:
@@ -120,6 +123,7 @@ async def update_prompt(prompt_id: str, request_data: PromptUpdate = Body(...)):
             prompt_id
         ))
         conn.commit()
+    prompt_registry.refresh(prompt_id)
     return {"status": "success"}
 
 # 异常处理器需要注册到FastAPI app实例，而不是APIRouter
@@ -135,41 +139,10 @@ async def update_prompt(prompt_id: str, request_data: PromptUpdate = Body(...)):
 
 # 删除调试语句 
 
-def format_predefined(prompt):
-    return {
-        "id": prompt["id"],
-        "title": prompt["title"],
-        "content": prompt["content"],
-        "model_type": prompt.get("model_type") or prompt.get("modelType"),  # 兼容新旧字段
-        "scope": "team",
-        "isLibrary": True
-    }
-
 @app.get("/api/prompts")
 async def list_prompts():
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM prompts")
-        user_prompts = [format_prompt(row) for row in cursor.fetchall()]
-        
-        from main import PREDEFINED_PROMPTS
-        return {
-            "defaultPrompts": [format_predefined(p) for p in PREDEFINED_PROMPTS],
-            "userPrompts": user_prompts
-        }
-
-def format_prompt(row):
-    return {
-        "id": row[0],
-        "title": row[1],
-        "content": row[2],
-        "model_type": row[3],
-        "scope": row[4],
-        "task": row[5],
-        "templates": json.loads(row[6] or '[]'),
-        "created_at": row[7],
-        "isLibrary": False
-    }
+    # 直接读取内存索引，不再逐次查询数据库
+    return prompt_registry.list_prompts()
 
 @app.post("/api/categories")
 async def create_category(category: CategoryCreate):
@@ -189,5 +162,6 @@ async def delete_prompt(prompt_id: str):
         # 执行删除
         cursor.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
         conn.commit()
+    prompt_registry.remove(prompt_id)
         
     return {"status": "success", "deleted_id": prompt_id} 
\ No newline at end of file
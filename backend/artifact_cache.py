@@ -0,0 +1,242 @@
+import os
+import zlib
+import struct
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from upload_store import artifact_path, hash_file
+from utils.text_extraction import SEGMENT_SEPARATOR, iter_segments
+
+logger = logging.getLogger(__name__)
+
+# 文件格式: MAGIC | 条目数(uint32) | 页码(int32数组, -1表示无) | UTF-8字节长度(uint32数组) | zlib压缩的正文
+MAGIC = b"DBRX1"
+_HEADER = struct.Struct("<5sI")
+
+# 进程内保留最近使用的产物数
+MEMORY_CACHE_SIZE = int(os.getenv("ARTIFACT_MEMORY_CACHE_SIZE", "32"))
+
+# 进程内保留的文件路径→内容哈希条目数
+PATH_HASH_CACHE_SIZE = int(os.getenv("ARTIFACT_PATH_HASH_CACHE_SIZE", "1024"))
+
+
+@dataclass(frozen=True)
+class ChunkConfig:
+    chunk_size: int = 1000
+    chunk_overlap: int = 200
+    separators: Optional[Tuple[str, ...]] = None
+    per_page: bool = True  # PDF按页分块（保留页码）
+
+    @property
+    def key(self) -> str:
+        raw = repr((self.chunk_size, self.chunk_overlap, self.separators, self.per_page))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+    def splitter(self) -> RecursiveCharacterTextSplitter:
+        kwargs = {"chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap, "length_function": len}
+        if self.separators:
+            kwargs["separators"] = list(self.separators)
+        return RecursiveCharacterTextSplitter(**kwargs)
+
+
+# 检索/问答使用的默认分块
+DEFAULT_CHUNKS = ChunkConfig()
+# PDF翻译使用的较小分块
+TRANSLATION_CHUNKS = ChunkConfig(
+    chunk_size=800,
+    chunk_overlap=50,
+    separators=("\n\n", "\n", "。", ".", "；", ";", "，", ",", "！", "!", "？", "?")
+)
+# 单次摘要请求的输入token上限（Ollama默认上下文较小，需留出提示词和输出空间）
+SUMMARY_INPUT_TOKENS = int(os.getenv("SUMMARY_INPUT_TOKENS", "3000"))
+# 分层摘要使用的大分块（跨页合并，减少摘要请求数）；
+# 中日韩文字约一个字一个token，分块字符数按token预算取，保证中文片段也不超出预算
+SUMMARY_CHUNKS = ChunkConfig(chunk_size=SUMMARY_INPUT_TOKENS, chunk_overlap=0, per_page=False)
+
+
+@dataclass
+class TextRecords:
+    """一组文本及其页码，按需解压"""
+    pages: array
+    lengths: array
+    _compressed: bytes = field(repr=False, default=b"")
+    _texts: Optional[List[str]] = field(repr=False, default=None)
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @property
+    def texts(self) -> List[str]:
+        if self._texts is None:
+            data = zlib.decompress(self._compressed)
+            texts, start = [], 0
+            for length in self.lengths:
+                texts.append(data[start:start + length].decode("utf-8"))
+                start += length
+            self._texts = texts
+            self._compressed = b""
+        return self._texts
+
+    def page(self, i: int) -> Optional[int]:
+        return None if self.pages[i] < 0 else self.pages[i]
+
+    def items(self) -> List[dict]:
+        return [{"text": text, "page": self.page(i)} for i, text in enumerate(self.texts)]
+
+    def joined(self, separator: str = SEGMENT_SEPARATOR) -> str:
+        return separator.join(self.texts)
+
+
+def write_records(path: Path, texts: List[str], pages: List[Optional[int]]):
+    encoded = [t.encode("utf-8") for t in texts]
+    page_array = array("i", (-1 if p is None else p for p in pages))
+    length_array = array("I", (len(b) for b in encoded))
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(encoded)))
+        f.write(page_array.tobytes())
+        f.write(length_array.tobytes())
+        f.write(zlib.compress(b"".join(encoded), 6))
+    os.replace(tmp, path)
+
+
+def read_records(path: Path) -> TextRecords:
+    with open(path, "rb") as f:
+        magic, count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Unrecognized artifact format: {path}")
+        pages = array("i")
+        pages.frombytes(f.read(count * pages.itemsize))
+        lengths = array("I")
+        lengths.frombytes(f.read(count * lengths.itemsize))
+        return TextRecords(pages=pages, lengths=lengths, _compressed=f.read())
+
+
+class ArtifactCache:
+    """
+    按内容哈希缓存的提取文本与分块结果
+    首次访问时解析并落盘，之后所有功能（问答、对话、翻译、摘要、入库）直接复用
+    """
+
+    def __init__(self, memory_size: int = MEMORY_CACHE_SIZE):
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[Tuple[str, str], TextRecords]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._path_hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+
+    def _remember(self, key, records: TextRecords) -> TextRecords:
+        with self._lock:
+            self._memory[key] = records
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+        return records
+
+    def _load_or_build(self, key: Tuple[str, str], path: Optional[Path], build) -> TextRecords:
+        """path为None时只缓存在内存中，不落盘"""
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                return cached
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # 同一产物只构建一次
+        try:
+            with key_lock:
+                with self._lock:
+                    cached = self._memory.get(key)
+                if cached is not None:
+                    return cached
+                if path is None:
+                    texts, pages = build()
+                    return self._remember(key, TextRecords(
+                        pages=array("i", (-1 if p is None else p for p in pages)),
+                        lengths=array("I", (len(t.encode("utf-8")) for t in texts)),
+                        _texts=texts,
+                    ))
+                if not path.exists():
+                    texts, pages = build()
+                    write_records(path, texts, pages)
+                    logger.info(f"已生成产物: {path}")
+                return self._remember(key, read_records(path))
+        finally:
+            # 构建完成后释放该键的锁，避免锁表随键无限增长
+            with self._lock:
+                if self._key_locks.get(key) is key_lock and not key_lock.locked():
+                    del self._key_locks[key]
+
+    def hash_for_path(self, file_path: str) -> str:
+        """文件的内容哈希（按路径、大小和修改时间缓存）"""
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            content_hash = self._path_hashes.get(key)
+            if content_hash is not None:
+                self._path_hashes.move_to_end(key)
+                return content_hash
+        content_hash = hash_file(file_path)
+        with self._lock:
+            self._path_hashes[key] = content_hash
+            while len(self._path_hashes) > PATH_HASH_CACHE_SIZE:
+                self._path_hashes.popitem(last=False)
+        return content_hash
+
+    def segments(self, content_hash: str, file_path: str, filename: Optional[str] = None) -> TextRecords:
+        """提取后的分段文本（PDF为逐页；保留空段落，使拼接后的全文保留段落间的空行）"""
+        def build():
+            segments = list(iter_segments(file_path, filename or file_path, skip_empty=False))
+            return [s.text for s in segments], [s.page for s in segments]
+        return self._load_or_build(
+            (content_hash, "segments"), artifact_path(content_hash, "segments.bin"), build
+        )
+
+    def text(self, content_hash: str, file_path: str, filename: Optional[str] = None) -> str:
+        return self.segments(content_hash, file_path, filename).joined()
+
+    def chunks(
+        self,
+        content_hash: str,
+        file_path: str,
+        filename: Optional[str] = None,
+        config: ChunkConfig = DEFAULT_CHUNKS,
+    ) -> TextRecords:
+        """按分块配置缓存的分块结果"""
+        def build():
+            segments = self.segments(content_hash, file_path, filename)
+            splitter = config.splitter()
+            texts, pages = [], []
+            if config.per_page and len(segments) and segments.page(0) is not None:
+                for i, segment_text in enumerate(segments.texts):
+                    for chunk in splitter.split_text(segment_text):
+                        texts.append(chunk)
+                        pages.append(segments.page(i))
+            else:
+                texts = splitter.split_text(segments.joined())
+                pages = [None] * len(texts)
+            return texts, pages
+        return self._load_or_build(
+            (content_hash, f"chunks-{config.key}"), artifact_path(content_hash, f"chunks-{config.key}.bin"), build
+        )
+
+    def text_chunks(self, text: str, config: ChunkConfig = DEFAULT_CHUNKS) -> TextRecords:
+        """
+        直接传入的文本（如Word当前文档）按文本哈希缓存分块
+        每次编辑都是新文本，只保留在内存LRU中，不落盘
+        """
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+        def build():
+            chunks = config.splitter().split_text(text)
+            return chunks, [None] * len(chunks)
+        return self._load_or_build((content_hash, f"text-chunks-{config.key}"), None, build)
+
+
+# 单例实例
+artifact_cache = ArtifactCache()
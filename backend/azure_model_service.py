@@ -1,23 +1,53 @@
 import os
+import time
+import random
+import asyncio
 import logging
-from typing import Optional, Dict, Any
-from openai import AsyncAzureOpenAI
+from typing import Optional, Dict, Any, List
+import httpx
+from openai import (
+    AsyncAzureOpenAI,
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+)
 from fastapi import HTTPException
+from usage_tracking import preflight, usage_tracker
 
 logger = logging.getLogger(__name__)
 
+# 可重试的HTTP状态码（限流与服务端临时错误）
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# 单次批量请求的提示词数上限
+AZURE_MAX_BATCH_PROMPTS = int(os.getenv("AZURE_MAX_BATCH_PROMPTS", "500"))
+
 class AzureModelService:
-    def __init__(self):
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
         self._client = None
         self._initialized = False
-        
-    async def initialize(self):
-        """异步初始化客户端"""
+        self.max_concurrency = max_concurrency or int(os.getenv("AZURE_MAX_CONCURRENCY", "8"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("AZURE_MAX_RETRIES", "5"))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # 所有调用（单条与批量、多个并发请求）共用同一个并发上限，对应同一个限流的部署
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def initialize(self, http_client: Optional[httpx.AsyncClient] = None):
+        """异步初始化客户端（http_client可用于指向本地模拟服务）"""
         try:
             self._client = AsyncAzureOpenAI(
                 api_key=os.getenv("AZURE_API_KEY"),
                 api_version=os.getenv("AZURE_API_VERSION", "2024-05-01-preview"),
                 azure_endpoint=os.getenv("AZURE_API_BASE"),
+                # 重试由本服务统一处理，避免与SDK内置重试叠加
+                max_retries=0,
+                http_client=http_client,
             )
             self._initialized = True
             logger.info("Azure model service initialized successfully")
@@ -26,40 +56,129 @@ class AzureModelService:
             self._initialized = False
             raise
 
+    def _retry_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """
+        计算退避时间：带抖动的指数退避，并遵守Retry-After
+        服务端要求的等待时间超过backoff_max时返回None，不提前重试
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after_ms = response.headers.get("retry-after-ms")
+            retry_after = response.headers.get("retry-after")
+            requested = None
+            try:
+                if retry_after_ms is not None:
+                    requested = float(retry_after_ms) / 1000
+                elif retry_after is not None:
+                    requested = float(retry_after)
+            except ValueError:
+                pass
+            if requested is not None:
+                if requested > self.backoff_max:
+                    return None
+                delay = max(delay, requested)
+        return delay
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (APITimeoutError, APIConnectionError)):
+            return True
+        if isinstance(error, APIStatusError):
+            return error.status_code in RETRYABLE_STATUS_CODES
+        return False
+
+    async def _complete(
+        self,
+        prompt: str,
+        model_type: str,
+        max_tokens: int,
+        temperature: float,
+        endpoint: str,
+        overflow_policy: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """发送单次请求，对限流和临时错误按退避策略重试"""
+        prompt, _ = preflight(prompt, model_type, max_tokens, policy=overflow_policy)
+        attempt = 0
+        while True:
+            try:
+                # 只在请求期间占用并发名额，退避等待时释放
+                async with self._semaphore:
+                    started_at = time.perf_counter()
+                    response = await self._client.chat.completions.create(
+                        model=model_type,
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        **kwargs
+                    )
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    logger.warning(f"Azure API要求的等待时间超过 {self.backoff_max}s，不再重试")
+                    raise
+                attempt += 1
+                logger.warning(
+                    f"Azure API call failed ({type(e).__name__}), "
+                    f"retry {attempt}/{self.max_retries} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            latency_ms = (time.perf_counter() - started_at) * 1000
+            usage_tracker.record(
+                endpoint,
+                model_type,
+                response.usage.prompt_tokens,
+                response.usage.completion_tokens,
+                latency_ms
+            )
+            return {
+                "response": response.choices[0].message.content,
+                "model": model_type,
+                "usage": {
+                    "prompt_tokens": response.usage.prompt_tokens,
+                    "completion_tokens": response.usage.completion_tokens,
+                    "total_tokens": response.usage.total_tokens
+                },
+                "latency_ms": round(latency_ms, 1),
+                "attempts": attempt + 1
+            }
+
     async def generate_response(
         self,
         prompt: str,
         model_type: str = "gpt-4o",
         max_tokens: int = 1000,
         temperature: float = 0.7,
+        endpoint: str = "azure",
+        overflow_policy: str = "truncate",
         **kwargs
     ) -> Dict[str, Any]:
         """
         调用Azure OpenAI生成响应
         参数与本地模型接口保持一致
+        endpoint用于用量统计，overflow_policy为超长提示词的处理方式(truncate/reject)
         """
         if not self._initialized:
             await self.initialize()
-            
+
         try:
-            response = await self._client.chat.completions.create(
-                model=model_type,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=max_tokens,
-                temperature=temperature,
-                **kwargs
+            return await self._complete(
+                prompt, model_type, max_tokens, temperature, endpoint, overflow_policy, **kwargs
+            )
+        except HTTPException:
+            raise
+        except APIStatusError as e:
+            logger.error(f"Azure API call failed: {str(e)}")
+            # 保留上游状态码（如429），便于调用方区分限流
+            raise HTTPException(
+                status_code=e.status_code if e.status_code in RETRYABLE_STATUS_CODES else 500,
+                detail=f"Azure API Error: {str(e)}"
             )
-            
-            return {
-                "response": response.choices[0].message.content,
-                "model": model_type,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                }
-            }
-            
         except Exception as e:
             logger.error(f"Azure API call failed: {str(e)}")
             raise HTTPException(
@@ -67,6 +186,47 @@ class AzureModelService:
                 detail=f"Azure API Error: {str(e)}"
             )
 
+    async def generate_batch(
+        self,
+        prompts: List[str],
+        model_type: str = "gpt-4o",
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+        concurrency: Optional[int] = None,
+        endpoint: str = "azure-batch",
+        overflow_policy: str = "truncate",
+        **kwargs
+    ) -> List[Dict[str, Any]]:
+        """
+        批量生成：所有调用共用服务级并发上限，concurrency可进一步限制本批次的并发数
+        结果与输入顺序一致，单条失败以error字段返回，不影响其他条目
+        """
+        if not self._initialized:
+            await self.initialize()
+
+        semaphore = asyncio.Semaphore(min(concurrency or self.max_concurrency, self.max_concurrency))
+
+        async def run(index: int, prompt: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    result = await self._complete(
+                        prompt, model_type, max_tokens, temperature, endpoint, overflow_policy, **kwargs
+                    )
+                    return {"index": index, "status": "success", **result}
+                except Exception as e:
+                    logger.error(f"Batch item {index} failed: {str(e)}")
+                    return {
+                        "index": index,
+                        "status": "error",
+                        "error": {
+                            "type": type(e).__name__,
+                            "status_code": getattr(e, "status_code", None),
+                            "message": getattr(e, "detail", None) or str(e)
+                        }
+                    }
+
+        return await asyncio.gather(*(run(i, p) for i, p in enumerate(prompts)))
+
 # 单例服务实例
 azure_service = AzureModelService()
 
@@ -74,4 +234,4 @@ async def get_azure_service():
     """获取Azure服务实例的依赖函数"""
     if not azure_service._initialized:
         await azure_service.initialize()
-    return azure_service 
\ No newline at end of file
+    return azure_service
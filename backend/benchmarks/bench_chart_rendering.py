@@ -0,0 +1,120 @@
+"""
+并发图表渲染负载测试
+
+legacy-inline:  旧实现，在async处理函数中直接用pyplot绘图（阻塞事件循环）
+legacy-threads: 旧的pyplot绘图放到线程中执行（共享pyplot全局状态）
+pool:           chart_rendering.chart_renderer，线程池 + 面向对象的Figure/Agg接口
+
+同时发起N个渲染请求（交替两种图表），报告吞吐、延迟、事件循环最大停顿，
+以及与串行渲染结果不一致（被其他请求的图形污染）或失败的请求数
+
+用法（在 backend/ 目录下）:
+    python benchmarks/bench_chart_rendering.py
+    python benchmarks/bench_chart_rendering.py --requests 64 --rows 200000 --workers 8
+"""
+import io
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import matplotlib  # noqa: E402
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from chart_rendering import ChartRenderer, render_chart  # noqa: E402
+from utils.chart_data import prepare_chart_data  # noqa: E402
+
+CONFIGS = [
+    {"chartType": "line", "xAxis": "t", "yAxis": "value"},
+    {"chartType": "bar", "xAxis": "site", "yAxis": "value", "aggregation": "mean"},
+]
+
+
+def legacy_render(df: pd.DataFrame, config: dict) -> bytes:
+    x, y = config["xAxis"], config["yAxis"]
+    df = prepare_chart_data(df, config["chartType"], x, y, aggregation=config.get("aggregation"))
+    plt.figure(figsize=(10, 6))
+    if config["chartType"] == "bar":
+        df.plot.bar(x=x, y=y, ax=plt.gca())
+    else:
+        df.plot.line(x=x, y=y, ax=plt.gca())
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format="png", bbox_inches="tight")
+    plt.close()
+    return buffer.getvalue()
+
+
+async def heartbeat(stop: asyncio.Event, lags: list, interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run_mode(mode: str, df: pd.DataFrame, requests: int, workers: int, references: dict):
+    renderer = ChartRenderer(workers=workers, timeout=300, max_pending=requests)
+    render = legacy_render if mode.startswith("legacy") else render_chart
+
+    async def one(i: int):
+        config = CONFIGS[i % len(CONFIGS)]
+        started = time.perf_counter()
+        try:
+            if mode == "legacy-inline":
+                content = legacy_render(df, config)
+            elif mode == "legacy-threads":
+                content = await asyncio.to_thread(legacy_render, df, config)
+            else:
+                content = await renderer.run(render, df, config)
+        except Exception:
+            return time.perf_counter() - started, "failed"
+        ok = content == references[(render, i % len(CONFIGS))]
+        return time.perf_counter() - started, "ok" if ok else "corrupted"
+
+    stop, lags = asyncio.Event(), []
+    beat = asyncio.create_task(heartbeat(stop, lags))
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await beat
+    latencies = sorted(r[0] for r in results)
+    bad = sum(1 for r in results if r[1] != "ok")
+    print(f"{mode:<15} {requests / elapsed:>6.1f} 图/s  p50 {statistics.median(latencies) * 1000:>7.0f} ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:>7.0f} ms  "
+          f"循环最大停顿 {max(lags) * 1000:>7.0f} ms  异常/不一致 {bad}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "t": np.arange(args.rows),
+        "site": rng.integers(1, 41, args.rows),
+        "value": np.cumsum(rng.normal(size=args.rows)),
+    })
+    # 串行渲染的结果作为基准
+    references = {}
+    for i, config in enumerate(CONFIGS):
+        references[(legacy_render, i)] = legacy_render(df, config)
+        references[(render_chart, i)] = render_chart(df, config)
+
+    print(f"{args.requests} 个并发请求，{args.rows} 行数据，{args.workers} 个渲染线程")
+    for mode in ("legacy-inline", "legacy-threads", "pool"):
+        asyncio.run(run_mode(mode, df, args.requests, args.workers, references))
+
+
+if __name__ == "__main__":
+    main()
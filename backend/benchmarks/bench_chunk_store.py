@@ -0,0 +1,125 @@
+"""
+分块文本存储的常驻内存对比
+
+docstore:   FAISS默认方式，每个分块一个Document对象放在dict中，另有 行号→ID 的dict
+chunkstore: chunk_store.ChunkStore，文本在内存映射文件中，索引为数组，检索时只读取命中的分块
+
+每种方式在独立子进程中加载N个分块并执行随机top-k读取，报告进程常驻内存(RSS)
+chunkstore读取后增加的主要是映射的文件页（RssFile），属于页缓存，内存紧张时由系统回收
+
+用法（在 backend/ 目录下）:
+    python benchmarks/bench_chunk_store.py                      # 100万个分块，每块约600字符
+    python benchmarks/bench_chunk_store.py --chunks 200000 --chars 1000
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+import subprocess
+import tempfile
+from array import array
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+LOREM = (
+    "The primary efficacy endpoint was the change from baseline in HbA1c at week 26. "
+    "受试者在治疗期间的不良事件发生率与安慰剂组相当。 "
+) * 20
+
+
+def chunk_text(i: int, chars: int) -> str:
+    start = i % 97
+    return f"[{i}] " + LOREM[start:start + chars]
+
+
+def rss_mb() -> dict:
+    """进程常驻内存：anon为私有堆内存，file为映射的文件页（可被系统回收的页缓存）"""
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                values[key] = int(rest.split()[0]) / 1024
+    return {"rss": values["VmRSS"], "anon": values.get("RssAnon", 0.0), "file": values.get("RssFile", 0.0)}
+
+
+def describe(before: dict, after: dict) -> str:
+    return (f"RSS {after['rss'] - before['rss']:>8.1f} MB "
+            f"(anon {after['anon'] - before['anon']:>8.1f}, file {after['file'] - before['file']:>7.1f})")
+
+
+def fetch_random(lookup, total: int, queries: int, k: int = 4) -> float:
+    rng = random.Random(0)
+    started = time.perf_counter()
+    for _ in range(queries):
+        for row in rng.sample(range(total), k):
+            lookup(row)
+    return (time.perf_counter() - started) / queries * 1000
+
+
+def run_docstore(chunks: int, chars: int, queries: int):
+    from langchain_core.documents import Document
+    baseline = rss_mb()
+    docstore, index_to_id = {}, {}
+    for i in range(chunks):
+        doc_id = str(uuid.uuid4())
+        docstore[doc_id] = Document(page_content=chunk_text(i, chars), metadata={"content_hash": "0" * 64, "page": i})
+        index_to_id[i] = doc_id
+    loaded = rss_mb()
+    ms = fetch_random(lambda row: docstore[index_to_id[row]].page_content, chunks, queries)
+    print(f"docstore    loaded {describe(baseline, loaded)}  after reads {describe(baseline, rss_mb())}  "
+          f"top-4 fetch {ms:.3f} ms")
+
+
+def run_chunkstore(directory: str, chunks: int, queries: int):
+    from chunk_store import ChunkStore, ChunkStoreDocstore, IndexToDocstoreId
+    baseline = rss_mb()
+    store = ChunkStore(directory)
+    mapping = IndexToDocstoreId(array("Q", range(chunks)))
+    docstore = ChunkStoreDocstore(store)
+    loaded = rss_mb()
+    ms = fetch_random(lambda row: docstore.search(mapping[row]).page_content, chunks, queries)
+    print(f"chunkstore  loaded {describe(baseline, loaded)}  after reads {describe(baseline, rss_mb())}  "
+          f"top-4 fetch {ms:.3f} ms  data file {os.path.getsize(store.data_path) / 1e6:.1f} MB")
+
+
+def build_store(directory: str, chunks: int, chars: int, per_document: int = 500):
+    from chunk_store import ChunkStore
+    store = ChunkStore(directory)
+    for doc in range(0, chunks, per_document):
+        content_hash = f"{doc:064x}"
+        store.append(content_hash, ((chunk_text(i, chars), None) for i in range(doc, min(doc + per_document, chunks))))
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--chars", type=int, default=600)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--mode", choices=["docstore", "chunkstore"], help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode == "docstore":
+        return run_docstore(args.chunks, args.chars, args.queries)
+    if args.mode == "chunkstore":
+        return run_chunkstore(args.dir, args.chunks, args.queries)
+
+    print(f"{args.chunks} 个分块，每块约 {args.chars} 字符，{args.queries} 次随机top-4读取")
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        build_store(directory, args.chunks, args.chars)
+        print(f"chunkstore 写入耗时 {time.perf_counter() - started:.1f}s")
+        common = [sys.executable, __file__, "--chunks", str(args.chunks), "--chars", str(args.chars),
+                  "--queries", str(args.queries)]
+        # 每种方式在独立进程中运行，避免相互影响RSS
+        subprocess.run(common + ["--mode", "docstore"], check=True)
+        subprocess.run(common + ["--mode", "chunkstore", "--dir", directory], check=True)
+
+
+if __name__ == "__main__":
+    main()
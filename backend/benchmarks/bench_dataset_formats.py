@@ -0,0 +1,88 @@
+"""
+数据集响应格式的序列化耗时与体积对比（宽表临床数据）
+
+legacy:  旧实现，DataFrame.to_dict('records') 后由FastAPI的jsonable_encoder和JSONResponse输出
+records: utils.table_response 的records格式（NumPy整列转换 + json.dumps）
+columns: 列式JSON {列: [值, ...]}
+arrow:   Arrow IPC流
+
+用法（在 backend/ 目录下）:
+    python benchmarks/bench_dataset_formats.py                  # 20000行 × 200列
+    python benchmarks/bench_dataset_formats.py --rows 5000 --columns 400
+"""
+import sys
+import gzip
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import pyarrow as pa  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from utils.table_response import _iter_arrow_stream, table_response  # noqa: E402
+
+
+def clinical_table(rows: int, columns: int) -> pa.Table:
+    """实验室检查宽表：受试者/访视信息 + 大量数值检查项（含缺失）+ 部分文本和日期列"""
+    rng = np.random.default_rng(0)
+    data = {
+        "subject_id": [f"S{i // 10:06d}" for i in range(rows)],
+        "visit": rng.integers(1, 13, rows),
+        "visit_date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+        "arm": rng.choice(["Placebo", "Low dose", "High dose"], rows),
+    }
+    for i in range(columns - len(data)):
+        if i % 10 == 9:
+            data[f"flag_{i}"] = rng.choice(["N", "H", "L", None], rows)
+        else:
+            values = rng.normal(100, 15, rows).round(2)
+            values[rng.random(rows) < 0.05] = np.nan
+            data[f"lab_{i}"] = values
+    return pa.Table.from_pandas(pd.DataFrame(data), preserve_index=False)
+
+
+def legacy_body(table: pa.Table) -> bytes:
+    df = table.to_pandas()
+    # 旧上传接口对浮点列的处理：NaN替换为None
+    for column in df.select_dtypes(include=['float64']).columns:
+        df[column] = df[column].astype(object).where(pd.notnull(df[column]), None)
+    records = df.to_dict("records")
+    return JSONResponse(content=jsonable_encoder({"data": records})).body
+
+
+def new_body(table: pa.Table, fmt: str) -> bytes:
+    if fmt == "arrow":
+        return b"".join(_iter_arrow_stream(table))
+    return table_response(table, fmt).body
+
+
+def measure(name: str, build, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = build()
+        timings.append(time.perf_counter() - started)
+    print(f"{name:<8} {min(timings) * 1000:>9.0f} ms  {len(body) / 1e6:>8.1f} MB  "
+          f"gzip {len(gzip.compress(body, 1)) / 1e6:>7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--columns", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    table = clinical_table(args.rows, args.columns)
+    print(f"{args.rows} 行 × {table.num_columns} 列，取{args.repeat}次中的最短耗时")
+    measure("legacy", lambda: legacy_body(table), args.repeat)
+    for fmt in ("records", "columns", "arrow"):
+        measure(fmt, lambda: new_body(table, fmt), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
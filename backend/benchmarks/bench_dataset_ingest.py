@@ -0,0 +1,118 @@
+"""
+CSV数据集导入的耗时与内存峰值基准
+
+legacy:    旧实现，整个文件读入内存并解码为字符串，pandas解析后逐列替换无限值
+streaming: dataset_registry.write_csv_as_parquet，pyarrow分块解析并流式写为Parquet
+
+每种方式在独立子进程中运行，报告耗时和进程峰值常驻内存(ru_maxrss)
+
+用法（在 backend/ 目录下）:
+    python benchmarks/bench_dataset_ingest.py                    # 生成1GB的临床数据CSV
+    python benchmarks/bench_dataset_ingest.py --size-mb 200 --memory-limit-mb 256
+    python benchmarks/bench_dataset_ingest.py --csv listing.csv  # 使用已有文件
+"""
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+HEADER = "subject_id,site,visit,visit_date,arm,weight_kg,sbp,dbp,alt,ast,hba1c,adverse_event,comment\n"
+
+
+def generate_csv(path: str, size_mb: int):
+    rng = random.Random(0)
+    arms = ["Placebo", "Low dose", "High dose"]
+    events = ["", "Headache", "Nausea", "Dizziness", "Fatigue"]
+    target = size_mb * 1024 * 1024
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HEADER)
+        row = 0
+        while f.tell() < target:
+            lines = []
+            for _ in range(10000):
+                weight = "inf" if row % 100003 == 0 else f"{rng.uniform(45, 120):.1f}"
+                hba1c = "NA" if row % 17 == 0 else f"{rng.uniform(5, 11):.2f}"
+                lines.append(
+                    f"S{row // 12:07d},{row % 40 + 1},{row % 12 + 1},2024-{row % 12 + 1:02d}-{row % 28 + 1:02d},"
+                    f"{arms[row % 3]},{weight},{rng.randint(95, 180)},{rng.randint(55, 110)},"
+                    f"{rng.randint(5, 200)},{rng.randint(5, 200)},{hba1c},{events[row % 5]},"
+                    f"\"visit {row % 12 + 1}, no deviations\"\n"
+                )
+                row += 1
+            f.write("".join(lines))
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_legacy(csv_path: str):
+    import numpy as np
+    import pandas as pd
+    started = time.perf_counter()
+    with open(csv_path, "rb") as f:
+        content = f.read()
+    df = pd.read_csv(
+        io.StringIO(content.decode('utf-8')),
+        low_memory=False,
+        na_values=['NA', 'N/A', ''],
+        dtype_backend='numpy_nullable'
+    )
+    for column in df.select_dtypes(include=['float64']).columns:
+        df[column] = df[column].replace([np.inf, -np.inf], np.nan)
+        df[column] = df[column].where(pd.notnull(df[column]), None)
+    print(f"legacy     {time.perf_counter() - started:>7.1f}s  {len(df):>10} 行  峰值RSS {peak_rss_mb():>8.0f} MB")
+
+
+def run_streaming(csv_path: str, memory_limit: int):
+    from dataset_registry import write_csv_as_parquet
+    with tempfile.TemporaryDirectory() as directory:
+        target = os.path.join(directory, "out.parquet")
+        started = time.perf_counter()
+        rows, _ = write_csv_as_parquet(csv_path, target, memory_limit=memory_limit)
+        elapsed = time.perf_counter() - started
+        print(f"streaming  {elapsed:>7.1f}s  {rows:>10} 行  峰值RSS {peak_rss_mb():>8.0f} MB  "
+              f"Parquet {os.path.getsize(target) / 1e6:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--csv", help="使用已有的CSV文件")
+    parser.add_argument("--memory-limit-mb", type=int, default=512)
+    parser.add_argument("--skip-legacy", action="store_true", help="旧实现内存不足时跳过")
+    parser.add_argument("--mode", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode == "legacy":
+        return run_legacy(args.csv)
+    if args.mode == "streaming":
+        return run_streaming(args.csv, args.memory_limit_mb * 1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = args.csv
+        if not csv_path:
+            csv_path = os.path.join(directory, "listing.csv")
+            started = time.perf_counter()
+            generate_csv(csv_path, args.size_mb)
+            print(f"生成CSV耗时 {time.perf_counter() - started:.1f}s")
+        print(f"CSV {os.path.getsize(csv_path) / 1e6:.0f} MB，内存上限 {args.memory_limit_mb} MB")
+        common = [sys.executable, __file__, "--csv", csv_path, "--memory-limit-mb", str(args.memory_limit_mb)]
+        # 每种方式在独立进程中运行，峰值内存互不影响
+        if not args.skip_legacy:
+            result = subprocess.run(common + ["--mode", "legacy"])
+            if result.returncode != 0:
+                print(f"legacy     失败（退出码 {result.returncode}，通常是内存不足被系统终止）")
+        subprocess.run(common + ["--mode", "streaming"], check=True)
+
+
+if __name__ == "__main__":
+    main()
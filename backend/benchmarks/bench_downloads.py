@@ -0,0 +1,188 @@
+"""
+文件下载并发吞吐基准
+
+对比旧实现（f.read() 读入内存后返回 Response）与 utils.file_response.file_response
+在多个并发客户端下的吞吐（MB/s）、请求延迟和Python堆内存峰值
+
+用法（在 backend/ 目录下）:
+    python benchmarks/bench_downloads.py                         # 直接驱动ASGI应用，50MB文件，32个并发客户端
+    python benchmarks/bench_downloads.py --size-mb 200 --clients 64 --trace-memory
+    python benchmarks/bench_downloads.py --serve                 # 用uvicorn启动真实服务（含sendfile路径）
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import Response  # noqa: E402
+from utils.file_response import file_etag, file_response  # noqa: E402
+
+
+def build_app(directory: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/legacy/{filename}")
+    async def legacy(filename: str):
+        with open(os.path.join(directory, filename), "rb") as f:
+            content = f.read()
+        return Response(
+            content=content,
+            media_type="text/plain",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    @app.get("/downloads/{filename}")
+    async def download(filename: str, request: Request):
+        return file_response(request, os.path.join(directory, filename), "text/plain", filename=filename)
+
+    return app
+
+
+async def asgi_get(app, path: str, headers=None):
+    """直接调用ASGI应用并丢弃响应体，只统计字节数（不计入客户端缓冲的内存）"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "server": ("bench", 80), "client": ("127.0.0.1", 0),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+    received = 0
+    requested = False
+    never = asyncio.Event()
+
+    async def receive():
+        # 第一次返回空请求体，之后一直挂起（客户端不断开）
+        nonlocal requested
+        if requested:
+            await never.wait()
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+        elif message["type"] == "http.response.pathsend":
+            received += os.path.getsize(message["path"])
+
+    await app(scope, receive, send)
+    return received
+
+
+async def run_clients(fetch, clients: int, rounds: int):
+    latencies = []
+    total_bytes = 0
+
+    async def worker():
+        nonlocal total_bytes
+        for _ in range(rounds):
+            started = time.perf_counter()
+            total_bytes += await fetch()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    return total_bytes, time.perf_counter() - started, latencies
+
+
+def report(label: str, total_bytes: int, elapsed: float, latencies, peak_bytes=None):
+    latencies = sorted(latencies)
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)] if latencies else 0
+    line = (
+        f"{label:<24} {total_bytes / elapsed / 1e6:>9.1f} MB/s  "
+        f"p50 {statistics.median(latencies) * 1000:>8.1f} ms  p95 {p95 * 1000:>8.1f} ms"
+    )
+    if peak_bytes is not None:
+        line += f"  heap peak {peak_bytes / 1e6:>8.1f} MB"
+    print(line)
+
+
+async def bench_in_process(directory: str, filename: str, clients: int, rounds: int, trace_memory: bool):
+    app = build_app(directory)
+    cases = [
+        ("legacy (read+Response)", f"/legacy/{filename}", None),
+        ("file_response", f"/downloads/{filename}", None),
+        ("file_response Range 1MB", f"/downloads/{filename}", {"Range": "bytes=0-1048575"}),
+    ]
+    for label, url, headers in cases:
+        # tracemalloc本身开销很大，开启时吞吐数字仅供参考
+        if trace_memory:
+            tracemalloc.start()
+        total_bytes, elapsed, latencies = await run_clients(
+            lambda: asgi_get(app, url, headers), clients, rounds
+        )
+        peak = None
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        report(label, total_bytes, elapsed, latencies, peak)
+
+    etag = file_etag(os.stat(os.path.join(directory, filename)))
+    total_bytes, elapsed, latencies = await run_clients(
+        lambda: asgi_get(app, f"/downloads/{filename}", {"If-None-Match": etag}), clients, rounds * 10
+    )
+    report("If-None-Match (304)", total_bytes, elapsed, latencies)
+
+
+async def http_get(client: httpx.AsyncClient, url: str) -> int:
+    received = 0
+    async with client.stream("GET", url) as response:
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+    return received
+
+
+async def bench_server(directory: str, filename: str, clients: int, rounds: int, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(build_app(directory), port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        limits = httpx.Limits(max_connections=clients)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            for label, url in (("legacy (read+Response)", f"/legacy/{filename}"),
+                               ("file_response", f"/downloads/{filename}")):
+                total_bytes, elapsed, latencies = await run_clients(
+                    lambda: http_get(client, url), clients, rounds
+                )
+                report(label, total_bytes, elapsed, latencies)
+    finally:
+        server.should_exit = True
+        await task
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=2, help="每个客户端的下载次数")
+    parser.add_argument("--serve", action="store_true", help="通过uvicorn的真实HTTP连接测试")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--trace-memory", action="store_true", help="统计Python堆内存峰值")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = "translated_bench.txt"
+        with open(os.path.join(directory, filename), "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+        print(f"文件 {args.size_mb} MB，{args.clients} 个并发客户端，每个 {args.rounds} 次")
+        if args.serve:
+            asyncio.run(bench_server(directory, filename, args.clients, args.rounds, args.port))
+        else:
+            asyncio.run(bench_in_process(directory, filename, args.clients, args.rounds, args.trace_memory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+对比提示词布局对本地模型首token延迟(TTFT)的影响
+
+before: 可变内容插在固定指令中间（旧模板布局），每次都要重新计算整段指令
+after:  固定指令在前、内容在后，并设置keep_alive，Ollama可复用前缀的KV缓存
+
+用法（在 backend/ 目录下，需本地运行Ollama）:
+    python benchmarks/bench_prompt_prefix.py --model mistral:latest --runs 5
+"""
+import sys
+import time
+import json
+import argparse
+import statistics
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from prompt_registry import CompiledTemplate, PLACEHOLDER_PATTERN  # noqa: E402
+from prompt_templates import PREDEFINED_PROMPTS  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "Study ABC-{n}: randomized, double-blind, placebo-controlled phase 3 trial in {n}00 adults. "
+    "Primary endpoint met (p=0.0{n}). Treatment-emergent AEs in {n}2% of subjects." for n in range(1, 10)
+]
+
+
+def legacy_layout(content: str) -> str:
+    """还原旧布局：把含占位符的段落移回第一段之后"""
+    blocks = content.split("\n\n")
+    placeholder_blocks = [b for b in blocks if PLACEHOLDER_PATTERN.search(b)]
+    static_blocks = [b for b in blocks if not PLACEHOLDER_PATTERN.search(b)]
+    return "\n\n".join([static_blocks[0], *placeholder_blocks, *static_blocks[1:]])
+
+
+def time_to_first_token(client: httpx.Client, base_url: str, model: str, prompt: str, keep_alive):
+    payload = {"model": model, "prompt": prompt, "stream": True, "options": {"num_predict": 8}}
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    started = time.perf_counter()
+    ttft, final = None, {}
+    with client.stream("POST", f"{base_url}/api/generate", json=payload) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if ttft is None and chunk.get("response"):
+                ttft = time.perf_counter() - started
+            if chunk.get("done"):
+                final = chunk
+    return ttft or (time.perf_counter() - started), final.get("prompt_eval_count", 0)
+
+
+def run(layout: str, args, client: httpx.Client):
+    results = {}
+    for prompt in PREDEFINED_PROMPTS:
+        content = prompt["content"]
+        if layout == "before":
+            render, keep_alive = CompiledTemplate(legacy_layout(content)).render, None
+        else:
+            # 预定义模板已按固定指令在前、{text}在最后的顺序编写
+            render, keep_alive = CompiledTemplate(content).render, args.keep_alive
+        # 预热：确保模型已加载
+        time_to_first_token(client, args.base_url, args.model, render(text=SAMPLE_TEXTS[0]), keep_alive)
+        ttfts, evaluated = [], []
+        for i in range(args.runs):
+            text = SAMPLE_TEXTS[(i + 1) % len(SAMPLE_TEXTS)]
+            ttft, prompt_eval = time_to_first_token(client, args.base_url, args.model, render(text=text), keep_alive)
+            ttfts.append(ttft)
+            evaluated.append(prompt_eval)
+        results[prompt["id"]] = (ttfts, evaluated)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:11434")
+    parser.add_argument("--model", default="mistral:latest")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--keep-alive", default="30m")
+    args = parser.parse_args()
+
+    with httpx.Client(timeout=600) as client:
+        print(f"{'layout':<8} {'template':<16} {'median TTFT(ms)':>16} {'p95 TTFT(ms)':>13} {'prompt tokens evaluated':>24}")
+        for layout in ("before", "after"):
+            for template_id, (ttfts, evaluated) in run(layout, args, client).items():
+                ordered = sorted(ttfts)
+                p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+                print(
+                    f"{layout:<8} {template_id:<16} {statistics.median(ttfts) * 1000:>16.0f} "
+                    f"{p95 * 1000:>13.0f} {statistics.mean(evaluated):>24.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import os
+import time
+import asyncio
+import logging
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Set, Tuple
+from export_store import ExportStore, chat_export_key, export_store
+from utils.docx_export import build_chat_export, build_report
+from utils.file_response import READ_CHUNK_SIZE
+from utils.table_response import ChunkSink
+
+logger = logging.getLogger(__name__)
+
+# 批量导出时并行生成文档的进程数
+BULK_EXPORT_WORKERS = int(os.getenv("BULK_EXPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 单次批量导出的文档数上限
+MAX_BULK_EXPORTS = int(os.getenv("MAX_BULK_EXPORTS", "200"))
+
+ERRORS_ENTRY = "ERRORS.txt"
+DEFAULT_NAMES = {"report": "Compliance_Check_Report.docx", "chat": "ChatExport.docx"}
+
+
+def render_export_file(spec: Dict[str, Any], directory: str) -> str:
+    """子进程入口：生成一份文档并写入directory中的临时文件，返回其路径"""
+    if spec["type"] == "report":
+        doc = build_report(spec["content"])
+    else:
+        doc = build_chat_export(spec["messages"], spec["documentText"])
+    fd, path = tempfile.mkstemp(dir=directory, prefix=".export-bulk-", suffix=".docx")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            doc.save(out)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def entry_names(specs: List[Dict[str, Any]]) -> List[str]:
+    """按请求顺序确定归档内的文件名：去掉路径、补全.docx后缀，重名时加序号"""
+    names, used = [], set()
+    for i, spec in enumerate(specs):
+        name = os.path.basename((spec.get("fileName") or "").replace("\\", "/")).strip()
+        if not name:
+            name = f"{i + 1:03d}_{DEFAULT_NAMES[spec['type']]}"
+        if not name.lower().endswith(".docx"):
+            name += ".docx"
+        stem, n = name[:-5], 2
+        while name.lower() in used or name == ERRORS_ENTRY:
+            name, n = f"{stem} ({n}).docx", n + 1
+        used.add(name.lower())
+        names.append(name)
+    return names
+
+
+class BulkExporter:
+    """
+    批量导出：在进程池中并行生成文档，哪份先完成就先写入ZIP并发送；
+    同时生成的文档数不超过进程数，客户端读取慢时暂停提交，内存占用与文档总数无关。
+    聊天导出与 /api/export-chat 共用内容寻址的导出文件
+    """
+
+    def __init__(self, workers: int = BULK_EXPORT_WORKERS, store: ExportStore = export_store):
+        self.workers = workers
+        self.store = store
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def _render(self, spec: Dict[str, Any], in_use: Set[str]) -> Tuple[BinaryIO, Optional[str]]:
+        """
+        返回 (已打开的文档文件, 用完即删的临时文件路径)。
+        文件在返回前打开，之后导出目录被清理也不影响写入；复用的导出恰好被删除时重新生成。
+        in_use记录本次归档引用的导出文件名，生成新导出时不清理它们
+        """
+        key = chat_export_key(spec["messages"], spec["documentText"]) if spec["type"] == "chat" else None
+        if key is not None:
+            path = self.store.get(key)
+            if path is not None:
+                try:
+                    source = open(path, "rb")
+                except FileNotFoundError:
+                    logger.info(f"导出文件 {path.name} 已被清理，重新生成")
+                else:
+                    in_use.add(path.name)
+                    return source, None
+        self.store.export_dir.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        path = await loop.run_in_executor(self.executor, render_export_file, spec, str(self.store.export_dir))
+        try:
+            source = open(path, "rb")
+        except BaseException:
+            _unlink(path)
+            raise
+        if key is None:
+            return source, path
+        try:
+            target = await asyncio.to_thread(self.store.adopt, key, path, keep=in_use)
+        except OSError as e:
+            # 保存失败不影响本次导出，按临时文件处理
+            logger.warning(f"保存导出文件失败: {str(e)}")
+            return source, path
+        in_use.add(target.name)
+        return source, None
+
+    @staticmethod
+    async def _write_entry(archive: zipfile.ZipFile, sink: ChunkSink, name: str, source: BinaryIO) -> AsyncIterator[bytes]:
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.external_attr = 0o644 << 16
+        # DOCX本身已是压缩格式，直接存储；预先给出大小以便决定是否需要ZIP64
+        info.file_size = os.fstat(source.fileno()).st_size
+        with archive.open(info, "w") as entry:
+            while True:
+                chunk = await asyncio.to_thread(source.read, READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                entry.write(chunk)
+                yield sink.take()
+        yield sink.take()
+
+    async def stream(self, specs: List[Dict[str, Any]], names: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+        """生成ZIP字节流；失败的文档不中断归档，汇总写入ERRORS.txt"""
+        names = names or entry_names(specs)
+        sink = ChunkSink()
+        archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+        pending: Dict[asyncio.Future, int] = {}
+        queued = iter(range(len(specs)))
+        errors: List[str] = []
+        in_use: Set[str] = set()
+
+        def submit():
+            while len(pending) < self.workers:
+                i = next(queued, None)
+                if i is None:
+                    return
+                pending[asyncio.ensure_future(self._render(specs[i], in_use))] = i
+
+        def release(source: BinaryIO, temporary: Optional[str]):
+            source.close()
+            if temporary:
+                _unlink(temporary)
+
+        def discard(future: asyncio.Future):
+            if not future.cancelled() and future.exception() is None:
+                release(*future.result())
+
+        try:
+            submit()
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    i = pending.pop(future)
+                    try:
+                        source, temporary = future.result()
+                    except Exception as e:
+                        logger.error(f"批量导出第{i + 1}份文档失败: {str(e)}")
+                        errors.append(f"{names[i]}: {str(e)}")
+                        continue
+                    try:
+                        async for chunk in self._write_entry(archive, sink, names[i], source):
+                            yield chunk
+                    finally:
+                        release(source, temporary)
+                submit()
+            if errors:
+                archive.writestr(ERRORS_ENTRY, "\n".join(errors) + "\n")
+            archive.close()
+            yield sink.take()
+            logger.info(f"批量导出完成: {len(specs) - len(errors)}/{len(specs)} 份文档")
+        finally:
+            # 客户端中途断开：进程中的任务无法中止，完成后删除其临时文件
+            for future in pending:
+                future.add_done_callback(discard)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 单例实例
+bulk_exporter = BulkExporter()
@@ -0,0 +1,255 @@
+"""
+批量导入文档语料（历史方案、CSR等）
+
+遍历目录，用进程池并行完成 哈希/存储 → 提取 → 分块，跨文件批量计算向量后按文档建立索引
+所有产物按内容哈希落盘，中断后重新运行会跳过已完成的阶段
+
+用法（在 backend/ 目录下）:
+    python bulk_ingest.py ../documents --workers 8 --batch-size 256
+    python bulk_ingest.py /data/legacy_csr --summarize          # 同时生成摘要（需本地运行Ollama）
+"""
+import os
+import sys
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+import argparse
+import statistics
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from artifact_cache import artifact_cache, DEFAULT_CHUNKS
+from database import init_db
+from document_catalog import document_catalog
+from ingestion_pipeline import get_embeddings, index_stage, summarize_stage
+from upload_store import artifact_path, blob_name, hash_file
+
+logger = logging.getLogger("bulk_ingest")
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc', '.txt')
+DEFAULT_UPLOAD_DIR = Path(__file__).parent / "uploads"
+
+
+class StageTimer:
+    """按阶段记录每个文档的耗时"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.items: Dict[str, int] = defaultdict(int)
+
+    def add(self, stage: str, seconds: float, items: int = 1):
+        self.samples[stage].append(seconds)
+        self.items[stage] += items
+
+    def report(self, wall_seconds: float) -> str:
+        lines = [
+            f"{'stage':<10} {'runs':>7} {'items':>9} {'total s':>9} {'items/s':>9} "
+            f"{'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"
+        ]
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            total = sum(ordered)
+            p95 = ordered[max(int(len(ordered) * 0.95) - 1, 0)]
+            lines.append(
+                f"{stage:<10} {len(ordered):>7} {self.items[stage]:>9} {total:>9.1f} "
+                f"{self.items[stage] / max(total, 1e-9):>9.1f} {statistics.median(ordered) * 1000:>9.1f} "
+                f"{p95 * 1000:>9.1f} {ordered[-1] * 1000:>9.1f}"
+            )
+        lines.append(f"wall time {wall_seconds:.1f}s")
+        return "\n".join(lines)
+
+
+def iter_documents(root: Path) -> Iterator[Path]:
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            if name.lower().endswith(SUPPORTED_EXTENSIONS) and not name.startswith(('.', '~$')):
+                yield Path(dirpath) / name
+
+
+def prepare_document(path: str, upload_dir: str) -> Dict[str, Any]:
+    """
+    子进程入口：计算哈希并存入上传目录，提取文本并分块（结果写入产物目录）
+    返回各阶段耗时；已存在的产物直接复用
+    """
+    timings = {}
+    started = time.perf_counter()
+    content_hash = hash_file(path)
+    blob = os.path.join(upload_dir, blob_name(content_hash, path))
+    if not os.path.exists(blob):
+        tmp = f"{blob}.{os.getpid()}.tmp"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, blob)
+    timings["store"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    segments = artifact_cache.segments(content_hash, blob, path)
+    timings["extract"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    chunks = artifact_cache.chunks(content_hash, blob, path, config=DEFAULT_CHUNKS)
+    timings["chunk"] = time.perf_counter() - started
+
+    return {
+        "source": path,
+        "content_hash": content_hash,
+        "path": blob,
+        "filename": os.path.basename(path),
+        "file_size": os.path.getsize(blob),
+        "segments": len(segments),
+        "chunks": len(chunks),
+        "timings": timings,
+    }
+
+
+def register(doc: Dict[str, Any]):
+    """登记到文档目录（同名同内容已登记时跳过）"""
+    if document_catalog.find_by_hash(doc["content_hash"], doc["filename"]):
+        return
+    previous = document_catalog.find_by_hash(doc["content_hash"])
+    document_catalog.add({
+        "id": str(uuid.uuid4()),
+        "filename": doc["filename"],
+        "content_hash": doc["content_hash"],
+        "blob": os.path.basename(doc["path"]),
+        "file_size": doc["file_size"],
+        "origin": "bulk",
+        "upload_time": datetime.now().isoformat(),
+        **{k: previous[0][k] for k in ("extracted", "vectorized", "analyzed", "summary") if previous},
+    })
+
+
+class EmbeddingBatcher:
+    """跨文件累积分块，凑满一批再计算向量；文档的全部分块完成后建立索引"""
+
+    def __init__(self, batch_size: int, timer: StageTimer):
+        self.batch_size = batch_size
+        self.timer = timer
+        self.pending: List[tuple] = []  # (内容哈希, 分块序号, 文本)
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.chunks: Dict[str, List[dict]] = {}
+        self.vectors: Dict[str, List] = {}
+        self.remaining: Dict[str, int] = {}
+        self.completed: List[Dict[str, Any]] = []
+
+    def add(self, doc: Dict[str, Any]):
+        content_hash = doc["content_hash"]
+        if content_hash in self.docs:
+            return
+        chunks = artifact_cache.chunks(content_hash, doc["path"], doc["filename"], config=DEFAULT_CHUNKS).items()
+        self.docs[content_hash] = doc
+        self.chunks[content_hash] = chunks
+        self.vectors[content_hash] = [None] * len(chunks)
+        self.remaining[content_hash] = len(chunks)
+        if not chunks:
+            self._index(content_hash)
+        self.pending.extend((content_hash, i, chunk["text"]) for i, chunk in enumerate(chunks))
+        while len(self.pending) >= self.batch_size:
+            self.flush(self.batch_size)
+
+    def flush(self, size: int = 0):
+        batch = self.pending[:size] if size else self.pending
+        self.pending = self.pending[len(batch):]
+        if not batch:
+            return
+        started = time.perf_counter()
+        vectors = get_embeddings().embed_documents([text for _, _, text in batch])
+        self.timer.add("embed", time.perf_counter() - started, len(batch))
+        for (content_hash, i, _), vector in zip(batch, vectors):
+            self.vectors[content_hash][i] = vector
+            self.remaining[content_hash] -= 1
+            if self.remaining[content_hash] == 0:
+                self._index(content_hash)
+
+    def _index(self, content_hash: str):
+        started = time.perf_counter()
+        index_stage({
+            "content_hash": content_hash,
+            "chunks": self.chunks.pop(content_hash),
+            "vectors": self.vectors.pop(content_hash),
+        })
+        self.timer.add("index", time.perf_counter() - started)
+        document_catalog.update_status(content_hash, vectorized=True)
+        self.completed.append(self.docs[content_hash])
+
+
+async def summarize_all(docs: List[Dict[str, Any]], timer: StageTimer, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(doc):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await summarize_stage(doc)
+                document_catalog.update_status(doc["content_hash"], analyzed=True)
+            except Exception as e:
+                logger.error(f"摘要失败 {doc['source']}: {str(e)}")
+                return
+            timer.add("summarize", time.perf_counter() - started)
+
+    await asyncio.gather(*(run(doc) for doc in docs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", type=Path, help="待导入的文档目录（递归遍历）")
+    parser.add_argument("--upload-dir", type=Path, default=DEFAULT_UPLOAD_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="提取/分块进程数")
+    parser.add_argument("--batch-size", type=int, default=256, help="每批计算向量的分块数")
+    parser.add_argument("--summarize", action="store_true", help="索引完成后生成文档摘要")
+    parser.add_argument("--summary-concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    init_db()
+    args.upload_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = [str(p) for p in iter_documents(args.directory)]
+    logger.info(f"发现 {len(paths)} 个文档，使用 {args.workers} 个进程")
+    timer = StageTimer()
+    batcher = EmbeddingBatcher(args.batch_size, timer)
+    skipped, failed, indexed = 0, [], []
+    wall_started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(prepare_document, path, str(args.upload_dir)): path for path in paths}
+        for n, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                doc = future.result()
+            except Exception as e:
+                logger.error(f"处理失败 {path}: {str(e)}")
+                failed.append(path)
+                continue
+            for stage, seconds in doc["timings"].items():
+                timer.add(stage, seconds, doc["chunks"] if stage == "chunk" else 1)
+            register(doc)
+            document_catalog.update_status(doc["content_hash"], extracted=True)
+            # 已有完整索引的文档（此前运行已完成）不再计算向量
+            if artifact_path(doc["content_hash"], "faiss").exists():
+                document_catalog.update_status(doc["content_hash"], vectorized=True)
+                skipped += 1
+                indexed.append(doc)
+            else:
+                batcher.add(doc)
+            if n % 100 == 0:
+                logger.info(f"进度 {n}/{len(paths)}")
+        batcher.flush()
+    indexed.extend(batcher.completed)
+
+    if args.summarize:
+        asyncio.run(summarize_all(indexed, timer, args.summary_concurrency))
+
+    print()
+    print(f"documents: {len(paths)}  indexed: {len(batcher.completed)}  "
+          f"resumed/skipped: {skipped}  failed: {len(failed)}")
+    print(timer.report(time.perf_counter() - wall_started))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
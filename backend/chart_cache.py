@@ -0,0 +1,129 @@
+import os
+import json
+import shutil
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import upload_store
+from export_store import prune_directory
+
+logger = logging.getLogger(__name__)
+
+# 内存中缓存的图表总字节数上限，超出时按LRU溢出到磁盘
+CHART_CACHE_BYTES = int(os.getenv("CHART_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# 每个数据集溢出到磁盘的图表总字节数上限，超出时删除最久未使用的图表
+CHART_SPILL_BYTES = int(os.getenv("CHART_SPILL_BYTES", str(256 * 1024 * 1024)))
+
+CHART_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def chart_key(dataset_id: str, version: int, config: Dict[str, Any], fmt: str) -> str:
+    """数据集版本 + 规范化后的图表配置 + 格式 的哈希（未设置的选项不影响键）"""
+    normalized = {k: v for k, v in config.items() if v is not None}
+    if normalized.get("aggregation") == "none":
+        del normalized["aggregation"]
+    payload = json.dumps(
+        {"dataset": dataset_id, "version": version, "format": fmt, "config": normalized},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ChartCache:
+    """
+    渲染后的图表缓存：内存中为按字节数限制的LRU，被淘汰的图表写入
+    charts/<数据集ID>/<键>.<格式>，再次命中时读回内存；删除数据集时整体失效
+    """
+
+    def __init__(self, max_bytes: int = CHART_CACHE_BYTES, directory: Optional[Path] = None,
+                 spill_bytes: int = CHART_SPILL_BYTES):
+        self.max_bytes = max_bytes
+        self.spill_bytes = spill_bytes
+        self._directory = directory
+        self._memory: "OrderedDict[str, Tuple[str, str, bytes]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._render_locks: Dict[str, asyncio.Lock] = {}
+
+    @property
+    def directory(self) -> Path:
+        return self._directory or upload_store.ARTIFACT_DIR / "charts"
+
+    def _path(self, dataset_id: str, key: str, fmt: str) -> Path:
+        return self.directory / dataset_id / f"{key}.{fmt}"
+
+    def _spill(self, dataset_id: str, key: str, fmt: str, data: bytes):
+        path = self._path(dataset_id, key, fmt)
+        if path.exists():
+            # 按修改时间清理，再次溢出视为最近使用
+            os.utime(path)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        prune_directory(path.parent, self.spill_bytes, keep={path.name})
+
+    def put(self, dataset_id: str, key: str, fmt: str, data: bytes):
+        spilled = []
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = (dataset_id, fmt, data)
+            self._size += len(data)
+            while self._size > self.max_bytes and self._memory:
+                evicted_key, (evicted_dataset, evicted_fmt, evicted) = self._memory.popitem(last=False)
+                self._size -= len(evicted)
+                spilled.append((evicted_dataset, evicted_key, evicted_fmt, evicted))
+        for item in spilled:
+            self._spill(*item)
+
+    def get(self, dataset_id: str, key: str, fmt: str) -> Optional[bytes]:
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                return cached[2]
+        path = self._path(dataset_id, key, fmt)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        self.put(dataset_id, key, fmt, data)
+        return data
+
+    async def get_or_render(
+        self, dataset_id: str, key: str, fmt: str, render: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        """缓存未命中时渲染；同一图表同时只渲染一次。读写磁盘在线程中进行，不阻塞事件循环"""
+        data = await asyncio.to_thread(self.get, dataset_id, key, fmt)
+        if data is not None:
+            return data
+        lock = self._render_locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                data = await asyncio.to_thread(self.get, dataset_id, key, fmt)
+                if data is None:
+                    data = await render()
+                    await asyncio.to_thread(self.put, dataset_id, key, fmt, data)
+                return data
+        finally:
+            if not lock.locked():
+                self._render_locks.pop(key, None)
+
+    def invalidate(self, dataset_id: str):
+        """删除数据集的全部缓存图表"""
+        with self._lock:
+            for key in [k for k, (d, _, _) in self._memory.items() if d == dataset_id]:
+                self._size -= len(self._memory.pop(key)[2])
+        shutil.rmtree(self.directory / dataset_id, ignore_errors=True)
+
+
+# 单例实例
+chart_cache = ChartCache()
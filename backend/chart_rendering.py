@@ -0,0 +1,150 @@
+import io
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from dataset_profile import coercible_to_numeric
+from dataset_registry import dataset_registry
+from utils.chart_data import prepare_chart_data
+
+logger = logging.getLogger(__name__)
+
+# 同时进行的渲染数（渲染线程数）
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "4"))
+# 单次渲染（含排队）的超时秒数
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "30"))
+# 排队等待的渲染请求上限，超过时直接返回503
+CHART_RENDER_QUEUE = int(os.getenv("CHART_RENDER_QUEUE", "32"))
+
+CHART_TYPES = ("bar", "line", "pie")
+# 非数值型X轴最多标注的刻度数
+MAX_TICK_LABELS = 20
+
+
+def _ordinal_axis(series: pd.Series) -> bool:
+    return not (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series))
+
+
+def draw_chart(df: pd.DataFrame, chart_type: str, x: str, y: str, fmt: str = "png") -> bytes:
+    """
+    用面向对象的Figure/Agg接口绘图（不使用pyplot的全局状态），可在多个线程中同时调用
+    """
+    figure = Figure(figsize=(10, 6))
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    values = df[y].to_numpy(dtype=np.float64, na_value=np.nan)
+    positions = np.arange(len(df))
+    labels = df[x].astype(str).tolist()
+    if chart_type == "bar":
+        ax.bar(positions, values, label=y)
+        ax.set_xticks(positions, labels, rotation=90)
+        ax.set_xlabel(x)
+        ax.legend()
+    elif chart_type == "line":
+        if _ordinal_axis(df[x]):
+            ax.plot(positions, values, label=y)
+            ticks = positions[::max(1, len(positions) // MAX_TICK_LABELS)]
+            ax.set_xticks(ticks, [labels[i] for i in ticks], rotation=90)
+        else:
+            ax.plot(df[x].to_numpy(), values, label=y)
+        ax.set_xlabel(x)
+        ax.legend()
+    elif chart_type == "pie":
+        ax.pie(values, labels=labels, autopct="%1.1f%%")
+        ax.set_ylabel(y)
+    else:
+        raise ValueError("Unsupported chart type")
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=fmt, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def render_chart(df: pd.DataFrame, config: Dict[str, Any], fmt: str = "png",
+                 x_distinct: Optional[int] = None) -> bytes:
+    """转换Y为数值、聚合/降采样后绘图；数据不合适时抛出ValueError"""
+    x, y = config["xAxis"], config["yAxis"]
+    if not np.issubdtype(df[y].dtype, np.number):
+        df = df.assign(**{y: pd.to_numeric(df[y], errors="coerce")}).dropna(subset=[y])
+        if df.empty:
+            raise ValueError(f"Column {y} cannot be converted to numeric values")
+    df = prepare_chart_data(
+        df, config["chartType"], x, y,
+        aggregation=config.get("aggregation"), bins=config.get("bins"), max_points=config.get("maxPoints"),
+        x_distinct=x_distinct
+    )
+    return draw_chart(df, config["chartType"], x, y, fmt)
+
+
+def render_dataset_chart(dataset_id: str, config: Dict[str, Any], fmt: str = "png") -> bytes:
+    """从Parquet只读取图表用到的列并渲染；列类型和去重数取自导入时的画像"""
+    x, y = config["xAxis"], config["yAxis"]
+    y_profile = dataset_registry.column_profile(dataset_id, y)
+    if not coercible_to_numeric(y_profile):
+        # 画像显示该文本列没有可转为数值的值，不必读取数据
+        raise ValueError(f"Column {y} cannot be converted to numeric values")
+    x_profile = dataset_registry.column_profile(dataset_id, x)
+    columns = list(dict.fromkeys([x, y]))
+    return render_chart(
+        dataset_registry.to_pandas(dataset_id, columns), config, fmt,
+        x_distinct=x_profile["distinct"] if x_profile and x_profile["distinctExact"] else None
+    )
+
+
+class ChartRenderer:
+    """
+    图表渲染线程池：渲染不在事件循环中执行；同时渲染数不超过线程数，
+    排队过多时返回503，排队加渲染超过超时时间返回504
+    """
+
+    def __init__(self, workers: int = CHART_RENDER_WORKERS, timeout: float = CHART_RENDER_TIMEOUT,
+                 max_pending: int = CHART_RENDER_QUEUE):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chart-render")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending = 0
+
+    def _slots(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        if self._loop is not loop:
+            self._semaphore, self._loop = asyncio.Semaphore(self.workers), loop
+        return self._semaphore
+
+    async def run(self, fn: Callable[..., bytes], *args) -> bytes:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        semaphore = self._slots(loop)
+        if semaphore.locked() and self._pending >= self.max_pending:
+            raise HTTPException(status_code=503, detail="Chart renderer is busy, please retry later")
+        self._pending += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Chart rendering timed out")
+        finally:
+            self._pending -= 1
+        future = loop.run_in_executor(self._executor, fn, *args)
+
+        def release(done: asyncio.Future):
+            semaphore.release()
+            if not done.cancelled():
+                done.exception()  # 超时后才失败的渲染不再报告“异常未被获取”
+
+        # 线程无法中断：超时后渲染仍在进行，完成时才释放名额，保证同时渲染数不超过上限
+        future.add_done_callback(release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            logger.error(f"图表渲染超时（{self.timeout}s）")
+            raise HTTPException(status_code=504, detail="Chart rendering timed out")
+
+
+# 单例实例
+chart_renderer = ChartRenderer()
@@ -0,0 +1,196 @@
+import os
+import mmap
+import fcntl
+import bisect
+import struct
+import logging
+import threading
+from array import array
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+import upload_store
+
+logger = logging.getLogger(__name__)
+
+# 每个分块的索引记录: 文本偏移(uint64) | UTF-8字节长度(uint32) | 页码(int32, -1表示无)
+CHUNK_RECORD = struct.Struct("<QIi")
+# 每个文档的记录: 内容哈希(32字节) | 第一个分块ID(uint64) | 分块数(uint32)
+DOC_RECORD = struct.Struct("<32sQI")
+
+
+class ChunkStore:
+    """
+    追加写入的分块文本存储
+    文本保存在内存映射的数据文件中，索引为紧凑数组（每个分块16字节），检索时只读取命中的分块
+    同一文档的分块ID连续；同一内容哈希只写入一次。多进程追加时通过文件锁串行化
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.data_path = self.directory / "chunks.dat"
+        self.index_path = self.directory / "chunks.idx"
+        self.docs_path = self.directory / "docs.idx"
+        self.lock_path = self.directory / ".lock"
+        for path in (self.data_path, self.index_path, self.docs_path):
+            path.touch(exist_ok=True)
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.pages = array("i")
+        self.doc_first_ids = array("Q")
+        self.doc_counts = array("I")
+        self.doc_hashes: Dict[str, int] = {}  # 内容哈希 → 文档序号
+        self._doc_hash_list: List[str] = []
+        self._mmap: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+        self._lock = threading.RLock()
+        self._refresh()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """读取其他进程追加的索引记录"""
+        with self._lock:
+            with open(self.index_path, "rb") as f:
+                f.seek(len(self.offsets) * CHUNK_RECORD.size)
+                data = f.read()
+            usable = len(data) - len(data) % CHUNK_RECORD.size
+            for offset, length, page in CHUNK_RECORD.iter_unpack(data[:usable]):
+                self.offsets.append(offset)
+                self.lengths.append(length)
+                self.pages.append(page)
+            with open(self.docs_path, "rb") as f:
+                f.seek(len(self.doc_first_ids) * DOC_RECORD.size)
+                data = f.read()
+            usable = len(data) - len(data) % DOC_RECORD.size
+            for raw_hash, first_id, count in DOC_RECORD.iter_unpack(data[:usable]):
+                content_hash = raw_hash.hex()
+                self.doc_hashes[content_hash] = len(self.doc_first_ids)
+                self._doc_hash_list.append(content_hash)
+                self.doc_first_ids.append(first_id)
+                self.doc_counts.append(count)
+
+    def _data(self) -> mmap.mmap:
+        """按需重新映射数据文件（文件增长后）"""
+        size = self.data_path.stat().st_size
+        if self._mmap is None or size > self._mapped_size:
+            if self._mmap is not None:
+                self._mmap.close()
+            with open(self.data_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+            # 检索为随机读取，关闭预读以免把无关分块读入内存
+            if self._mmap is not None and hasattr(mmap, "MADV_RANDOM"):
+                self._mmap.madvise(mmap.MADV_RANDOM)
+            self._mapped_size = size
+        return self._mmap
+
+    def document_ids(self, content_hash: str) -> Optional[range]:
+        doc_no = self.doc_hashes.get(content_hash)
+        if doc_no is None:
+            self._refresh()
+            doc_no = self.doc_hashes.get(content_hash)
+        if doc_no is None:
+            return None
+        first = self.doc_first_ids[doc_no]
+        return range(first, first + self.doc_counts[doc_no])
+
+    def append(self, content_hash: str, chunks: Iterable[Tuple[str, Optional[int]]]) -> range:
+        """追加一个文档的分块，返回其分块ID区间；该内容已写入时直接返回已有区间"""
+        with self._file_lock():
+            self._refresh()
+            existing = self.document_ids(content_hash)
+            if existing is not None:
+                return existing
+            # 丢弃上次中断时写了一半的索引记录
+            os.truncate(self.index_path, len(self.offsets) * CHUNK_RECORD.size)
+            os.truncate(self.docs_path, len(self.doc_first_ids) * DOC_RECORD.size)
+            first_id = len(self.offsets)
+            records = bytearray()
+            with open(self.data_path, "ab") as data:
+                position = data.tell()
+                for text, page in chunks:
+                    encoded = text.encode("utf-8")
+                    data.write(encoded)
+                    records += CHUNK_RECORD.pack(position, len(encoded), -1 if page is None else page)
+                    position += len(encoded)
+                data.flush()
+                os.fsync(data.fileno())
+            # 先写分块索引，最后写文档记录：中断时不会出现指向不完整数据的文档
+            with open(self.index_path, "ab") as index:
+                index.write(records)
+            count = len(records) // CHUNK_RECORD.size
+            with open(self.docs_path, "ab") as docs:
+                docs.write(DOC_RECORD.pack(bytes.fromhex(content_hash), first_id, count))
+            self._refresh()
+            return range(first_id, first_id + count)
+
+    def get(self, chunk_id: int) -> Tuple[str, Optional[int], str]:
+        """返回 (文本, 页码, 内容哈希)"""
+        if chunk_id >= len(self.offsets):
+            self._refresh()
+        with self._lock:
+            offset, length, page = self.offsets[chunk_id], self.lengths[chunk_id], self.pages[chunk_id]
+            text = self._data()[offset:offset + length].decode("utf-8")
+            doc_no = bisect.bisect_right(self.doc_first_ids, chunk_id) - 1
+        return text, (None if page < 0 else page), self._doc_hash_list[doc_no]
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+class ChunkStoreDocstore(Docstore):
+    """供FAISS使用的只读docstore：ID为分块存储中的位置，只在命中时读取文本（写入通过ChunkStore.append）"""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def search(self, search: str) -> Union[str, Document]:
+        try:
+            text, page, content_hash = self.store.get(int(search))
+        except (ValueError, IndexError):
+            return f"ID {search} not found."
+        return Document(page_content=text, metadata={"content_hash": content_hash, "page": page})
+
+
+class IndexToDocstoreId:
+    """FAISS行号 → 分块ID 的数组映射（替代逐条的dict）"""
+
+    def __init__(self, ids: array):
+        self.ids = ids
+
+    def __getitem__(self, row: int) -> str:
+        return str(self.ids[row])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, row: int) -> bool:
+        return 0 <= row < len(self.ids)
+
+    def values(self):
+        return (str(i) for i in self.ids)
+
+    def items(self):
+        return ((row, str(i)) for row, i in enumerate(self.ids))
+
+
+@lru_cache(maxsize=1)
+def get_chunk_store() -> ChunkStore:
+    """进程内共享的分块存储（位于产物目录下）"""
+    return ChunkStore(upload_store.ARTIFACT_DIR / "chunkstore")
@@ -43,4 +43,85 @@ def init_db():
                 created_at TIMESTAMP
             )
         ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS usage_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                endpoint TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                latency_ms REAL NOT NULL,
+                created_at TIMESTAMP
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_usage_created_at ON usage_records (created_at)"
+        )
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS documents (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                blob TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                type TEXT NOT NULL DEFAULT 'document',
+                origin TEXT NOT NULL DEFAULT 'upload',
+                upload_time TIMESTAMP NOT NULL,
+                extracted INTEGER NOT NULL DEFAULT 0,
+                vectorized INTEGER NOT NULL DEFAULT 0,
+                analyzed INTEGER NOT NULL DEFAULT 0,
+                summary TEXT,
+                updated_at TIMESTAMP
+            )
+        ''')
+        # 列表按上传时间倒序分页，类型/来源过滤走各自的索引
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (content_hash)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_documents_blob ON documents (blob)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_documents_listing ON documents (upload_time DESC, id DESC)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_documents_type ON documents (type, upload_time DESC, id DESC)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_documents_origin ON documents (origin, upload_time DESC, id DESC)"
+        )
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                content_hash TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TIMESTAMP,
+                updated_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status ON ingestion_jobs (status)"
+        )
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS datasets (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                path TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                column_count INTEGER NOT NULL,
+                schema TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1,
+                created_at TIMESTAMP
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_datasets_hash ON datasets (content_hash)"
+        )
         conn.commit() 
\ No newline at end of file
@@ -0,0 +1,187 @@
+import decimal
+import datetime
+from typing import Any, Dict, List, Optional, Union
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# 直方图箱数
+HISTOGRAM_BINS = 20
+# 去重计数估计保留的最小哈希数（KMV，相对误差约 1/sqrt(k)）
+DISTINCT_SKETCH_SIZE = 1024
+# 去重数不超过此值的文本/布尔列统计各取值的频数
+MAX_CATEGORIES = 1000
+# 返回的高频取值个数
+TOP_VALUES = 10
+
+
+def column_kind(data_type: pa.DataType) -> str:
+    if pa.types.is_boolean(data_type):
+        return "boolean"
+    if pa.types.is_integer(data_type) or pa.types.is_floating(data_type) or pa.types.is_decimal(data_type):
+        return "numeric"
+    if pa.types.is_temporal(data_type):
+        return "temporal"
+    return "string"
+
+
+class DistinctSketch:
+    """K-Minimum-Values去重计数估计：只保留最小的k个哈希值，可逐批合并"""
+
+    def __init__(self, k: int = DISTINCT_SKETCH_SIZE):
+        self.k = k
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def add(self, values: np.ndarray):
+        hashes = pd.util.hash_array(values)
+        if len(self.hashes) == self.k:
+            hashes = hashes[hashes < self.hashes[-1]]
+        self.hashes = np.unique(np.concatenate([self.hashes, hashes]))[:self.k]
+
+    @property
+    def exact(self) -> bool:
+        return len(self.hashes) < self.k
+
+    def estimate(self) -> int:
+        if self.exact:
+            return len(self.hashes)
+        return int((self.k - 1) / (float(self.hashes[-1]) / 2.0 ** 64))
+
+
+def _python(value: Any) -> Any:
+    """统计值转为可JSON序列化的值"""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def _storage_type(data_type: pa.DataType) -> pa.DataType:
+    """时间类型的整数存储类型（用于分箱）"""
+    return pa.int32() if data_type.bit_width == 32 else pa.int64()
+
+
+def _finite(values: Union[pa.Array, pa.ChunkedArray]) -> Union[pa.Array, pa.ChunkedArray]:
+    """浮点列去掉NaN和±inf（register_table导入的数据未经CSV导入的清洗）"""
+    if pa.types.is_floating(values.type):
+        return values.filter(pc.is_finite(values))
+    return values
+
+
+def _numeric_values(column: pa.ChunkedArray) -> np.ndarray:
+    """数值/时间列的非空有限值（时间转为整数以便分箱）"""
+    values = _finite(column.drop_null())
+    if pa.types.is_temporal(column.type):
+        values = values.cast(_storage_type(column.type))
+    return values.to_numpy().astype(np.float64)
+
+
+def _as_number(value: Any, data_type: pa.DataType) -> float:
+    if pa.types.is_temporal(data_type):
+        return float(pa.scalar(value, data_type).cast(_storage_type(data_type)).as_py())
+    return float(value)
+
+
+def profile_parquet(path: Union[str, Path], bins: int = HISTOGRAM_BINS) -> Dict[str, Any]:
+    """
+    逐行组两遍扫描Parquet文件生成列画像（内存只与行组大小有关）：
+    第一遍统计空值数、最小/最大值、去重数估计和文本列可转为数值的比例；
+    第二遍按最小/最大值分箱统计直方图，低基数的文本/布尔列统计高频取值。
+    NaN和±inf不计入最小/最大值和直方图
+    """
+    parquet = pq.ParquetFile(path)
+    schema = parquet.schema_arrow
+    stats = {
+        field.name: {"kind": column_kind(field.type), "nulls": 0, "min": None, "max": None,
+                     "sketch": DistinctSketch()}
+        for field in schema
+    }
+    for state in stats.values():
+        if state["kind"] == "string":
+            state["numeric"] = state["present"] = 0
+
+    for i in range(parquet.num_row_groups):
+        group = parquet.read_row_group(i)
+        for name in group.column_names:
+            column, state = group.column(name), stats[name]
+            state["nulls"] += column.null_count
+            values = _finite(column.drop_null())
+            if len(values) == 0:
+                continue
+            if state["kind"] != "boolean":
+                bounds = pc.min_max(values)
+                low, high = bounds["min"].as_py(), bounds["max"].as_py()
+                state["min"] = low if state["min"] is None else min(state["min"], low)
+                state["max"] = high if state["max"] is None else max(state["max"], high)
+            state["sketch"].add(values.to_numpy())
+            if state["kind"] == "string":
+                # 按不同取值判断，再按频数累计
+                counts = pc.value_counts(values)
+                numeric = pd.to_numeric(
+                    pd.Series(counts.field("values").to_numpy(zero_copy_only=False)), errors="coerce"
+                ).notna().to_numpy()
+                state["numeric"] += int(counts.field("counts").to_numpy()[numeric].sum())
+                state["present"] += len(values)
+
+    for name, state in stats.items():
+        kind, distinct = state["kind"], state["sketch"].estimate()
+        if kind in ("numeric", "temporal") and state["min"] is not None:
+            data_type = schema.field(name).type
+            low, high = _as_number(state["min"], data_type), _as_number(state["max"], data_type)
+            state["edges"] = np.linspace(low, high if high > low else low + 1, bins + 1)
+            state["counts"] = np.zeros(bins, dtype=np.int64)
+        elif kind in ("string", "boolean") and state["sketch"].exact and distinct <= MAX_CATEGORIES:
+            state["frequencies"] = {}
+
+    histogram_columns = [name for name, state in stats.items() if "edges" in state or "frequencies" in state]
+    if histogram_columns:
+        for i in range(parquet.num_row_groups):
+            group = parquet.read_row_group(i, columns=histogram_columns)
+            for name in histogram_columns:
+                column, state = group.column(name), stats[name]
+                if "edges" in state:
+                    state["counts"] += np.histogram(_numeric_values(column), bins=state["edges"])[0]
+                else:
+                    counts = pc.value_counts(column.drop_null())
+                    for value, count in zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist()):
+                        state["frequencies"][value] = state["frequencies"].get(value, 0) + count
+
+    columns: List[Dict[str, Any]] = []
+    for field in schema:
+        state = stats[field.name]
+        profile: Dict[str, Any] = {
+            "name": field.name,
+            "type": str(field.type),
+            "kind": state["kind"],
+            "nulls": state["nulls"],
+            "min": _python(state["min"]),
+            "max": _python(state["max"]),
+            "distinct": state["sketch"].estimate(),
+            "distinctExact": state["sketch"].exact,
+        }
+        if "present" in state:
+            profile["numericRatio"] = round(state["numeric"] / state["present"], 4) if state["present"] else 0.0
+        if "edges" in state:
+            edges = state["edges"].tolist()
+            if state["kind"] == "temporal":
+                storage = pa.array(np.round(edges).astype(np.int64)).cast(_storage_type(field.type))
+                edges = [_python(v) for v in storage.cast(field.type).to_pylist()]
+            profile["histogram"] = {"edges": edges, "counts": state["counts"].tolist()}
+        if "frequencies" in state:
+            top = sorted(state["frequencies"].items(), key=lambda item: -item[1])[:TOP_VALUES]
+            profile["topValues"] = [{"value": value, "count": count} for value, count in top]
+        columns.append(profile)
+    return {"rows": parquet.metadata.num_rows, "columns": columns}
+
+
+def coercible_to_numeric(profile: Optional[Dict[str, Any]]) -> bool:
+    """按画像判断列能否用作数值轴：只排除没有任何可转为数值的值的文本列（无画像时交给后续转换判断）"""
+    if profile is None or profile["kind"] != "string":
+        return True
+    return profile.get("numericRatio", 1) > 0
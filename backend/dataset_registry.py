@@ -0,0 +1,530 @@
+import os
+import json
+import uuid
+import re
+import base64
+import logging
+import threading
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as pads
+import pyarrow.parquet as pq
+from database import get_db
+from dataset_profile import profile_parquet
+
+logger = logging.getLogger(__name__)
+
+DATASET_DIR = Path(__file__).parent / "datasets"
+
+DATASET_COLUMNS = (
+    "id", "name", "content_hash", "path", "row_count", "column_count",
+    "schema", "file_size", "version", "created_at"
+)
+
+
+def _row_to_dict(row) -> Dict[str, Any]:
+    record = dict(zip(DATASET_COLUMNS, row))
+    record["schema"] = json.loads(record["schema"])
+    return record
+
+
+@lru_cache(maxsize=64)
+def _open_parquet(path: str, mtime_ns: int) -> pq.ParquetFile:
+    """按路径和修改时间缓存打开的Parquet文件（只读取元数据）"""
+    return pq.ParquetFile(path, memory_map=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name, "")
+    return int(value) if value.isdigit() else default
+
+
+# 单次数据集导入自身的内存占用上限（字节，按预读块和解析出的批估计），超过时中止导入
+DATASET_MEMORY_LIMIT = _env_int("DATASET_MEMORY_LIMIT", 512 * 1024 * 1024)
+# 用于推断列类型的样本大小（字节）
+DATASET_SAMPLE_BYTES = _env_int("DATASET_SAMPLE_BYTES", 4 * 1024 * 1024)
+# 类型推断失败时最多重新导入的次数
+MAX_TYPE_RETRIES = 16
+
+_CSV_ERROR_COLUMN = re.compile(r"In CSV column #(\d+)")
+
+
+# Arrow流式CSV读取器在后台预读的块数
+CSV_READAHEAD_BLOCKS = 32
+
+
+def _block_size(memory_limit: int) -> int:
+    """
+    每次解析的块大小：Arrow的流式CSV读取器在后台最多预读32个块，连同解析结果约为块大小的40倍，
+    因此取内存上限的1/64，限定在1MB~8MB之间
+    """
+    return max(1 << 20, min(8 << 20, memory_limit // 64))
+
+
+def _check_memory(block_size: int, batch: pa.RecordBatch, memory_limit: int):
+    """
+    估计本次导入自身的内存占用：预读的原始块 + 解析出的批 + 清洗后的批/写出行组的缓冲（均不超过批本身）。
+    只计本次导入的缓冲，不受同一进程中其他Arrow操作的影响；超过上限时抛出MemoryError
+    """
+    resident = CSV_READAHEAD_BLOCKS * block_size + 2 * batch.get_total_buffer_size()
+    if resident > memory_limit:
+        raise MemoryError(
+            f"Dataset import exceeded memory limit of {memory_limit // (1024 * 1024)}MB"
+        )
+
+
+def _csv_options(column_types: Optional[Dict[str, pa.DataType]] = None) -> pacsv.ConvertOptions:
+    # 默认空值集合与pandas一致（'', 'NA', 'N/A', 'NaN', 'null'...）；空字符串在文本列中也视为缺失
+    return pacsv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+
+
+def infer_csv_schema(path: Union[str, Path], sample_bytes: int = None) -> pa.Schema:
+    """只解析文件开头的样本来推断列类型"""
+    sample_bytes = sample_bytes or DATASET_SAMPLE_BYTES
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=sample_bytes),
+        convert_options=_csv_options()
+    )
+    try:
+        return reader.schema
+    finally:
+        reader.close()
+
+
+def _widen(data_type: pa.DataType) -> pa.DataType:
+    """样本之后出现不符合推断类型的值时放宽该列类型：整数→浮点，其他→文本"""
+    if pa.types.is_integer(data_type):
+        return pa.float64()
+    return pa.string()
+
+
+def clean_batch(batch: pa.RecordBatch) -> pa.RecordBatch:
+    """把浮点列中的无限值和NaN统一为null（向量化）"""
+    columns = []
+    for column in batch.columns:
+        if pa.types.is_floating(column.type):
+            column = pc.if_else(pc.is_finite(column), column, pa.scalar(None, column.type))
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, schema=batch.schema)
+
+
+def _settle_types(source: Union[str, Path], schema: pa.Schema, memory_limit: int) -> pa.Schema:
+    """
+    样本推断的类型在后面出错时，把非文本列按文本读一遍，逐块检查能否转换为推断的类型，
+    一次找出所有需要放宽的列，避免每放宽一列就重新导入整个文件
+    """
+    pending = {i: field.type for i, field in enumerate(schema) if field.type != pa.string()}
+    block_size = _block_size(memory_limit)
+    reader = pacsv.open_csv(
+        source,
+        read_options=pacsv.ReadOptions(block_size=block_size),
+        convert_options=_csv_options({schema.field(i).name: pa.string() for i in pending})
+    )
+    try:
+        for batch in reader:
+            _check_memory(block_size, batch, memory_limit)
+            for i, data_type in list(pending.items()):
+                while data_type != pa.string():
+                    try:
+                        pc.cast(batch.column(i), data_type)
+                        break
+                    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                        data_type = _widen(data_type)
+                if data_type != schema.field(i).type:
+                    schema = schema.set(i, pa.field(schema.field(i).name, data_type))
+                if data_type == pa.string():
+                    del pending[i]
+                else:
+                    pending[i] = data_type
+            if not pending:
+                break
+    finally:
+        reader.close()
+    return schema
+
+
+def write_csv_as_parquet(
+    source: Union[str, Path],
+    target: Union[str, Path],
+    memory_limit: int = None,
+    sample_bytes: int = None,
+) -> Tuple[int, pa.Schema]:
+    """
+    分块流式把CSV转为Parquet，返回 (行数, 结构)
+    每块解析后立即写出为一个行组，常驻内存只与块大小有关；每块写出前估计本次导入的内存占用，超过上限时抛出MemoryError
+    样本之后出现不符合推断类型的值时，先用一遍扫描放宽所有出错的列再重新导入
+    """
+    memory_limit = memory_limit or DATASET_MEMORY_LIMIT
+    block_size = _block_size(memory_limit)
+    schema = infer_csv_schema(source, sample_bytes)
+    settled = False
+    for _ in range(MAX_TYPE_RETRIES):
+        column_types = {field.name: field.type for field in schema}
+        reader = pacsv.open_csv(
+            source,
+            read_options=pacsv.ReadOptions(block_size=block_size),
+            convert_options=_csv_options(column_types)
+        )
+        rows = 0
+        try:
+            with pq.ParquetWriter(target, reader.schema, compression="zstd") as writer:
+                for batch in reader:
+                    _check_memory(block_size, batch, memory_limit)
+                    writer.write_batch(clean_batch(batch))
+                    rows += batch.num_rows
+            return rows, reader.schema
+        except pa.ArrowInvalid as e:
+            match = _CSV_ERROR_COLUMN.search(str(e))
+            if not match:
+                raise ValueError(f"Invalid CSV: {e}") from e
+            index = int(match.group(1))
+            field = schema.field(index)
+            if field.type == pa.string():
+                raise ValueError(f"Invalid CSV: {e}") from e
+            logger.info(f"列 {field.name} 在样本之后出现不符合 {field.type} 的值，放宽类型后重新导入")
+            if not settled:
+                settled = True
+                schema = _settle_types(source, schema, memory_limit)
+            if schema.field(index).type == field.type:
+                # 按文本检查时未发现问题（转换规则与CSV解析略有差异），只放宽出错的列
+                schema = schema.set(index, pa.field(field.name, _widen(field.type)))
+        finally:
+            reader.close()
+    raise ValueError("Invalid CSV: could not infer column types")
+
+
+FILTER_OPS = ("eq", "ne", "lt", "le", "gt", "ge", "in", "notin", "isnull", "notnull", "contains")
+
+
+def encode_cursor(version: int, row_group: int, skip: int) -> str:
+    """分页游标：数据集版本|行组序号|该行组内已返回的行数（排序查询时行组为-1，skip为偏移量）"""
+    return base64.urlsafe_b64encode(f"{version}|{row_group}|{skip}".encode("ascii")).decode("ascii")
+
+
+def decode_cursor(cursor: str, version: int) -> Tuple[int, int]:
+    try:
+        cursor_version, row_group, skip = (
+            int(part) for part in base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split("|")
+        )
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if cursor_version != version:
+        raise ValueError("Cursor belongs to a previous version of the dataset")
+    return row_group, skip
+
+
+_CAST_ERRORS = (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError, TypeError, OverflowError)
+
+
+def _filter_value(value: Any, data_type: pa.DataType, column: str, op: str):
+    """过滤值转换为列的类型（列表转为数组），类型不符时抛出ValueError"""
+    try:
+        if op in ("in", "notin"):
+            return pa.array(value).cast(data_type)
+        if value is None:
+            raise ValueError(f"Filter '{op}' on {column} requires a value")
+        return pa.scalar(value).cast(data_type)
+    except _CAST_ERRORS:
+        raise ValueError(f"Filter '{op}' value {value!r} does not match type {data_type} of column {column}")
+
+
+def build_filter(filters: Sequence[Dict[str, Any]], schema: pa.Schema) -> Optional[pads.Expression]:
+    """
+    把 {column, op, value} 条件（AND连接）转为Arrow表达式，以便按行组统计信息跳过不相关的行组
+    过滤值先按列类型转换，未知列、类型不符或不支持的运算抛出ValueError
+    """
+    expression = None
+    for item in filters:
+        column, op, value = item["column"], item["op"], item.get("value")
+        if column not in schema.names:
+            raise ValueError(f"Unknown columns: {[column]}")
+        data_type = schema.field(column).type
+        field = pads.field(column)
+        if op in ("eq", "ne", "lt", "le", "gt", "ge"):
+            value = _filter_value(value, data_type, column, op)
+        if op == "eq":
+            condition = field == value
+        elif op == "ne":
+            condition = field != value
+        elif op == "lt":
+            condition = field < value
+        elif op == "le":
+            condition = field <= value
+        elif op == "gt":
+            condition = field > value
+        elif op == "ge":
+            condition = field >= value
+        elif op in ("in", "notin"):
+            if not isinstance(value, (list, tuple)):
+                raise ValueError(f"Filter '{op}' on {column} requires a list value")
+            value_set = _filter_value(value, data_type, column, op)
+            condition = field.isin(value_set) if op == "in" else ~field.isin(value_set)
+        elif op == "isnull":
+            condition = field.is_null()
+        elif op == "notnull":
+            condition = field.is_valid()
+        elif op == "contains":
+            if not (pa.types.is_string(data_type) or pa.types.is_large_string(data_type)):
+                raise ValueError(f"Filter 'contains' requires a text column, {column} is {data_type}")
+            condition = pc.match_substring(field, str(value))
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+class DatasetRegistry:
+    """
+    数据集注册表：每个上传的数据集以Parquet保存在 datasets/<id>.parquet，
+    结构、行数等信息记录在datasets表中；读取时内存映射并只加载需要的列
+    """
+
+    def __init__(self, directory: Union[str, Path] = DATASET_DIR):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+
+    def get(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        with get_db() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(DATASET_COLUMNS)} FROM datasets WHERE id = ?", (dataset_id,)
+            ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        with get_db() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(DATASET_COLUMNS)} FROM datasets WHERE content_hash = ? "
+                f"ORDER BY created_at LIMIT 1", (content_hash,)
+            ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        with get_db() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(DATASET_COLUMNS)} FROM datasets ORDER BY created_at DESC"
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def _register(self, name: str, content_hash: str, write) -> Dict[str, Any]:
+        """调用 write(临时路径) 生成Parquet文件并登记；相同内容已登记时直接返回已有记录"""
+        existing = self.find_by_hash(content_hash)
+        if existing:
+            return existing
+        # 写文件和生成画像不持锁，文件名唯一，不同数据集可并行导入
+        self.directory.mkdir(parents=True, exist_ok=True)
+        dataset_id = str(uuid.uuid4())
+        path = self.directory / f"{dataset_id}.parquet"
+        tmp = path.with_suffix(".parquet.tmp")
+        try:
+            rows, schema = write(tmp)
+            os.replace(tmp, path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        self._write_profile(path)
+        record = {
+            "id": dataset_id,
+            "name": name,
+            "content_hash": content_hash,
+            "path": str(path),
+            "row_count": rows,
+            "column_count": len(schema),
+            "schema": json.dumps([{"name": f.name, "type": str(f.type)} for f in schema]),
+            "file_size": path.stat().st_size,
+            "version": 1,
+            "created_at": datetime.now().isoformat(),
+        }
+        # 锁只覆盖去重检查和插入
+        with self._lock:
+            existing = self.find_by_hash(content_hash)
+            if existing is None:
+                with get_db() as conn:
+                    conn.execute(
+                        f"INSERT INTO datasets ({', '.join(DATASET_COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(DATASET_COLUMNS))})",
+                        tuple(record[c] for c in DATASET_COLUMNS)
+                    )
+                    conn.commit()
+        if existing:
+            # 并发导入了相同内容，丢弃本次生成的文件
+            for produced in (path, self._profile_path(path)):
+                if produced.exists():
+                    produced.unlink()
+            return existing
+        logger.info(f"数据集已登记: {name} -> {dataset_id} ({rows} 行)")
+        return {**record, "schema": json.loads(record["schema"])}
+
+    def register_table(self, table: pa.Table, name: str, content_hash: str) -> Dict[str, Any]:
+        """登记内存中的Arrow表"""
+        def write(tmp):
+            pq.write_table(table, tmp, compression="zstd")
+            return table.num_rows, table.schema
+        return self._register(name, content_hash, write)
+
+    def register_csv(self, path: Union[str, Path], name: str, content_hash: str,
+                     memory_limit: int = None) -> Dict[str, Any]:
+        """分块流式导入CSV（不把整个文件读入内存）"""
+        return self._register(
+            name, content_hash, lambda tmp: write_csv_as_parquet(path, tmp, memory_limit)
+        )
+
+    def delete(self, dataset_id: str) -> bool:
+        record = self.get(dataset_id)
+        if record is None:
+            return False
+        with get_db() as conn:
+            conn.execute("DELETE FROM datasets WHERE id = ?", (dataset_id,))
+            conn.commit()
+        for path in (record["path"], self._profile_path(record["path"])):
+            if os.path.exists(path):
+                os.remove(path)
+        return True
+
+    @staticmethod
+    def _profile_path(path: Union[str, Path]) -> Path:
+        return Path(path).with_suffix(".profile.json")
+
+    def _write_profile(self, path: Union[str, Path]) -> Dict[str, Any]:
+        """生成列画像并保存在Parquet文件旁"""
+        profile = profile_parquet(path)
+        target = self._profile_path(path)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(profile, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, target)
+        return profile
+
+    def profile(self, dataset_id: str) -> Dict[str, Any]:
+        """导入时生成的列画像（类型、空值数、最小/最大值、去重数估计、直方图）；旧数据集首次访问时生成"""
+        record = self.get(dataset_id)
+        if record is None:
+            raise KeyError(dataset_id)
+        try:
+            return json.loads(self._profile_path(record["path"]).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return self._write_profile(record["path"])
+
+    def column_profile(self, dataset_id: str, column: str) -> Optional[Dict[str, Any]]:
+        return next((c for c in self.profile(dataset_id)["columns"] if c["name"] == column), None)
+
+    def parquet_file(self, dataset_id: str) -> pq.ParquetFile:
+        record = self.get(dataset_id)
+        if record is None:
+            raise KeyError(dataset_id)
+        return _open_parquet(record["path"], os.stat(record["path"]).st_mtime_ns)
+
+    def read(self, dataset_id: str, columns: Optional[Sequence[str]] = None) -> pa.Table:
+        """只读取指定列（内存映射，不复制整个文件）"""
+        record = self.get(dataset_id)
+        if record is None:
+            raise KeyError(dataset_id)
+        if columns is not None:
+            known = {field["name"] for field in record["schema"]}
+            unknown = [c for c in columns if c not in known]
+            if unknown:
+                raise ValueError(f"Unknown columns: {unknown}")
+        return pq.read_table(record["path"], columns=list(columns) if columns else None, memory_map=True)
+
+    def to_pandas(self, dataset_id: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        return self.read(dataset_id, columns).to_pandas()
+
+    def query(
+        self,
+        dataset_id: str,
+        columns: Optional[Sequence[str]] = None,
+        filters: Sequence[Dict[str, Any]] = (),
+        sort: Sequence[Tuple[str, bool]] = (),
+        limit: int = 100,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        分页查询：只读取需要的列，按过滤条件和行组统计信息跳过行组
+        sort为 (列名, 是否降序) 列表；未排序时游标记录行组位置，翻页不重新扫描前面的行组
+        返回 {"table", "total", "next_cursor", "offset"}
+        """
+        record = self.get(dataset_id)
+        if record is None:
+            raise KeyError(dataset_id)
+        known = [field["name"] for field in record["schema"]]
+        columns = list(columns) if columns else known
+        sort_columns = [column for column, _ in sort]
+        unknown = [c for c in columns + sort_columns if c not in known]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}")
+        dataset = pads.dataset(record["path"], format="parquet")
+        expression = build_filter(filters, dataset.schema)
+        try:
+            total = dataset.count_rows(filter=expression) if expression is not None else record["row_count"]
+        except (pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+            # 兜底：表达式绑定到列类型时才发现的不支持的比较（ArrowInvalid本身是ValueError）
+            raise ValueError(f"Unsupported filter: {e}")
+
+        row_group, skip = decode_cursor(cursor, record["version"]) if cursor else (None, offset)
+        if cursor and (row_group == -1) != bool(sort):
+            raise ValueError("Cursor does not match the query's sort order")
+        if sort:
+            # 排序需要读取所有满足条件的行，但只读取投影列和排序列
+            start = skip
+            needed = list(dict.fromkeys(columns + sort_columns))
+            table = dataset.to_table(columns=needed, filter=expression)
+            indices = pc.sort_indices(
+                table,
+                sort_keys=[(column, "descending" if descending else "ascending") for column, descending in sort],
+                null_placement="at_end"
+            )
+            page = table.take(indices[start:start + limit]).select(columns)
+            end = start + page.num_rows
+            next_cursor = encode_cursor(record["version"], -1, end) if end < total else None
+            return {"table": page, "total": total, "next_cursor": next_cursor, "offset": start}
+
+        pieces = list(next(dataset.get_fragments()).split_by_row_group(expression, schema=dataset.schema))
+        position = None
+        if row_group is None:
+            # 按偏移量翻页：跨过的行组只统计行数（无过滤条件时直接读取元数据）
+            row_group, position = 0, skip
+            for piece in pieces:
+                # 无过滤条件时行组片段的count_rows会返回整个文件的行数，直接用行组元数据
+                count = piece.row_groups[0].num_rows if expression is None else piece.count_rows(filter=expression)
+                if skip < count:
+                    break
+                skip -= count
+                row_group = piece.row_groups[0].id + 1
+
+        tables, collected, next_cursor = [], 0, None
+        remaining = [piece for piece in pieces if piece.row_groups[0].id >= row_group]
+        for i, piece in enumerate(remaining):
+            table = piece.to_table(columns=columns, filter=expression, schema=dataset.schema).slice(skip)
+            taken = table.slice(0, limit - collected)
+            tables.append(taken)
+            collected += taken.num_rows
+            if collected >= limit:
+                group = piece.row_groups[0].id
+                if taken.num_rows < table.num_rows:
+                    next_cursor = encode_cursor(record["version"], group, skip + taken.num_rows)
+                elif i + 1 < len(remaining):
+                    next_cursor = encode_cursor(record["version"], group + 1, 0)
+                break
+            skip = 0
+        page = pa.concat_tables(tables) if tables else dataset.schema.empty_table().select(columns)
+        return {"table": page, "total": total, "next_cursor": next_cursor, "offset": position}
+
+    def preview_table(self, dataset_id: str, limit: int = 5) -> pa.Table:
+        """读取前limit行（只解码第一批数据）"""
+        parquet = self.parquet_file(dataset_id)
+        if limit <= 0 or parquet.metadata.num_rows == 0:
+            return parquet.schema_arrow.empty_table()
+        return pa.Table.from_batches([next(parquet.iter_batches(batch_size=limit))])
+
+    def preview(self, dataset_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+        return self.preview_table(dataset_id, limit).to_pylist()
+
+
+# 单例实例
+dataset_registry = DatasetRegistry()
@@ -0,0 +1,197 @@
+import os
+import json
+import base64
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Set, Tuple
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_COLUMNS = (
+    "id", "filename", "content_hash", "blob", "file_size", "type", "origin",
+    "upload_time", "extracted", "vectorized", "analyzed", "summary", "updated_at"
+)
+STATUS_COLUMNS = ("extracted", "vectorized", "analyzed")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(upload_time: str, doc_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{upload_time}|{doc_id}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        upload_time, doc_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return upload_time, doc_id
+
+
+def _row_to_dict(row) -> Dict[str, Any]:
+    record = dict(zip(DOCUMENT_COLUMNS, row))
+    for column in STATUS_COLUMNS:
+        record[column] = bool(record[column])
+    return record
+
+
+class DocumentCatalog:
+    """文档目录：按ID/内容哈希索引的上传文档记录及处理状态"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        record = {
+            "type": "document",
+            "origin": "upload",
+            "extracted": False,
+            "vectorized": False,
+            "analyzed": False,
+            "summary": None,
+            "updated_at": datetime.now().isoformat(),
+            **record
+        }
+        with get_db() as conn:
+            conn.execute(
+                f"INSERT INTO documents ({', '.join(DOCUMENT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(DOCUMENT_COLUMNS))})",
+                tuple(record[c] for c in DOCUMENT_COLUMNS)
+            )
+            conn.commit()
+        return record
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with get_db() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents WHERE id = ?", (doc_id,)
+            ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def find_by_hash(self, content_hash: str, filename: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql = f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents WHERE content_hash = ?"
+        params: tuple = (content_hash,)
+        if filename is not None:
+            sql += " AND filename = ?"
+            params += (filename,)
+        with get_db() as conn:
+            return [_row_to_dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    def delete(self, doc_id: str) -> int:
+        """删除记录，返回仍引用同一存储文件的记录数"""
+        with self._lock, get_db() as conn:
+            row = conn.execute("SELECT blob FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return 0
+            conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            remaining = conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE blob = ?", (row[0],)
+            ).fetchone()[0]
+            conn.commit()
+        return remaining
+
+    def update_status(self, content_hash: str, **values: Any):
+        """按内容哈希更新状态（同一内容的所有记录共享处理结果）"""
+        allowed = set(STATUS_COLUMNS) | {"summary"}
+        unknown = set(values) - allowed
+        if unknown:
+            raise ValueError(f"Unknown status columns: {sorted(unknown)}")
+        if not values:
+            return
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        params = [int(v) if isinstance(v, bool) else v for v in values.values()]
+        with get_db() as conn:
+            conn.execute(
+                f"UPDATE documents SET {assignments}, updated_at = ? WHERE content_hash = ?",
+                (*params, datetime.now().isoformat(), content_hash)
+            )
+            conn.commit()
+
+    def list_page(
+        self,
+        limit: Optional[int] = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        doc_type: Optional[str] = None,
+        origin: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """按上传时间倒序的游标分页，返回 (当前页, 下一页游标)；limit为None时返回全部"""
+        if limit is not None:
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+        conditions, params = [], []
+        if doc_type:
+            conditions.append("type = ?")
+            params.append(doc_type)
+        if origin:
+            conditions.append("origin = ?")
+            params.append(origin)
+        if cursor:
+            upload_time, doc_id = decode_cursor(cursor)
+            conditions.append("(upload_time, id) < (?, ?)")
+            params.extend([upload_time, doc_id])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with get_db() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents {where} "
+                f"ORDER BY upload_time DESC, id DESC LIMIT ?",
+                (*params, -1 if limit is None else limit + 1)
+            ).fetchall()
+        items = [_row_to_dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last["upload_time"], last["id"])
+        return items, next_cursor
+
+    def import_files_db(self, path: str) -> int:
+        """迁移旧的 files_db.json 记录，完成后重命名原文件"""
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'r') as f:
+            records = json.load(f)
+        imported = 0
+        for record in records.values():
+            try:
+                self.add({k: record.get(k) for k in DOCUMENT_COLUMNS if k in record})
+                imported += 1
+            except sqlite3.IntegrityError:
+                pass
+        os.replace(path, path + ".migrated")
+        logger.info(f"已从 {path} 迁移 {imported} 条文档记录")
+        return imported
+
+    def blob_names(self) -> Set[str]:
+        """所有记录引用的存储文件名"""
+        with get_db() as conn:
+            return {row[0] for row in conn.execute("SELECT blob FROM documents").fetchall()}
+
+    def register_untracked(self, upload_dir: str, hash_file) -> int:
+        """登记上传目录中尚无记录的早期文件（以文件名为ID）"""
+        known = self.blob_names()
+        registered = 0
+        for entry in os.scandir(upload_dir):
+            if not entry.is_file() or entry.name.startswith('.') or entry.name in known:
+                continue
+            stat = entry.stat()
+            try:
+                self.add({
+                    "id": os.path.splitext(entry.name)[0],
+                    "filename": entry.name,
+                    "content_hash": hash_file(entry.path),
+                    "blob": entry.name,
+                    "file_size": stat.st_size,
+                    "upload_time": datetime.fromtimestamp(stat.st_ctime).isoformat(),
+                })
+                registered += 1
+            except sqlite3.IntegrityError:
+                logger.warning(f"文件ID冲突，跳过登记: {entry.name}")
+        if registered:
+            logger.info(f"已登记 {registered} 个早期上传文件")
+        return registered
+
+
+# 单例实例
+document_catalog = DocumentCatalog()
@@ -1,26 +1,11 @@
-from pdfminer.high_level import extract_text as extract_pdf_text
-from docx import Document as DocxDocument
-import torch
-from transformers import AutoModelForCausalLM
+from utils.text_extraction import iter_segments, join_segments
+from model_pool import model_pool
 
 def extract_text(content: bytes, filename: str) -> str:
-    if filename.endswith('.pdf'):
-        return extract_pdf_text(io.BytesIO(content))
-    elif filename.endswith('.docx'):
-        doc = DocxDocument(io.BytesIO(content))
-        return "\n".join([p.text for p in doc.paragraphs])
-    elif filename.endswith('.txt'):
-        return content.decode('utf-8')
-    else:
-        raise ValueError("Unsupported file format")
+    # 与 utils.text_extraction 共用同一提取引擎
+    return join_segments(iter_segments(content, filename, skip_empty=False))
 
-async def analyze_with_llm(model: str, prompt: str, max_tokens: int):
-    # 实际实现应包含设备检测
-    device = "mps" if torch.backends.mps.is_available() else "cpu" # 自动检测MPS可用性
-    model = AutoModelForCausalLM.from_pretrained(model).to(device) # 自动切换设备
-    # 实现大模型调用逻辑
-    # 示例实现：
-    from transformers import pipeline
-    generator = pipeline('text-generation', model=model)
-    result = generator(prompt, max_length=max_tokens)
-    return result[0]['generated_text'] 
\ No newline at end of file
+async def analyze_with_llm(model: str, prompt: str, max_tokens: int, device: str = None):
+    # 模型与pipeline由模型池缓存（默认按 MPS > CUDA > CPU 自动选择设备），
+    # 生成在专用线程池中执行，不阻塞事件循环
+    return await model_pool.generate(model, prompt, max_tokens, device=device)
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Collection, Dict, List, Optional, Tuple
+from document_catalog import document_catalog
+from utils.file_response import READ_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent.resolve()
+EXPORT_DIR = BASE_DIR / "exports"
+UPLOAD_DIR = BASE_DIR / "uploads"
+
+# 导出文件自最后一次使用起保留的小时数
+EXPORT_TTL_HOURS = float(os.getenv("EXPORT_TTL_HOURS", "24"))
+# exports/ 目录占用上限，超出时先删除最久未使用的导出
+EXPORT_DISK_LIMIT = int(os.getenv("EXPORT_DISK_LIMIT", str(1024 * 1024 * 1024)))
+# uploads/ 目录占用上限，超出时删除最久未使用的派生文件（如翻译结果）；文档库引用的上传文件不删除
+UPLOAD_DISK_LIMIT = int(os.getenv("UPLOAD_DISK_LIMIT", str(10 * 1024 * 1024 * 1024)))
+# 后台清理间隔（秒）
+STORAGE_CLEANUP_INTERVAL = int(os.getenv("STORAGE_CLEANUP_INTERVAL", "3600"))
+
+# 写入中途失败留下的临时文件，超过STALE_TEMP_AGE秒后删除
+TEMP_PREFIXES = (".upload-", ".export-")
+STALE_TEMP_AGE = 3600
+
+
+def export_key(kind: str, payload: Dict[str, Any]) -> str:
+    """导出类型 + 规范化后的导出内容的哈希"""
+    raw = json.dumps({"kind": kind, **payload}, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def chat_export_key(messages: List[Dict[str, Any]], document_text: str) -> str:
+    """聊天导出只与各消息的角色、内容和文档内容有关"""
+    return export_key("chat", {
+        "messages": [[bool(msg.get('isUser')), msg.get('content', 'No content')] for msg in messages],
+        "documentText": document_text
+    })
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def prune_directory(
+    directory: Path,
+    max_bytes: Optional[int] = None,
+    ttl: Optional[float] = None,
+    keep: Collection[str] = (),
+    now: Optional[float] = None,
+) -> Tuple[int, int]:
+    """
+    清理目录中的文件：过期的临时文件直接删除；超过ttl秒未修改的文件删除；
+    总大小仍超过max_bytes时按修改时间从旧到新删除。keep中的文件计入总大小但不删除，
+    其他以.开头的文件忽略。返回 (删除的文件数, 释放的字节数)
+    """
+    now = time.time() if now is None else now
+    removed = freed = total = 0
+    candidates = []
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0, 0
+    for entry in entries:
+        try:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        age = now - stat.st_mtime
+        if entry.name.startswith(TEMP_PREFIXES):
+            if age > STALE_TEMP_AGE and _remove(entry.path):
+                removed, freed = removed + 1, freed + stat.st_size
+            continue
+        if entry.name.startswith("."):
+            continue
+        if entry.name not in keep:
+            if ttl is not None and age > ttl:
+                if _remove(entry.path):
+                    removed, freed = removed + 1, freed + stat.st_size
+                continue
+            candidates.append((stat.st_mtime, entry.path, stat.st_size))
+        total += stat.st_size
+
+    if max_bytes is not None and total > max_bytes:
+        for _, path, size in sorted(candidates):
+            if total <= max_bytes:
+                break
+            if _remove(path):
+                removed, freed = removed + 1, freed + size
+            total -= size
+        if total > max_bytes:
+            logger.warning(f"{directory} 占用 {total} 字节，超过上限 {max_bytes}（剩余文件均不可删除）")
+    return removed, freed
+
+
+class ExportStore:
+    """
+    内容寻址的导出文件：exports/<导出内容哈希>.docx，相同内容的导出直接复用；
+    后台任务按TTL（自最后一次使用起）和磁盘上限清理 exports/，按磁盘上限清理 uploads/ 中的派生文件
+    """
+
+    def __init__(
+        self,
+        export_dir: Path = EXPORT_DIR,
+        upload_dir: Path = UPLOAD_DIR,
+        ttl: float = EXPORT_TTL_HOURS * 3600,
+        export_limit: int = EXPORT_DISK_LIMIT,
+        upload_limit: int = UPLOAD_DISK_LIMIT,
+        interval: float = STORAGE_CLEANUP_INTERVAL,
+    ):
+        self.export_dir = Path(export_dir)
+        self.upload_dir = Path(upload_dir)
+        self.ttl = ttl
+        self.export_limit = export_limit
+        self.upload_limit = upload_limit
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def path(self, key: str, suffix: str = ".docx") -> Path:
+        return self.export_dir / f"{key}{suffix}"
+
+    def get(self, key: str, suffix: str = ".docx") -> Optional[Path]:
+        """已有的导出文件；命中时刷新修改时间，TTL和磁盘上限按最后使用时间淘汰"""
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, source: BinaryIO, suffix: str = ".docx") -> Path:
+        """从文件对象的当前位置复制到内容寻址路径，并保证 exports/ 不超过磁盘上限"""
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path(key, suffix)
+        tmp = self.export_dir / f".export-{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as out:
+                shutil.copyfileobj(source, out, READ_CHUNK_SIZE)
+            os.replace(tmp, path)
+        finally:
+            _remove(str(tmp))
+        prune_directory(self.export_dir, self.export_limit, keep={path.name})
+        return path
+
+    def adopt(self, key: str, path: str, suffix: str = ".docx", keep: Collection[str] = ()) -> Path:
+        """把已写好的临时文件（须在导出目录中）移动到内容寻址路径；keep为调用方仍在使用、不能清理的文件名"""
+        target = self.path(key, suffix)
+        os.replace(path, target)
+        prune_directory(self.export_dir, self.export_limit, keep={target.name, *keep})
+        return target
+
+    def cleanup(self) -> Dict[str, int]:
+        exports, exports_freed = prune_directory(self.export_dir, self.export_limit, self.ttl)
+        uploads, uploads_freed = prune_directory(
+            self.upload_dir, self.upload_limit, keep=document_catalog.blob_names()
+        )
+        if exports or uploads:
+            logger.info(f"已清理 {exports} 个导出文件、{uploads} 个上传目录文件，"
+                        f"释放 {(exports_freed + uploads_freed) / (1024 * 1024):.1f} MB")
+        return {"exports": exports, "uploads": uploads, "freed_bytes": exports_freed + uploads_freed}
+
+    async def _cleanup_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.cleanup)
+            except Exception as e:
+                logger.error(f"清理导出/上传目录失败: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """启动后台定时清理任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._cleanup_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# 单例实例
+export_store = ExportStore()
@@ -0,0 +1,275 @@
+import os
+import time
+import asyncio
+import logging
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+import faiss
+import numpy as np
+from database import get_db
+from chunk_store import ChunkStoreDocstore, IndexToDocstoreId, get_chunk_store
+from document_catalog import document_catalog
+from model_pool import detect_device
+from upload_store import artifact_path
+from artifact_cache import artifact_cache, DEFAULT_CHUNKS, SUMMARY_CHUNKS
+from utils.summary_generation import summarize_document
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+# 各阶段的并发数，可通过环境变量调整
+STAGE_WORKERS = {
+    "extract": int(os.getenv("PIPELINE_EXTRACT_WORKERS", "4")),
+    "chunk": int(os.getenv("PIPELINE_CHUNK_WORKERS", "4")),
+    "embed": int(os.getenv("PIPELINE_EMBED_WORKERS", "1")),
+    "index": int(os.getenv("PIPELINE_INDEX_WORKERS", "2")),
+    "summarize": int(os.getenv("PIPELINE_SUMMARIZE_WORKERS", "2")),
+}
+
+# 问答时从文档向量索引中检索的分块数
+QA_RETRIEVAL_K = int(os.getenv("QA_RETRIEVAL_K", "6"))
+
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> HuggingFaceEmbeddings:
+    """进程内共享的向量模型"""
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={'device': detect_device()}
+    )
+
+
+# ---- 各阶段实现：按内容哈希读写产物，已完成的阶段直接复用 ----
+
+def extract_stage(job: Dict[str, Any]):
+    artifact_cache.segments(job["content_hash"], job["path"], job["filename"])
+
+
+def chunk_stage(job: Dict[str, Any]):
+    artifact_cache.chunks(job["content_hash"], job["path"], job["filename"], config=DEFAULT_CHUNKS)
+
+
+def embed_stage(job: Dict[str, Any]):
+    if artifact_path(job["content_hash"], "faiss").exists():
+        return
+    job["chunks"] = artifact_cache.chunks(
+        job["content_hash"], job["path"], job["filename"], config=DEFAULT_CHUNKS
+    ).items()
+    job["vectors"] = get_embeddings().embed_documents([c["text"] for c in job["chunks"]])
+
+
+def index_stage(job: Dict[str, Any]):
+    index_dir = artifact_path(job["content_hash"], "faiss")
+    if index_dir.exists():
+        return
+    chunks, vectors = job.pop("chunks"), job.pop("vectors")
+    # 分块文本写入共享的分块存储，索引目录只保存向量和对应的分块ID
+    ids = get_chunk_store().append(job["content_hash"], [(c["text"], c["page"]) for c in chunks])
+    # 先写临时目录再改名，避免中断后留下不完整的索引
+    tmp_dir = index_dir.with_name("faiss.tmp")
+    tmp_dir.mkdir(exist_ok=True)
+    if chunks:
+        matrix = np.asarray(vectors, dtype="float32")
+        index = faiss.IndexFlatL2(matrix.shape[1])
+        index.add(matrix)
+        faiss.write_index(index, str(tmp_dir / "index.faiss"))
+    with open(tmp_dir / "ids.bin", "wb") as f:
+        array("Q", ids).tofile(f)
+    os.replace(tmp_dir, index_dir)
+
+
+def load_vectorstore(content_hash: str) -> Optional[FAISS]:
+    """加载文档的向量索引；分块文本按需从分块存储读取，不整体载入内存"""
+    index_dir = artifact_path(content_hash, "faiss")
+    if (index_dir / "ids.bin").exists():
+        if not (index_dir / "index.faiss").exists():
+            return None
+        ids = array("Q")
+        ids.frombytes((index_dir / "ids.bin").read_bytes())
+        return FAISS(
+            get_embeddings(),
+            faiss.read_index(str(index_dir / "index.faiss")),
+            ChunkStoreDocstore(get_chunk_store()),
+            IndexToDocstoreId(ids)
+        )
+    if (index_dir / "index.pkl").exists():
+        # 早期通过save_local保存的索引（docstore在pickle中）
+        return FAISS.load_local(str(index_dir), get_embeddings(), allow_dangerous_deserialization=True)
+    return None
+
+
+def retrieve_chunks(content_hash: str, question: str, k: int = QA_RETRIEVAL_K) -> Optional[List[Document]]:
+    """从文档的向量索引中检索与问题最相关的k个分块；文档尚未建立索引时返回None"""
+    vectorstore = load_vectorstore(content_hash)
+    if vectorstore is None:
+        return None
+    return vectorstore.similarity_search(question, k=k)
+
+
+async def summarize_stage(job: Dict[str, Any]):
+    record = document_catalog.find_by_hash(job["content_hash"])
+    if record and record[0]["summary"]:
+        return
+    chunks = artifact_cache.chunks(job["content_hash"], job["path"], job["filename"], config=SUMMARY_CHUNKS)
+    summary = await summarize_document(job["content_hash"], chunks.texts)
+    document_catalog.update_status(job["content_hash"], summary=summary)
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable
+    workers: int
+    catalog_flag: Optional[str] = None  # 阶段完成后置为True的目录状态列
+
+
+STAGES = [
+    Stage("extract", extract_stage, STAGE_WORKERS["extract"], "extracted"),
+    Stage("chunk", chunk_stage, STAGE_WORKERS["chunk"]),
+    Stage("embed", embed_stage, STAGE_WORKERS["embed"]),
+    Stage("index", index_stage, STAGE_WORKERS["index"], "vectorized"),
+    Stage("summarize", summarize_stage, STAGE_WORKERS["summarize"], "analyzed"),
+]
+
+
+class IngestionPipeline:
+    """
+    后台文档入库流水线：extract → chunk → embed → index → summarize
+    每个阶段有独立的线程池限制并发；同一内容哈希只处理一次，状态变化写入ingestion_jobs表
+    """
+
+    def __init__(self, stages: List[Stage] = STAGES):
+        self.stages = stages
+        self._executors = {
+            stage.name: ThreadPoolExecutor(max_workers=stage.workers, thread_name_prefix=f"ingest-{stage.name}")
+            for stage in stages
+        }
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._completed = deque(maxlen=1000)  # (完成时间, 耗时秒数)
+        self._stage_seconds = {stage.name: [0, 0.0] for stage in stages}
+        self._started_at = time.time()
+
+    def _save_job(self, content_hash: str, **values: Any):
+        values["updated_at"] = datetime.now().isoformat()
+        assignments = ", ".join(f"{k} = ?" for k in values)
+        with get_db() as conn:
+            conn.execute(
+                f"UPDATE ingestion_jobs SET {assignments} WHERE content_hash = ?",
+                (*values.values(), content_hash)
+            )
+            conn.commit()
+
+    def get_job(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        with get_db() as conn:
+            row = conn.execute(
+                "SELECT content_hash, stage, status, progress, error, created_at, updated_at, finished_at "
+                "FROM ingestion_jobs WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("content_hash", "stage", "status", "progress", "error", "created_at", "updated_at", "finished_at")
+        return dict(zip(keys, row))
+
+    def submit(self, content_hash: str, path: str, filename: str, force: bool = False) -> Dict[str, Any]:
+        """加入队列；已完成或正在处理的内容不会重复处理"""
+        job = self.get_job(content_hash)
+        if content_hash in self._tasks or (job and job["status"] == "done" and not force):
+            return job
+        now = datetime.now().isoformat()
+        with get_db() as conn:
+            conn.execute('''
+                INSERT INTO ingestion_jobs
+                (content_hash, path, filename, stage, status, progress, error, created_at, updated_at, finished_at)
+                VALUES (?, ?, ?, ?, 'queued', 0, NULL, ?, ?, NULL)
+                ON CONFLICT(content_hash) DO UPDATE SET
+                    path = excluded.path, filename = excluded.filename, stage = excluded.stage,
+                    status = 'queued', error = NULL, updated_at = excluded.updated_at, finished_at = NULL
+            ''', (content_hash, path, filename, self.stages[0].name, now, now))
+            conn.commit()
+        task = asyncio.create_task(self._run({"content_hash": content_hash, "path": path, "filename": filename}))
+        self._tasks[content_hash] = task
+        task.add_done_callback(lambda _: self._tasks.pop(content_hash, None))
+        return self.get_job(content_hash)
+
+    async def _run_stage(self, stage: Stage, job: Dict[str, Any]):
+        if asyncio.iscoroutinefunction(stage.fn):
+            semaphore = self._semaphores.setdefault(stage.name, asyncio.Semaphore(stage.workers))
+            async with semaphore:
+                await stage.fn(job)
+        else:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executors[stage.name], stage.fn, job)
+
+    async def _run(self, job: Dict[str, Any]):
+        content_hash = job["content_hash"]
+        started = time.time()
+        for i, stage in enumerate(self.stages):
+            self._save_job(content_hash, stage=stage.name, status="running", progress=i / len(self.stages))
+            stage_started = time.perf_counter()
+            try:
+                await self._run_stage(stage, job)
+            except Exception as e:
+                logger.error(f"入库失败 [{stage.name}] {content_hash}: {str(e)}")
+                self._save_job(content_hash, status="failed", error=f"{stage.name}: {str(e)}")
+                return
+            elapsed = time.perf_counter() - stage_started
+            self._stage_seconds[stage.name][0] += 1
+            self._stage_seconds[stage.name][1] += elapsed
+            if stage.catalog_flag:
+                document_catalog.update_status(content_hash, **{stage.catalog_flag: True})
+            logger.info(f"入库阶段完成 [{stage.name}] {content_hash} ({elapsed:.2f}s)")
+        self._save_job(content_hash, status="done", progress=1.0, finished_at=datetime.now().isoformat())
+        self._completed.append((time.time(), time.time() - started))
+
+    def resume(self):
+        """服务重启后继续处理未完成的任务"""
+        with get_db() as conn:
+            rows = conn.execute(
+                "SELECT content_hash, path, filename FROM ingestion_jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+        for content_hash, path, filename in rows:
+            if os.path.exists(path):
+                self.submit(content_hash, path, filename, force=True)
+        if rows:
+            logger.info(f"恢复 {len(rows)} 个未完成的入库任务")
+
+    def stats(self, window_seconds: int = 600) -> Dict[str, Any]:
+        now = time.time()
+        recent = [t for t, _ in self._completed if now - t <= window_seconds]
+        uptime = max(now - self._started_at, 1e-9)
+        return {
+            "active": len(self._tasks),
+            "completed": len(self._completed),
+            "docs_per_minute": round(len(recent) / (min(window_seconds, uptime) / 60), 2),
+            "avg_doc_seconds": round(
+                sum(d for _, d in self._completed) / len(self._completed), 2
+            ) if self._completed else None,
+            "stages": {
+                name: {
+                    "workers": self._executors[name]._max_workers,
+                    "runs": runs,
+                    "avg_seconds": round(total / runs, 3) if runs else None
+                }
+                for name, (runs, total) in self._stage_seconds.items()
+            }
+        }
+
+    def shutdown(self):
+        for task in self._tasks.values():
+            task.cancel()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+
+
+# 单例实例
+ingestion_pipeline = IngestionPipeline()
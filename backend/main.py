@@ -1,53 +1,65 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Response, Header, Depends, APIRouter, Request
+from fastapi import FastAPI, HTTPException, Response, Header, Depends, APIRouter, Request
 from fastapi import Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
 import os
-import tempfile
+import time
+import asyncio
 import logging
 from typing import Optional, Literal, List, Dict, Any
 from langchain_ollama import OllamaLLM
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain.chains import ConversationalRetrievalChain
 import torch
 from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
 from docx import Document
-from docx.shared import Inches, Pt
+from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 import re
 from google.cloud import translate_v2 as translate
 from sentence_transformers import SentenceTransformer, util
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel, Field, ValidationError
 from datetime import datetime
 import ssl
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 from transformers import MBartForConditionalGeneration, MBart50TokenizerFast
-import io
 import uuid
 from fastapi.security import APIKeyHeader
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 import pandas as pd
-import matplotlib.pyplot as plt
 import base64
-from document_processing import extract_text, analyze_with_llm
+from document_processing import analyze_with_llm
+from model_pool import model_pool
+from upload_store import (
+    store_upload, spool_request_upload, artifact_path, hash_file,
+    ARTIFACT_DIR, MAX_UPLOAD_SIZE, MAX_DATASET_SIZE, MULTIPART_OVERHEAD, PDF_MAGIC
+)
+from document_catalog import document_catalog, DEFAULT_PAGE_SIZE
+from dataset_registry import dataset_registry
+from chart_cache import chart_cache, chart_key, CHART_MEDIA_TYPES
+from chart_rendering import chart_renderer, render_chart, render_dataset_chart, CHART_TYPES
+from ingestion_pipeline import ingestion_pipeline, get_embeddings, retrieve_chunks
+from artifact_cache import artifact_cache, TRANSLATION_CHUNKS
+from utils.file_response import file_response, etag_matches, content_disposition
+from utils.table_response import negotiate_format, table_response
+from utils.docx_export import DOCX_MEDIA_TYPE, build_chat_export, build_report, save_spooled, spooled_response
+from export_store import export_store, chat_export_key
+from bulk_export import bulk_exporter, MAX_BULK_EXPORTS
 import hashlib
-from utils.text_extraction import extract_text
+import traceback
 from utils.summary_generation import generate_summary
 import json
 from api.prompts import PromptCreate, app as prompts_router
+from prompt_registry import prompt_registry
+from prompt_templates import COMPLIANCE_TEMPLATE, CSR_TEMPLATE, PREDEFINED_PROMPTS
 from fastapi.exceptions import RequestValidationError
 from database import init_db
-import glob
 from pathlib import Path
-import shutil
-import numpy as np
-from azure_model_service import azure_service, get_azure_service
+from azure_model_service import azure_service, get_azure_service, AZURE_MAX_BATCH_PROMPTS
+from usage_tracking import usage_tracker, preflight, fit_to_prompt, OLLAMA_NUM_CTX
 from langchain.chat_models import AzureChatOpenAI
 from auth import get_current_user, User  # 显式导入User类
 from fastapi.security import OAuth2PasswordBearer
@@ -73,7 +85,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],   # 允许所有方法
     allow_headers=["*"],   # 允许所有头
-    expose_headers=["Content-Disposition"]  # 暴露必要头信息
+    expose_headers=["Content-Disposition", "X-Next-Cursor", "X-Dataset-Meta", "ETag", "Last-Modified", "Content-Range", "Accept-Ranges"]  # 暴露必要头信息
 )
 
 # 获取项目根目录
@@ -94,16 +106,23 @@ LANGUAGE_CODES = {
 }
 
 
+# 保持模型常驻内存，避免重复加载并保留提示词前缀的KV缓存
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
 mistral = OllamaLLM(
     base_url='http://localhost:11434',
     model="mistral:latest",
-    temperature=0.7
+    temperature=0.7,
+    num_ctx=OLLAMA_NUM_CTX,
+    keep_alive=OLLAMA_KEEP_ALIVE
 )
 
 llama = OllamaLLM(
     base_url='http://localhost:11434',
     model="llama3.2-vision:11b",
-    temperature=0.7
+    temperature=0.7,
+    num_ctx=OLLAMA_NUM_CTX,
+    keep_alive=OLLAMA_KEEP_ALIVE
 )
 
 def init_translation_model():
@@ -152,46 +171,33 @@ def init_translation_model():
         logger.error(f"错误堆栈: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"模型加载错误: {str(e)}")
 
-def process_pdf(file_path, tokenizer, translation_model, device):
+def process_pdf(file_path, tokenizer, translation_model, device, base_filename=None, content_hash=None):
     try:
         logger.info(f"开始处理PDF文件: {file_path}")
         
         os.makedirs(UPLOAD_DIR, exist_ok=True)
         
         logger.info("正在加载PDF文件...")
-        loader = PyPDFLoader(file_path)
-        pages = loader.load()
-        logger.info(f"PDF加载完成，共 {len(pages)} 页")
-        
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800,
-            chunk_overlap=50,
-            length_function=len,
-            separators=["\n\n", "\n", "。", ".", "；", ";", "，", ",", "！", "!", "？", "?"]
-        )
         
-        all_chunks = []
+        # 分块结果按内容哈希和分块配置缓存，同一PDF只解析一次
+        chunks = artifact_cache.chunks(
+            content_hash or artifact_cache.hash_for_path(file_path),
+            file_path,
+            "document.pdf",
+            config=TRANSLATION_CHUNKS
+        )
+        all_chunks = [{'page': item['page'], 'content': item['text']} for item in chunks.items()]
         original_texts = []
         translated_texts = []
+        page_count = len({item["page"] for item in all_chunks})
         
-        for i, page in enumerate(pages):
-            text = page.page_content.strip()
-            if not text:
-                continue
-                
-            page_chunks = text_splitter.split_text(text)
-            
-            for chunk in page_chunks:
-                all_chunks.append({
-                    'page': i + 1,
-                    'content': chunk
-                })
-        
+        logger.info(f"PDF加载完成，共 {page_count} 页有文本")
         logger.info(f"文本分割完成，共 {len(all_chunks)} 个片段")
         
-        base_filename = os.path.basename(file_path)
-        if base_filename.endswith('.pdf'):
-            base_filename = base_filename[:-4]
+        if base_filename is None:
+            base_filename = os.path.basename(file_path)
+            if base_filename.endswith('.pdf'):
+                base_filename = base_filename[:-4]
             
         txt_file = os.path.join(UPLOAD_DIR, f"translated_{base_filename}.txt")
         docx_file = os.path.join(UPLOAD_DIR, f"translated_{base_filename}.docx")
@@ -346,43 +352,42 @@ def translate_text(text: str, tokenizer, model, device="cpu"):
         logger.error(f"翻译函数出错: {str(e)}")
         raise HTTPException(status_code=500, detail=f"翻译错误: {str(e)}")
 
+def load_cached_translation(content_hash: str):
+    """读取已缓存的翻译结果（对应的下载文件需仍然存在）"""
+    cache_file = ARTIFACT_DIR / content_hash[:2] / content_hash / "translation.json"
+    if not cache_file.exists():
+        return None
+    with open(cache_file, encoding="utf-8") as f:
+        result = json.load(f)
+    if not all(os.path.exists(os.path.join(UPLOAD_DIR, name)) for name in result["files"].values()):
+        return None
+    return result
+
 @app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request):
     tmp_path = None
     try:
-        logger.info(f"开始处理文件: {file.filename}")
-        
-        if not file.filename.lower().endswith('.pdf'):
-            logger.error("不支持的文件类型")
-            raise HTTPException(status_code=400, detail="只支持PDF文件")
-        
-        try:
-            content = await file.read()
-            file_size = len(content)
-            logger.info(f"文件大小: {file_size / (1024*1024):.2f} MB")
+        def check_filename(filename: str):
+            logger.info(f"开始处理文件: {filename}")
+            if not filename.lower().endswith('.pdf'):
+                logger.error("不支持的文件类型")
+                raise HTTPException(status_code=400, detail="只支持PDF文件")
+
+        # 直接解析请求体，分块写入临时文件，边写边计算哈希并校验PDF文件头，超过大小上限立即中止
+        spooled = await spool_request_upload(
+            request, max_size=MAX_UPLOAD_SIZE, magic=PDF_MAGIC, check_filename=check_filename
+        )
+        tmp_path = str(spooled.path)
+        content_hash = spooled.content_hash
+        logger.info(f"文件大小: {spooled.size / (1024*1024):.2f} MB，临时文件: {tmp_path}")
             
-            if file_size == 0:
-                logger.error("文件为空")
-                raise HTTPException(status_code=400, detail="文件为空")
-                
-            if file_size > 500 * 1024 * 1024:
-                logger.error("文件太大")
-                raise HTTPException(status_code=400, detail="文件大小超过500MB")
-                
-        except Exception as e:
-            logger.error(f"读取文件失败: {str(e)}")
-            raise HTTPException(status_code=400, detail="文件读取失败")
-        
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(content)
-                tmp_path = tmp_file.name
-                logger.info(f"临时文件已创建: {tmp_path}")
-        except Exception as e:
-            logger.error(f"创建临时文件失败: {str(e)}")
-            raise HTTPException(status_code=500, detail="无法创建临时文件")
+            # 相同内容的翻译结果按内容哈希复用
+            cached = load_cached_translation(content_hash)
+            if cached is not None:
+                logger.info(f"命中翻译缓存: {content_hash}")
+                return JSONResponse(content=cached)
             
-        try:
             logger.info("开始初始化翻译模型...")
             tokenizer, translation_model, device = init_translation_model()
             logger.info(f"翻译模型初始化完成，使用设备: {device}")
@@ -392,7 +397,9 @@ async def upload_file(file: UploadFile = File(...)):
                 tmp_path,
                 tokenizer,
                 translation_model,
-                device
+                device,
+                base_filename=content_hash,
+                content_hash=content_hash
             )
             
             if not success:
@@ -413,7 +420,7 @@ async def upload_file(file: UploadFile = File(...)):
                 raise HTTPException(status_code=500, detail="TXT文件生成失败")
             
             logger.info("文件处理成功完成")
-            return JSONResponse(content={
+            result = {
                 "message": "文件处理成功",
                 "files": {
                     "docx": docx_filename,
@@ -421,8 +428,13 @@ async def upload_file(file: UploadFile = File(...)):
                 },
                 "original_text": original_text,
                 "translated_text": translated_text
-            })
+            }
+            with open(artifact_path(content_hash, "translation.json"), "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+            return JSONResponse(content=result)
             
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"处理过程中出错: {str(e)}")
             import traceback
@@ -437,6 +449,8 @@ async def upload_file(file: UploadFile = File(...)):
                 except Exception as e:
                     logger.error(f"清理临时文件失败: {str(e)}")
                 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"上传处理失败: {str(e)}")
         import traceback
@@ -444,29 +458,22 @@ async def upload_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/downloads/{filename}")
-async def download_file(filename: str):
+async def download_file(filename: str, request: Request):
     try:
         file_path = os.path.join(UPLOAD_DIR, filename)
         logger.info(f"尝试下载文件: {file_path}")
         
-        if not os.path.exists(file_path):
+        if os.path.basename(filename) != filename or not os.path.isfile(file_path):
             logger.error(f"文件不存在: {file_path}")
             raise HTTPException(status_code=404, detail="文件不存在")
         
         content_type = ('application/vnd.openxmlformats-officedocument.wordprocessingml.document'
                        if filename.endswith('.docx') else 'text/plain')
         
-        with open(file_path, 'rb') as f:
-            file_content = f.read()
-            
-        return Response(
-            content=file_content,
-            media_type=content_type,
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Access-Control-Expose-Headers': 'Content-Disposition'
-            }
-        )
+        # 直接发送文件，不读入内存；支持ETag/304和Range断点续传
+        return file_response(request, file_path, content_type, filename=filename)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"下载文件时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -602,6 +609,19 @@ async def translate(request: TranslationRequest):
         logger.error(f"翻译错误: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+QA_INSTRUCTIONS = """你是一个专业的医学文献问答助手。请基于下面提供的医学文献内容，回答用户的问题。
+请用专业、准确且易懂的语言回答问题。如果文献中没有相关信息，请回答"抱歉，文献中没有找到相关信息。"
+"""
+
+def qa_prompt(document_text: str, question: str) -> str:
+    return QA_INSTRUCTIONS + f"""
+
+医学文献内容：
+{document_text}
+
+用户问题：{question}
+"""
+
 class QuestionRequest(BaseModel):
     question: str
     file_path: str
@@ -616,24 +636,25 @@ async def question_answer(request: QuestionRequest):
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="文档不存在")
             
-        with open(file_path, 'r', encoding='utf-8') as f:
-            document_text = f.read()
+        content_hash = artifact_cache.hash_for_path(file_path)
+        # 文档已由入库流水线建立向量索引时，只把与问题最相关的分块放入提示词
+        chunks = await asyncio.to_thread(retrieve_chunks, content_hash, request.question)
+        if chunks:
+            document_text = "\n\n".join(chunk.page_content for chunk in chunks)
+        else:
+            # 提取文本按内容哈希缓存，重复提问不再重新解析文档
+            document_text = artifact_cache.text(content_hash, file_path, request.file_path)
             
-        ollama = OllamaLLM(base_url='http://localhost:11434', model="mistral:latest")
-        
-        prompt = f"""你是一个专业的医学文献问答助手。请基于以下医学文献内容，回答用户的问题。
-如果文献中没有相关信息，请直接说明。
-
-医学文献内容：
-{document_text}
-
-用户问题：{request.question}
-
-请用专业、准确且易懂的语言回答问题。如果文献中没有相关信息，请回答"抱歉，文献中没有找到相关信息。"
-"""
+        # 固定说明在前，文献与问题在后，便于复用提示词前缀；超出上下文时只截断文献内容，问题保持完整
+        document_text = fit_to_prompt(
+            document_text, qa_prompt("", request.question), mistral.model
+        )
+        prompt, _ = preflight(qa_prompt(document_text, request.question), mistral.model)
         
         try:
-            response = ollama.invoke(prompt, temperature=request.temperature)
+            started_at = time.perf_counter()
+            response = mistral.invoke(prompt, temperature=request.temperature)
+            usage_tracker.record_local("/api/qa", mistral.model, prompt, response, started_at)
             logger.info(f"生成的回答: {response}")
             
             return {"answer": response}
@@ -725,154 +746,44 @@ async def generate_text(request: TextGenerationRequest):
         model = llama if request.llm_model == 'llama' else mistral
         
         # 根据不同的模板选择不同的处理逻辑
-        if request.template == 'compliance':
-            # 合规检查的模板
-            template = COMPLIANCE_TEMPLATE
-        elif request.template == 'csr':
-            # CSR生成的模板
-            template = CSR_TEMPLATE
-        else:
+        template_id = GENERATION_TEMPLATE_IDS.get(request.template)
+        if template_id is None:
             raise HTTPException(status_code=400, detail="Unsupported template type")
         
-        prompt = template.format(text=request.text)
+        prompt = prompt_registry.render(template_id, text=request.text)
+        prompt, _ = preflight(prompt, model.model)
         
-        try:
-            # 尝试使用MPS加速
-            model = load_local_model('mistral', device='mps')
-        except RuntimeError as e:
-            if 'MPS not available' in str(e):
-                # 回退到CPU
-                model = load_local_model('mistral', device='cpu')
-                logger.warning("MPS不可用，已回退到CPU模式")
-            else:
-                raise
-        
-        response = model(prompt)
+        started_at = time.perf_counter()
+        response = model.invoke(prompt)
+        usage_tracker.record_local("/api/generate", model.model, prompt, response, started_at)
         
         return TextGenerationResponse(
             generatedText=response.strip(),
             model_used=request.llm_model or "mistral"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"生成失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# 定义合规检查模板
-COMPLIANCE_TEMPLATE = {
-    "id": "fda-compliance",
-    "title": "FDA Compliance Check",
-    "content": """Please analyze the following text for regulatory compliance:
-
-Text to analyze: {text}
-
-Please provide your analysis in the following structured format:
-
-1. Understanding the Context and Scope:
-• Provide a brief overview of the document's context
-• Identify the type of submission and regulatory framework
-
-2. Identifying Gaps in Provided Documents:
-• List each identified gap using lettered sub-points (a, b, c, etc.)
-• For each gap, cite the specific regulatory requirement it fails to meet
-
-3. Addressing Specific Areas of Focus:
-• Pharmacokinetics: Required data and current status
-• Toxicology: Required studies and current status
-• Safety Pharmacology: Required studies and current status
-
-4. FDA-Specific Considerations:
-• List specific FDA requirements
-• Identify any FDA-specific gaps""",
-    "isDefault": True,
-    "modelType": "compliance",
-    "category": "regulatory"
-}
-
-# 定义 CSR 生成模板
-CSR_TEMPLATE = {
-    "id": "csr-generation",
-    "title": "CSR Generation (NDA)",
-    "content": """Generate a Clinical Study Report (CSR) for an FDA NDA submission based on the content extracted from the provided file.
-
-Content to analyze: {text}
-
-Please generate a comprehensive Clinical Study Report (CSR) with the following structure:
-
-1. Structure & Table of Contents
-• Title Page
-• Synopsis
-• Table of Contents (detailing every major section)
-• List of Abbreviations and Definitions of Terms
-• Ethics
-• IRB/IEC approvals
-• Ethical conduct statement
-• Investigators and Study Administrative Structure
-• Introduction
-• Study Objectives
-• Primary Objectives
-• Secondary Objectives
-• Exploratory Objectives (if applicable)
-• Investigational Plan
-• Study Design
-• Study Population
-• Treatment/Study Medication Details
-• Efficacy Evaluation
-• Safety Evaluation
-• Statistical Methods
-• Sample Size Rationale
-• Analysis Methods for Efficacy and Safety
-• Results
-• Participant Disposition
-• Demographics and Baseline Characteristics
-• Efficacy Results
-• Safety Results (including AEs/SAEs)
-• Discussion and Conclusions
-• References
-• Appendices (e.g., Protocol, Sample CRFs, Patient Data Listings, etc.)
-
-Note: Please maintain professional, scientific language and present data objectively. Include both positive and negative findings where available.""",
-    "isDefault": True,
-    "modelType": "generation",
-    "category": "csr"
-}
 
 @app.post("/api/download-report")
 async def download_report(request: dict):
     try:
         content = request.get('content')
         file_name = request.get('fileName')
-        
-        doc = Document()
-        
-        title = doc.add_heading('Compliance Check Report', 0)
-        title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        date_paragraph = doc.add_paragraph()
-        date_paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        date_paragraph.add_run(datetime.now().strftime("%Y-%m-%d")).italic = True
-        
-        for line in content.split('\n'):
-            if line.strip():
-                if line.startswith('  '):  
-                    p = doc.add_paragraph()
-                    p.paragraph_format.left_indent = Inches(0.5)
-                    p.add_run(line.strip())
-                else:  
-                    doc.add_paragraph(line)
-        
-        f = io.BytesIO()
-        doc.save(f)
-        f.seek(0)
-        
-        return Response(
-            content=f.read(),
-            media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            headers={
-                'Content-Disposition': f'attachment; filename="{file_name}"'
-            }
-        )
-        
+        if not isinstance(content, str):
+            raise HTTPException(status_code=400, detail="content is required")
+
+        # 生成到临时文件（小文档只在内存中）后直接流式返回
+        doc = await asyncio.to_thread(build_report, content)
+        spool = await asyncio.to_thread(save_spooled, doc)
+        return spooled_response(spool, file_name or "Compliance_Check_Report.docx")
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"生成报告失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -888,16 +799,11 @@ async def log_message(request: dict):
         logger.error(f"Failed to log message: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# 在文件顶部添加预定义提示词
-PREDEFINED_PROMPTS = [CSR_TEMPLATE, COMPLIANCE_TEMPLATE]
-
-# 修改获取提示词的API端点
-@app.get("/api/prompts")
-async def get_prompts():
-    return JSONResponse({
-        "defaultPrompts": PREDEFINED_PROMPTS,  
-        "userPrompts": get_user_prompts_from_db()
-    })
+# /api/generate 的模板参数与预定义提示词ID的对应关系
+GENERATION_TEMPLATE_IDS = {
+    'compliance': COMPLIANCE_TEMPLATE["id"],
+    'csr': CSR_TEMPLATE["id"]
+}
 
 @app.middleware("http")
 async def validate_api_key(request: Request, call_next):
@@ -936,40 +842,42 @@ async def execute_prompt(request: ExecutionRequest):
         logger.error("执行请求缺少提示词ID")
         raise HTTPException(status_code=422, detail="Prompt ID is required")
     
-    # 获取完整提示词
-    prompt = next((p for p in prompt_storage["default"] + prompt_storage["users"].get("demo-user", []) 
-                  if p["id"] == request.prompt_id), None)
-    
-    if not prompt:
+    # 从提示词索引中渲染完整提示
+    try:
+        full_prompt = prompt_registry.render(request.prompt_id, text=request.text)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Prompt not found")
     
-    # 构建完整提示
-    full_prompt = prompt["content"].replace("{text}", request.text)
-    
     # 根据模型类型调用不同处理
     if request.model == 'llama':
-        result = compliance_check(full_prompt)
+        result = compliance_check(full_prompt, endpoint="/api/execute")
     else:
-        result = generate_content(full_prompt)
+        result = generate_content(full_prompt, endpoint="/api/execute")
     
     return {"result": result}
 
 # 添加生成函数
-def generate_content(prompt: str) -> str:
+def generate_content(prompt: str, endpoint: str = "generate_content") -> str:
     """调用LLM生成内容"""
     try:
-        llm = OllamaLLM(model="mistral")
-        return llm.invoke(prompt)
+        prompt, _ = preflight(prompt, mistral.model)
+        started_at = time.perf_counter()
+        result = mistral.invoke(prompt)
+        usage_tracker.record_local(endpoint, mistral.model, prompt, result, started_at)
+        return result
     except Exception as e:
         logging.error(f"生成内容失败: {str(e)}")
         raise HTTPException(status_code=500, detail="生成失败")
 
 # 添加合规检查函数
-def compliance_check(prompt: str) -> str:
+def compliance_check(prompt: str, endpoint: str = "compliance_check") -> str:
     """调用LLM进行合规检查"""
     try:
-        llm = OllamaLLM(model="llama3.2-vision:11b")
-        return llm.invoke(prompt)
+        prompt, _ = preflight(prompt, llama.model)
+        started_at = time.perf_counter()
+        result = llama.invoke(prompt)
+        usage_tracker.record_local(endpoint, llama.model, prompt, result, started_at)
+        return result
     except Exception as e:
         logging.error(f"合规检查失败: {str(e)}")
         raise HTTPException(status_code=500, detail="合规检查失败")
@@ -1024,25 +932,24 @@ template_db = [
 ]
 
 @app.get("/api/sources")
-async def get_all_sources():
+async def get_all_sources(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    type: Optional[str] = None,
+    origin: Optional[str] = None
+):
     try:
-        document_files = glob.glob(os.path.join(UPLOAD_DIR, "*"))
-        return [
-            {
-                "id": os.path.splitext(os.path.basename(f))[0],  # 使用文件名作为ID
-                "name": os.path.basename(f),  # 返回实际文件名
-                "type": "document",
-                "origin": "upload",
-                "size": str(os.path.getsize(f)),
-                "uploadDate": datetime.fromtimestamp(
-                    os.path.getctime(f)
-                ).isoformat(),
-                "vectorized": True,
-                "analyzed": False
-            }
-            for f in document_files
-            if not os.path.basename(f).startswith('.')  # 排除隐藏文件
-        ]
+        # 目录表分页查询，下一页游标通过响应头返回，保持响应体为列表
+        # 未指定limit和cursor时返回全部文档（兼容不翻页的旧客户端）
+        if limit is None and cursor is not None:
+            limit = DEFAULT_PAGE_SIZE
+        items, next_cursor = document_catalog.list_page(limit, cursor, type, origin)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return [format_source(record) for record in items]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取文档列表失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1056,105 +963,206 @@ class VisualizationConfig(BaseModel):
     chartType: str
     xAxis: str
     yAxis: str
+    aggregation: Optional[Literal['none', 'sum', 'mean', 'count']] = None  # 按X分组聚合Y
+    bins: Optional[int] = Field(None, ge=2, le=500)  # 数值型X等宽分箱
+    maxPoints: Optional[int] = Field(None, ge=3, le=20000)  # 折线图降采样后的点数
 
 class DatasetInfo(BaseModel):
     data: List[Dict[str, Any]]
     columns: List[str]
 
 class VisualizationRequest(BaseModel):
-    dataset: DatasetInfo
+    datasetId: Optional[str] = None
+    dataset: Optional[DatasetInfo] = None  # 旧版客户端直接传数据
     config: VisualizationConfig
+    format: Literal['png', 'svg'] = 'png'
+
+class DatasetFilter(BaseModel):
+    column: str
+    op: Literal['eq', 'ne', 'lt', 'le', 'gt', 'ge', 'in', 'notin', 'isnull', 'notnull', 'contains']
+    value: Any = None
+
+class DatasetSort(BaseModel):
+    column: str
+    descending: bool = False
+
+class DatasetQuery(BaseModel):
+    columns: Optional[List[str]] = None  # 为空时返回全部列
+    filters: List[DatasetFilter] = []  # 多个条件为AND
+    sort: List[DatasetSort] = []
+    limit: int = Field(100, ge=1, le=10000)
+    offset: int = Field(0, ge=0)
+    cursor: Optional[str] = None  # 上一页返回的nextCursor，优先于offset
+
+def get_dataset_or_404(dataset_id: str) -> Dict[str, Any]:
+    record = dataset_registry.get(dataset_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    return record
+
+def format_dataset(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": record["id"],
+        "name": record["name"],
+        "rows": record["row_count"],
+        "columns": [field["name"] for field in record["schema"]],
+        "schema": record["schema"],
+        "fileSize": record["file_size"],
+        "version": record["version"],
+        "createdAt": record["created_at"]
+    }
 
 # 添加API端点
-dataset_storage = {}
-
 @app.post("/api/datasets/upload")
-async def upload_dataset(file: UploadFile):
+async def upload_dataset(request: Request):
+    stored = None
     try:
-        logger.info(f"Received dataset upload: {file.filename}")
-        content = await file.read()
-        logger.info(f"File content read: {len(content)} bytes")
-        
-        # 使用 pandas 读取 CSV，添加数据类型处理
-        df = pd.read_csv(
-            io.StringIO(content.decode('utf-8')),
-            low_memory=False,  # 防止混合类型警告
-            na_values=['NA', 'N/A', ''],  # 处理缺失值
-            dtype_backend='numpy_nullable'  # 使用新的 dtype 后端处理混合类型
+        # 直接解析请求体流式写入临时文件，解析后以Parquet登记，相同内容直接复用
+        stored = await spool_request_upload(request, max_size=MAX_DATASET_SIZE)
+        logger.info(f"Received dataset upload: {stored.filename}")
+        record = await asyncio.to_thread(
+            dataset_registry.register_csv, stored.path, stored.filename, stored.content_hash
         )
-        
-        # 处理无限和非法浮点数值
-        for column in df.select_dtypes(include=['float64']).columns:
-            # 将无限值替换为 NaN
-            df[column] = df[column].replace([np.inf, -np.inf], np.nan)
-            # 将 NaN 替换为 None (会被转换为 JSON 中的 null)
-            df[column] = df[column].where(pd.notnull(df[column]), None)
+        logger.info(f"Dataset loaded: {record['row_count']} rows, {record['column_count']} columns")
 
-        logger.info(f"Dataset loaded: {len(df)} rows, {len(df.columns)} columns")
-        
-        # 确保返回正确的列信息和数据格式
+        data = await asyncio.to_thread(dataset_registry.preview, record["id"], 100)
+        profile = await asyncio.to_thread(dataset_registry.profile, record["id"])
         return {
             "message": "Dataset uploaded successfully",
-            "rows": len(df),
-            "columns": df.columns.tolist(),  # 返回列名列表
-            "data": df.head(100).to_dict('records'),  # 返回前100行数据
-            "preview": df.head(5).to_dict('records')  # 返回前5行预览
+            "datasetId": record["id"],
+            **format_dataset(record),
+            "profile": profile["columns"],
+            "data": data,  # 返回前100行数据
+            "preview": data[:5]  # 返回前5行预览
         }
-        
+
+    except HTTPException:
+        raise
+    except MemoryError as e:
+        logger.error(f"Dataset upload failed: {str(e)}")
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        logger.error(f"Dataset upload failed: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Dataset upload failed: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process dataset: {str(e)}"
         )
+    finally:
+        if stored and os.path.exists(stored.path):
+            os.unlink(stored.path)
+
+@app.get("/api/datasets")
+async def list_datasets():
+    return [format_dataset(record) for record in dataset_registry.list()]
+
+@app.get("/api/datasets/{dataset_id}")
+async def get_dataset(dataset_id: str):
+    return format_dataset(get_dataset_or_404(dataset_id))
+
+@app.get("/api/datasets/{dataset_id}/profile")
+async def get_dataset_profile(dataset_id: str):
+    """导入时生成的列画像：类型、空值数、最小/最大值、去重数估计、直方图/高频取值"""
+    get_dataset_or_404(dataset_id)
+    profile = await asyncio.to_thread(dataset_registry.profile, dataset_id)
+    return {"datasetId": dataset_id, **profile}
+
+@app.get("/api/datasets/{dataset_id}/preview")
+async def preview_dataset(request: Request, dataset_id: str, limit: int = 100, format: Optional[str] = None):
+    """数据格式按Accept头或format参数协商：records（默认）、columns、arrow"""
+    get_dataset_or_404(dataset_id)
+    if limit < 0 or limit > 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 0 and 1000")
+    fmt = negotiate_format(request, format)
+    table = await asyncio.to_thread(dataset_registry.preview_table, dataset_id, limit)
+    return table_response(table, fmt, {"datasetId": dataset_id})
+
+@app.post("/api/datasets/{dataset_id}/query")
+async def query_dataset(request: Request, dataset_id: str, query: DatasetQuery, format: Optional[str] = None):
+    """按列投影、过滤、排序分页读取数据集（下推到Parquet，只读取需要的列和行组）；返回格式同preview"""
+    get_dataset_or_404(dataset_id)
+    fmt = negotiate_format(request, format)
+    try:
+        result = await asyncio.to_thread(
+            dataset_registry.query,
+            dataset_id,
+            columns=query.columns,
+            filters=[f.model_dump() for f in query.filters],
+            sort=[(s.column, s.descending) for s in query.sort],
+            limit=query.limit,
+            offset=query.offset,
+            cursor=query.cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    table = result["table"]
+    return table_response(table, fmt, {
+        "datasetId": dataset_id,
+        "columns": table.column_names,
+        "total": result["total"],
+        "offset": result["offset"],
+        "nextCursor": result["next_cursor"]
+    })
+
+@app.delete("/api/datasets/{dataset_id}")
+async def delete_dataset(dataset_id: str):
+    if not dataset_registry.delete(dataset_id):
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    chart_cache.invalidate(dataset_id)
+    return {"message": "Dataset deleted"}
+
+def validate_chart_config(config: VisualizationConfig):
+    if not config.xAxis or not config.yAxis:
+        raise HTTPException(status_code=400, detail="Missing axis configuration")
+    if config.chartType not in CHART_TYPES:
+        raise HTTPException(status_code=400, detail="Unsupported chart type")
+
+async def dataset_chart_response(
+    request: Request, dataset_id: str, config: VisualizationConfig, fmt: str
+) -> Response:
+    """按 数据集版本+图表配置 缓存渲染结果，客户端带相同ETag时返回304"""
+    validate_chart_config(config)
+    record = get_dataset_or_404(dataset_id)
+    key = chart_key(record["id"], record["version"], config.model_dump(), fmt)
+    headers = {"ETag": f'"{key}"', "Cache-Control": "private, no-cache"}
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    async def render() -> bytes:
+        # 读取和绘图都在渲染线程池中执行
+        try:
+            return await chart_renderer.run(render_dataset_chart, dataset_id, config.model_dump(), fmt)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    content = await chart_cache.get_or_render(record["id"], key, fmt, render)
+    return Response(content=content, media_type=CHART_MEDIA_TYPES[fmt], headers=headers)
 
 @app.post("/api/generate-visualization")
-async def generate_visualization(config: dict):
+async def generate_visualization(request: VisualizationRequest, http_request: Request):
     try:
-        logger.info(f"Generating visualization with config: {config}")
-        
-        # 获取当前数据集
-        df = pd.DataFrame(current_dataset)
-        
-        # 验证数据列
-        x_col = config.get('xAxis')
-        y_col = config.get('yAxis')
-        chart_type = config.get('chartType', 'bar')
-        
-        if not x_col or not y_col:
-            raise HTTPException(status_code=400, detail="Missing axis configuration")
-            
-        # 自动转换数值类型
-        if not np.issubdtype(df[y_col].dtype, np.number):
-            try:
-                df[y_col] = pd.to_numeric(df[y_col], errors='coerce')
-                df = df.dropna(subset=[y_col])
-                if df.empty:
-                    raise ValueError("No valid numeric data after conversion")
-            except Exception as e:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Column {y_col} cannot be converted to numeric values"
-                )
-        
-        # 生成图表
-        plt.figure(figsize=(10, 6))
-        if chart_type == 'bar':
-            df.plot.bar(x=x_col, y=y_col, ax=plt.gca())
-        elif chart_type == 'line':
-            df.plot.line(x=x_col, y=y_col, ax=plt.gca())
-        elif chart_type == 'pie':
-            df[y_col].value_counts().plot.pie(autopct='%1.1f%%', ax=plt.gca())
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported chart type")
-            
-        # 保存图表
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', bbox_inches='tight')
-        plt.close()
-        img_buffer.seek(0)
-        
-        return StreamingResponse(img_buffer, media_type="image/png")
+        config = request.config
+        logger.info(f"Generating visualization for dataset {request.datasetId} with config: {config}")
+
+        if request.datasetId:
+            return await dataset_chart_response(http_request, request.datasetId, config, request.format)
+        if not request.dataset:
+            raise HTTPException(status_code=400, detail="datasetId is required")
+
+        # 旧版客户端直接传数据：不缓存
+        validate_chart_config(config)
+        columns = list(dict.fromkeys([config.xAxis, config.yAxis]))
+        df = pd.DataFrame(request.dataset.data, columns=request.dataset.columns)
+        missing = [c for c in columns if c not in df.columns]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Unknown columns: {missing}")
+        try:
+            content = await chart_renderer.run(render_chart, df[columns], config.model_dump(), request.format)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return Response(content=content, media_type=CHART_MEDIA_TYPES[request.format])
         
     except HTTPException:
         raise
@@ -1162,6 +1170,22 @@ async def generate_visualization(config: dict):
         logger.error(f"Failed to generate visualization: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/datasets/{dataset_id}/chart")
+async def get_dataset_chart(
+    dataset_id: str,
+    request: Request,
+    config: VisualizationConfig = Depends(),
+    format: Literal['png', 'svg'] = 'png'
+):
+    """可被浏览器按ETag缓存的图表地址（参数同generate-visualization的config）"""
+    try:
+        return await dataset_chart_response(request, dataset_id, config, format)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to generate visualization: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 chat_router = APIRouter()
 
 class ChatMessage(BaseModel):
@@ -1197,18 +1221,11 @@ async def chat_with_word(request: ChatRequest):
             )
         ]
 
-        # 处理文档
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        chunks = text_splitter.split_text(request.document_text)
+        # 处理文档：同一文档内容的分块结果跨请求复用
+        chunks = artifact_cache.text_chunks(request.document_text).texts
         
         # 创建临时向量库
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-mpnet-base-v2",
-            model_kwargs={'device': 'mps'}  # 使用M1/M2 Mac的MPS加速
-        )
+        embeddings = get_embeddings()
         vectorstore = FAISS.from_texts(chunks, embeddings)
 
         # 模型选择核心逻辑
@@ -1233,11 +1250,25 @@ async def chat_with_word(request: ChatRequest):
             )
 
         # 执行对话（保持原有逻辑）
+        started_at = time.perf_counter()
         result = await qa.ainvoke({
             "question": request.question,
             "chat_history": formatted_history,
             "context": request.document_text
         })
+        # 检索链不返回usage，按问题、历史和命中片段估算
+        prompt_text = "\n".join(
+            [request.question]
+            + [q + "\n" + a for q, a in formatted_history]
+            + [d.page_content for d in result.get("source_documents", [])]
+        )
+        usage_tracker.record_local(
+            "/api/chat/word",
+            os.getenv("AZURE_ENGINE", "azure") if use_cloud else getattr(local_model, "model", request.model),
+            prompt_text,
+            result["answer"],
+            started_at
+        )
 
         return {"response": result["answer"]}
         
@@ -1261,93 +1292,68 @@ class DocumentMetadata(BaseModel):
     upload_time: datetime
     file_size: int
     summary: Optional[str] = None
+    blob: str  # 内容寻址的存储文件名
 
-# 文件信息持久化存储路径
+# 旧版文件信息存储路径（启动时迁移到documents表）
 FILES_DB_PATH = os.path.join(os.path.dirname(__file__), "files_db.json")
 
-def load_files_db():
-    if os.path.exists(FILES_DB_PATH):
-        with open(FILES_DB_PATH, 'r') as f:
-            logger.info("Loading files database")
-            return json.load(f)
-    logger.info("Creating new files database")
-    return {}
-
-def save_files_db(files_db):
-    logger.info(f"Saving files database. Current files: {json.dumps(files_db, indent=2)}")
-    with open(FILES_DB_PATH, 'w') as f:
-        json.dump(files_db, f)
-
-# 初始化文件数据库
-stored_files = load_files_db()
-
-def process_document(file_path: str):
-    # 根据文件类型选择加载器
-    if file_path.endswith('.pdf'):
-        loader = PyPDFLoader(file_path)
-    elif file_path.endswith('.docx'):
-        loader = Docx2txtLoader(file_path)
-    else:
-        raise ValueError("Unsupported file format")
+def format_source(record: dict) -> dict:
+    return {
+        "id": record["id"],
+        "name": record["filename"],
+        "type": record["type"],
+        "origin": record["origin"],
+        "size": str(record["file_size"]),
+        "uploadDate": record["upload_time"],
+        "contentHash": record["content_hash"],
+        "extracted": record["extracted"],
+        "vectorized": record["vectorized"],
+        "analyzed": record["analyzed"],
+        "summary": record["summary"] or ""
+    }
 
-    documents = loader.load()
-    
-    # 文本分块
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
-    )
-    chunks = text_splitter.split_documents(documents)
-    
-    # 生成向量存储
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-mpnet-base-v2",
-        model_kwargs={'device': 'mps'}
-    )
-    vectorstore = FAISS.from_documents(chunks, embeddings)
-    
-    # 保存时确保设置正确的序列化选项
-    vectorstore.save_local(
-        "vectorstore",
-        # 如果需要，可以添加其他序列化选项
-    )
-    
-    return chunks
+def find_document(doc_id: str):
+    """按文档ID查找目录记录，返回 (记录, 文件路径)"""
+    record = document_catalog.get(doc_id)
+    if record is None:
+        return None, None
+    return record, os.path.join(UPLOAD_DIR, record["blob"])
 
 @app.post("/api/sources/upload")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(request: Request):
     try:
-        # 生成唯一ID但保留原始文件名
-        file_id = str(uuid.uuid4())
-        original_name = file.filename
-        file_ext = os.path.splitext(original_name)[1]
-        
-        # 保存文件，使用原始文件名
-        file_path = os.path.join(UPLOAD_DIR, original_name)
-        
-        # 如果文件名已存在，添加数字后缀
-        base_name = os.path.splitext(original_name)[0]
-        counter = 1
-        while os.path.exists(file_path):
-            new_name = f"{base_name}_{counter}{file_ext}"
-            file_path = os.path.join(UPLOAD_DIR, new_name)
-            counter += 1
-            
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        return {
-            "document": {
-                "id": file_id,
-                "name": os.path.basename(file_path),
-                "type": "document",
-                "origin": "upload",
-                "size": str(os.path.getsize(file_path)),
-                "uploadDate": datetime.now().isoformat(),
-                "vectorized": False,  # 初始上传时为false
-                "analyzed": False     # 初始上传时为false
-            }
-        }
+        # 直接解析请求体流式写入并计算内容哈希，超过大小上限立即中止；相同内容只存一份
+        blob = await store_upload(request, UPLOAD_DIR, max_size=MAX_UPLOAD_SIZE)
+        filename = blob.filename
+        
+        # 同名同内容的重复上传直接返回已有记录
+        existing = document_catalog.find_by_hash(blob.content_hash, filename)
+        if existing:
+            return {"document": format_source(existing[0]), "duplicate": True}
+        
+        metadata = DocumentMetadata(
+            id=str(uuid.uuid4()),
+            filename=filename,
+            content_hash=blob.content_hash,
+            upload_time=datetime.now(),
+            file_size=blob.size,
+            blob=blob.path.name
+        )
+        # 相同内容此前已处理过时继承其处理状态
+        previous = document_catalog.find_by_hash(blob.content_hash)
+        record = document_catalog.add({
+            **metadata.model_dump(mode="json"),
+            **{k: previous[0][k] for k in ("extracted", "vectorized", "analyzed", "summary") if previous}
+        })
+        logger.info(f"文档已存储: {filename} -> {blob.path.name} (重复内容: {blob.existed})")
+        
+        # 上传后即在后台入库并生成摘要，Source.summary 直接从目录读取
+        if not record["analyzed"]:
+            ingestion_pipeline.submit(blob.content_hash, str(blob.path), filename)
+        
+        return {"document": format_source(record), "duplicate": blob.existed}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1355,27 +1361,30 @@ async def upload_document(file: UploadFile = File(...)):
 @app.delete("/api/sources/{doc_id}")
 async def delete_source(doc_id: str):
     try:
-        # 检查文件是否存在
-        doc_path = os.path.join(UPLOAD_DIR, f"{doc_id}.*")
-        files = glob.glob(doc_path)
+        record, file_path = find_document(doc_id)
         
-        if not files:
+        if file_path is None:
             raise HTTPException(
                 status_code=404,
                 detail="Document not found in uploads directory"
             )
+        
+        # 仍有其他记录引用相同内容时保留文件
+        if document_catalog.delete(doc_id) > 0:
+            logger.info(f"Unlinked document {doc_id}, blob still referenced: {record['blob']}")
+            return {"status": "success"}
             
         # 删除物理文件
-        for file_path in files:
-            try:
+        try:
+            if os.path.exists(file_path):
                 os.remove(file_path)
-                logger.info(f"Deleted file: {file_path}")
-            except Exception as e:
-                logger.error(f"Failed to delete file {file_path}: {str(e)}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Failed to delete file: {str(e)}"
-                )
+            logger.info(f"Deleted file: {file_path}")
+        except Exception as e:
+            logger.error(f"Failed to delete file {file_path}: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to delete file: {str(e)}"
+            )
         
         return {"status": "success"}
         
@@ -1414,24 +1423,16 @@ async def analyze_documents(request: Request):
         }
         
         for doc_id in doc_ids:
-            doc_path = os.path.join(UPLOAD_DIR, f"{doc_id}.*")
-            files = glob.glob(doc_path)
-            if files:
-                file_path = files[0]
-                # 在这里进行向量化处理
-                # ...
-                
+            record, file_path = find_document(doc_id)
+            if record:
+                # 加入后台入库流水线（extract → chunk → embed → index → summarize），
+                # 通过 /api/sources/{doc_id}/status 轮询进度
+                job = ingestion_pipeline.submit(record["content_hash"], file_path, record["filename"])
                 response["documents"].append({
-                    "id": doc_id,
-                    "name": os.path.basename(file_path),
-                    "type": "document",
-                    "origin": "upload",
-                    "size": str(os.path.getsize(file_path)),
-                    "uploadDate": datetime.fromtimestamp(
-                        os.path.getctime(file_path)
-                    ).isoformat(),
-                    "vectorized": True,   # 分析后设置为true
-                    "analyzed": True      # 分析后设置为true
+                    **format_source(record),
+                    "status": job["status"],
+                    "stage": job["stage"],
+                    "progress": job["progress"]
                 })
         
         return response
@@ -1440,6 +1441,27 @@ async def analyze_documents(request: Request):
         logger.error(f"分析文档时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/sources/{doc_id}/status")
+async def get_source_status(doc_id: str):
+    """查询文档的入库进度"""
+    record, _ = find_document(doc_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    job = ingestion_pipeline.get_job(record["content_hash"])
+    return {
+        **format_source(record),
+        "status": job["status"] if job else "not_started",
+        "stage": job["stage"] if job else None,
+        "progress": job["progress"] if job else 0,
+        "error": job["error"] if job else None,
+        "updatedAt": job["updated_at"] if job else None
+    }
+
+@app.get("/api/pipeline/stats")
+async def get_pipeline_stats():
+    """入库流水线吞吐（docs/minute）与各阶段耗时"""
+    return ingestion_pipeline.stats()
+
 def init_uploaded_files():
     """启动时加载已上传文件"""
     UPLOAD_DIR = "uploads"
@@ -1464,13 +1486,61 @@ async def startup_event():
     if os.getenv("USE_CLOUD_MODELS", "false").lower() == "true":
         await azure_service.initialize()
     init_db()
+    prompt_registry.load(PREDEFINED_PROMPTS)
+    usage_tracker.start()
     # 确保上传目录存在
     UPLOAD_DIR = "uploads"
     os.makedirs(UPLOAD_DIR, exist_ok=True)
+    document_catalog.import_files_db(FILES_DB_PATH)
+    document_catalog.register_untracked(UPLOAD_DIR, hash_file)
+    ingestion_pipeline.resume()
+    export_store.start()
+    model_pool.start()
     logger.info("✅ 服务启动完成")
     logger.info(f"当前工作目录：{os.getcwd()}")
     logger.info(f"上传目录内容：{os.listdir(UPLOAD_DIR)}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await usage_tracker.stop()
+    await export_store.stop()
+    model_pool.shutdown()
+    bulk_exporter.shutdown()
+    ingestion_pipeline.shutdown()
+
+@app.get("/api/usage")
+async def get_usage(since: Optional[str] = None, group_by: str = "endpoint"):
+    """按接口/模型返回token用量汇总"""
+    rollups = await asyncio.to_thread(usage_tracker.rollup, since, group_by)
+    return {
+        "group_by": group_by,
+        "since": since,
+        "rollups": rollups,
+        "live": usage_tracker.snapshot()
+    }
+
+# 按路径限制上传请求体大小（multipart边界等额外开销留出余量）
+UPLOAD_SIZE_LIMITS = {
+    "/api/upload": MAX_UPLOAD_SIZE,
+    "/api/sources/upload": MAX_UPLOAD_SIZE,
+    "/api/datasets/upload": MAX_DATASET_SIZE,
+}
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # 根据Content-Length在读取请求体之前拒绝超大上传；
+    # 分块传输（无Content-Length）的请求由 spool_request_upload 在接收过程中限制
+    limit = UPLOAD_SIZE_LIMITS.get(request.url.path)
+    content_length = request.headers.get("content-length", "")
+    if request.method == "POST" and limit and content_length.isdigit() \
+            and int(content_length) > limit + MULTIPART_OVERHEAD:
+        logger.error(f"上传请求过大: {content_length} bytes")
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"文件大小超过{limit // (1024 * 1024)}MB"}
+        )
+    return await call_next(request)
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     logger.info(f"收到请求: {request.method} {request.url}")
@@ -1485,49 +1555,87 @@ async def log_requests(request: Request, call_next):
             content={"message": "Internal server error"}
         )
 
-def sanitize_xml(text: str) -> str:
-    # 移除控制字符（ASCII 0-31，除了换行和制表符）
-    cleaned = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]', '', text)
-    # 替换非法XML字符
-    return cleaned.encode('utf-8', 'ignore').decode('utf-8')
-
 @app.post("/api/export-chat")
 async def export_chat(request: Request):
     try:
         logger.info("开始处理导出请求")
         data = await request.json()
-        # 清洗文档内容
-        doc_text = sanitize_xml(data.get('documentText', 'No document content'))
-        
-        # 创建文档
-        doc = Document()
-        doc.add_heading('Chat Export', 0)
-        
-        # 添加聊天记录（清洗每条消息）
-        for msg in data['messages']:
-            role = "User" if msg.get('isUser') else "AI"
-            content = sanitize_xml(msg.get('content', 'No content'))
-            doc.add_paragraph(f"{role}: {content}")
-        
-        # 添加文档内容
-        if doc_text.strip():
-            doc.add_heading('Current Document', 1)
-            doc.add_paragraph(doc_text)
-        
-        # 保存文件
+        messages = data['messages']
+        document_text = data.get('documentText', 'No document content')
+
+        # 相同的聊天记录和文档内容复用已生成的导出文件
+        key = chat_export_key(messages, document_text)
+        export_path = export_store.get(key)
+        if export_path is None:
+            doc = await asyncio.to_thread(build_chat_export, messages, document_text)
+            with await asyncio.to_thread(save_spooled, doc) as spool:
+                export_path = await asyncio.to_thread(export_store.put, key, spool)
+            logger.info(f"文件已保存到：{export_path}")
+        else:
+            logger.info(f"复用已有导出文件：{export_path}")
+
         filename = f"ChatExport_{datetime.now().strftime('%Y%m%d%H%M%S')}.docx"
-        export_path = os.path.join(EXPORT_DIR, filename)
-        doc.save(export_path)
-        
-        logger.info(f"文件已保存到：{export_path}")
-        return FileResponse(export_path, filename=filename)
+        return file_response(request, str(export_path), DOCX_MEDIA_TYPE, filename=filename)
     except Exception as e:
         logger.error(f"导出失败详情：{traceback.format_exc()}")
         raise HTTPException(500, "导出失败，请检查日志")
 
-EXPORT_DIR = "exports"
-if not os.path.exists(EXPORT_DIR):
-    os.makedirs(EXPORT_DIR)
+class ExportSpec(BaseModel):
+    type: Literal['report', 'chat']
+    fileName: Optional[str] = None
+    content: Optional[str] = None  # 合规检查报告正文
+    messages: List[Dict[str, Any]] = []  # 聊天记录（isUser, content）
+    documentText: str = 'No document content'
+
+class BulkExportRequest(BaseModel):
+    exports: List[ExportSpec]
+    archiveName: Optional[str] = None
+
+@app.post("/api/export-bulk")
+async def export_bulk(request: BulkExportRequest):
+    """批量生成报告/聊天导出，以ZIP流式返回（文档按完成顺序写入，失败的文档列在ERRORS.txt中）"""
+    if not request.exports:
+        raise HTTPException(status_code=400, detail="exports must not be empty")
+    if len(request.exports) > MAX_BULK_EXPORTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_EXPORTS} exports per request")
+    for i, spec in enumerate(request.exports):
+        if spec.type == 'report' and spec.content is None:
+            raise HTTPException(status_code=400, detail=f"exports[{i}]: content is required for reports")
+    specs = [spec.model_dump() for spec in request.exports]
+    archive_name = request.archiveName or f"Exports_{datetime.now().strftime('%Y%m%d%H%M%S')}.zip"
+    if not archive_name.lower().endswith(".zip"):
+        archive_name += ".zip"
+    logger.info(f"开始批量导出 {len(specs)} 份文档")
+    return StreamingResponse(
+        bulk_exporter.stream(specs),
+        media_type="application/zip",
+        headers={"Content-Disposition": content_disposition(os.path.basename(archive_name))}
+    )
+
+class BatchGenerationRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, max_length=AZURE_MAX_BATCH_PROMPTS)
+    model_type: str = "gpt-4o"
+    max_tokens: int = 1000
+    temperature: float = 0.7
+    concurrency: Optional[int] = Field(None, ge=1, le=azure_service.max_concurrency)
+
+@app.post("/api/azure/batch")
+async def azure_batch_generate(request: BatchGenerationRequest):
+    """批量调用Azure模型，结果按输入顺序返回"""
+    service = await get_azure_service()
+    results = await service.generate_batch(
+        request.prompts,
+        model_type=request.model_type,
+        max_tokens=request.max_tokens,
+        temperature=request.temperature,
+        concurrency=request.concurrency,
+        endpoint="/api/azure/batch"
+    )
+    return {
+        "results": results,
+        "succeeded": sum(1 for r in results if r["status"] == "success"),
+        "failed": sum(1 for r in results if r["status"] == "error")
+    }
 
 @app.post("/api/switch-model")
 async def switch_model(
@@ -0,0 +1,237 @@
+import os
+import gc
+import glob
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+
+logger = logging.getLogger(__name__)
+
+
+def detect_device() -> str:
+    """按 MPS > CUDA > CPU 的顺序选择设备"""
+    if torch.backends.mps.is_available():
+        return "mps"
+    if torch.cuda.is_available():
+        return "cuda"
+    return "cpu"
+
+
+def model_size_bytes(model) -> int:
+    """模型参数与缓冲区占用的字节数"""
+    size = sum(p.numel() * p.element_size() for p in model.parameters())
+    size += sum(b.numel() * b.element_size() for b in model.buffers())
+    return size
+
+
+# 模型空闲超过此秒数后卸载（0表示不卸载）
+LOCAL_MODEL_IDLE_SECONDS = float(os.getenv("LOCAL_MODEL_IDLE_SECONDS", "1800"))
+
+# 后台检查空闲模型的间隔（秒）
+LOCAL_MODEL_IDLE_CHECK_SECONDS = float(os.getenv("LOCAL_MODEL_IDLE_CHECK_SECONDS", "60"))
+
+WEIGHT_PATTERNS = ("*.safetensors", "*.bin", "*.pt", "*.pth")
+
+
+def estimate_model_bytes(model_name: str) -> int:
+    """加载前按权重文件大小估算模型占用（本地目录或已下载到HF缓存的模型），无法估算时返回0"""
+    path = model_name
+    if not os.path.isdir(path):
+        try:
+            from huggingface_hub import snapshot_download
+            path = snapshot_download(model_name, local_files_only=True, allow_patterns=list(WEIGHT_PATTERNS))
+        except Exception:
+            return 0
+    files = {f for pattern in WEIGHT_PATTERNS for f in glob.glob(os.path.join(path, "**", pattern), recursive=True)}
+    return sum(os.path.getsize(f) for f in files)
+
+
+@dataclass
+class PooledModel:
+    model: Any
+    tokenizer: Any
+    generator: Any
+    size_bytes: int
+    in_use: int = 0
+    last_used: float = 0.0
+
+
+class ModelPool:
+    """
+    本地因果语言模型缓存池
+    按 (模型名, 设备) 缓存已加载的模型和pipeline，超出内存预算时按LRU淘汰
+    """
+
+    def __init__(self, memory_budget_bytes: Optional[int] = None, max_workers: Optional[int] = None,
+                 idle_seconds: float = LOCAL_MODEL_IDLE_SECONDS):
+        budget_gb = float(os.getenv("LOCAL_MODEL_MEMORY_BUDGET_GB", "16"))
+        self.memory_budget_bytes = memory_budget_bytes or int(budget_gb * 1024 ** 3)
+        self.idle_seconds = idle_seconds
+        self._models: "OrderedDict[Tuple[str, str], PooledModel]" = OrderedDict()
+        # 已加载过的模型的实际占用，再次加载时比按权重文件估算更准确
+        self._known_sizes: Dict[Tuple[str, str], int] = {}
+        # 正在加载的模型预占的内存，并发加载不同模型时各自的淘汰都计入对方
+        self._reserved: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        # 推理在专用线程池中执行，避免阻塞事件循环
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("LOCAL_MODEL_WORKERS", "1")),
+            thread_name_prefix="model-pool"
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._models.values()) + sum(self._reserved.values())
+
+    def _load(self, model_name: str, device: str) -> PooledModel:
+        logger.info(f"加载本地模型: {model_name} ({device})")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForCausalLM.from_pretrained(model_name, low_cpu_mem_usage=True).to(device)
+        model.eval()
+        generator = pipeline('text-generation', model=model, tokenizer=tokenizer, device=torch.device(device))
+        size = model_size_bytes(model)
+        logger.info(f"模型加载完成: {model_name}, 占用 {size / 1024 ** 3:.2f} GB")
+        return PooledModel(model=model, tokenizer=tokenizer, generator=generator, size_bytes=size)
+
+    @staticmethod
+    def _free_memory():
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        if torch.backends.mps.is_available():
+            torch.mps.empty_cache()
+
+    def _evict_for(self, required_bytes: int):
+        """淘汰最久未使用且空闲的模型，直到能容纳新模型"""
+        evicted = False
+        for key in list(self._models):
+            if self.used_bytes + required_bytes <= self.memory_budget_bytes:
+                break
+            entry = self._models[key]
+            if entry.in_use:
+                continue
+            del self._models[key]
+            evicted = True
+            logger.info(f"内存预算不足，淘汰模型: {key[0]} ({key[1]})")
+        if evicted:
+            self._free_memory()
+
+    def unload_idle(self, now: Optional[float] = None) -> int:
+        """卸载空闲超过idle_seconds的模型，返回卸载数"""
+        if not self.idle_seconds:
+            return 0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [key for key, entry in self._models.items()
+                    if not entry.in_use and now - entry.last_used > self.idle_seconds]
+            for key in idle:
+                del self._models[key]
+                logger.info(f"模型空闲超过{self.idle_seconds:.0f}秒，已卸载: {key[0]} ({key[1]})")
+        if idle:
+            self._free_memory()
+        return len(idle)
+
+    def acquire(self, model_name: str, device: Optional[str] = None) -> PooledModel:
+        """获取模型（未缓存时加载），使用完毕需调用release"""
+        key = (model_name, device or detect_device())
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        self.unload_idle()
+        # 同一模型只加载一次，其他请求等待加载完成
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    entry.in_use += 1
+                    return entry
+                estimate = self._known_sizes.get(key)
+            if estimate is None:
+                estimate = estimate_model_bytes(model_name)
+            # 先按估算大小腾出空间并预占，避免加载期间新旧模型同时驻留超出预算
+            with self._lock:
+                self._evict_for(estimate)
+                self._reserved[key] = estimate
+            try:
+                entry = self._load(*key)
+            finally:
+                with self._lock:
+                    self._reserved.pop(key, None)
+            with self._lock:
+                self._known_sizes[key] = entry.size_bytes
+                # 估算偏小时按实际大小再淘汰一次
+                self._evict_for(entry.size_bytes)
+                if self.used_bytes + entry.size_bytes > self.memory_budget_bytes:
+                    logger.warning(
+                        f"模型 {model_name} 超出内存预算 "
+                        f"({(self.used_bytes + entry.size_bytes) / 1024 ** 3:.2f} GB)"
+                    )
+                self._models[key] = entry
+                entry.in_use += 1
+                return entry
+
+    def release(self, entry: PooledModel):
+        with self._lock:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+    def _generate(self, model_name: str, prompt: str, max_tokens: int, device: Optional[str]) -> str:
+        entry = self.acquire(model_name, device)
+        try:
+            with torch.no_grad():
+                result = entry.generator(prompt, max_new_tokens=max_tokens, return_full_text=False)
+            return result[0]['generated_text']
+        finally:
+            self.release(entry)
+
+    async def generate(self, model_name: str, prompt: str, max_tokens: int, device: Optional[str] = None) -> str:
+        """在专用线程池中生成文本"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._generate, model_name, prompt, max_tokens, device
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_bytes": self.memory_budget_bytes,
+                "used_bytes": self.used_bytes,
+                "models": [
+                    {"model": name, "device": device, "size_bytes": entry.size_bytes, "in_use": entry.in_use}
+                    for (name, device), entry in self._models.items()
+                ]
+            }
+
+    async def _idle_loop(self):
+        while True:
+            await asyncio.sleep(LOCAL_MODEL_IDLE_CHECK_SECONDS)
+            try:
+                await asyncio.to_thread(self.unload_idle)
+            except Exception as e:
+                logger.error(f"卸载空闲模型失败: {str(e)}")
+
+    def start(self):
+        """启动后台定时卸载空闲模型的任务"""
+        if self._task is None and self.idle_seconds:
+            self._task = asyncio.create_task(self._idle_loop())
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            self._models.clear()
+
+
+# 单例实例
+model_pool = ModelPool()
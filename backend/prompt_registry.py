@@ -0,0 +1,162 @@
+import re
+import json
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Iterable
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+# 只识别 {name} 形式的占位符，其余花括号（如JSON示例）按原文保留
+PLACEHOLDER_PATTERN = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+PROMPT_COLUMNS = "id, title, content, model_type, scope, task, templates, created_at"
+
+
+class CompiledTemplate:
+    """预解析的提示词模板，渲染时只做片段拼接"""
+
+    __slots__ = ("content", "literals", "fields")
+
+    def __init__(self, content: str):
+        self.content = content
+        self.literals: List[str] = []
+        self.fields: List[str] = []
+        last = 0
+        for match in PLACEHOLDER_PATTERN.finditer(content):
+            self.literals.append(content[last:match.start()])
+            self.fields.append(match.group(1))
+            last = match.end()
+        self.literals.append(content[last:])
+
+    @property
+    def placeholders(self) -> List[str]:
+        return list(dict.fromkeys(self.fields))
+
+    def render(self, **values: str) -> str:
+        """替换占位符，未提供的占位符保留原文"""
+        parts = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            value = values.get(field)
+            parts.append("{" + field + "}" if value is None else str(value))
+            parts.append(literal)
+        return "".join(parts)
+
+
+def format_predefined(prompt):
+    return {
+        "id": prompt["id"],
+        "title": prompt["title"],
+        "content": prompt["content"],
+        "model_type": prompt.get("model_type") or prompt.get("modelType"),  # 兼容新旧字段
+        "scope": "team",
+        "isLibrary": True
+    }
+
+
+def format_prompt(row):
+    return {
+        "id": row[0],
+        "title": row[1],
+        "content": row[2],
+        "model_type": row[3],
+        "scope": row[4],
+        "task": row[5],
+        "templates": json.loads(row[6] or '[]'),
+        "created_at": row[7],
+        "isLibrary": False
+    }
+
+
+class PromptRegistry:
+    """
+    提示词内存索引
+    启动时从预定义模板和prompts表加载一次，增删改路由写库后同步更新
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._predefined: List[Dict[str, Any]] = []
+        self._prompts: Dict[str, Dict[str, Any]] = {}
+        self._compiled: Dict[str, CompiledTemplate] = {}
+        self._loaded = False
+
+    def _index(self, prompt: Dict[str, Any]):
+        self._prompts[prompt["id"]] = prompt
+        self._compiled[prompt["id"]] = CompiledTemplate(prompt["content"])
+
+    def load(self, predefined: Optional[Iterable[Dict[str, Any]]] = None):
+        """加载预定义模板与数据库中的用户提示词"""
+        with self._lock:
+            if predefined is not None:
+                self._predefined = [format_predefined(p) for p in predefined]
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT {PROMPT_COLUMNS} FROM prompts")
+                rows = cursor.fetchall()
+            self._prompts.clear()
+            self._compiled.clear()
+            for prompt in self._predefined:
+                self._index(prompt)
+            for row in rows:
+                self._index(format_prompt(row))
+            self._loaded = True
+            logger.info(f"提示词索引已加载: {len(self._predefined)} 个预定义, {len(rows)} 个用户提示词")
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def refresh(self, prompt_id: str):
+        """写库后重新读取单条记录（不存在则从索引移除）"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {PROMPT_COLUMNS} FROM prompts WHERE id = ?", (prompt_id,))
+            row = cursor.fetchone()
+        with self._lock:
+            self._ensure_loaded()
+            if row is not None:
+                self._index(format_prompt(row))
+            else:
+                self.remove(prompt_id)
+
+    def remove(self, prompt_id: str):
+        with self._lock:
+            if self.is_predefined(prompt_id):
+                return
+            self._prompts.pop(prompt_id, None)
+            self._compiled.pop(prompt_id, None)
+
+    def get(self, prompt_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._prompts.get(prompt_id)
+
+    def compiled(self, prompt_id: str) -> Optional[CompiledTemplate]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._compiled.get(prompt_id)
+
+    def is_predefined(self, prompt_id: str) -> bool:
+        with self._lock:
+            return any(p["id"] == prompt_id for p in self._predefined)
+
+    def render(self, prompt_id: str, **values: str) -> str:
+        """按ID渲染提示词，不存在时抛出KeyError"""
+        template = self.compiled(prompt_id)
+        if template is None:
+            raise KeyError(prompt_id)
+        return template.render(**values)
+
+    def list_prompts(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            self._ensure_loaded()
+            predefined_ids = {p["id"] for p in self._predefined}
+            return {
+                "defaultPrompts": list(self._predefined),
+                "userPrompts": [p for pid, p in self._prompts.items() if pid not in predefined_ids]
+            }
+
+
+# 单例实例
+prompt_registry = PromptRegistry()
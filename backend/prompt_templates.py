@@ -0,0 +1,82 @@
+"""预定义提示词模板（固定指令在前，{text}位于末尾以便复用提示词前缀）"""
+
+# 定义合规检查模板
+COMPLIANCE_TEMPLATE = {
+    "id": "fda-compliance",
+    "title": "FDA Compliance Check",
+    "content": """Please analyze the text provided at the end for regulatory compliance.
+
+Please provide your analysis in the following structured format:
+
+1. Understanding the Context and Scope:
+• Provide a brief overview of the document's context
+• Identify the type of submission and regulatory framework
+
+2. Identifying Gaps in Provided Documents:
+• List each identified gap using lettered sub-points (a, b, c, etc.)
+• For each gap, cite the specific regulatory requirement it fails to meet
+
+3. Addressing Specific Areas of Focus:
+• Pharmacokinetics: Required data and current status
+• Toxicology: Required studies and current status
+• Safety Pharmacology: Required studies and current status
+
+4. FDA-Specific Considerations:
+• List specific FDA requirements
+• Identify any FDA-specific gaps
+
+Text to analyze: {text}""",
+    "isDefault": True,
+    "modelType": "compliance",
+    "category": "regulatory"
+}
+
+# 定义 CSR 生成模板
+CSR_TEMPLATE = {
+    "id": "csr-generation",
+    "title": "CSR Generation (NDA)",
+    "content": """Generate a Clinical Study Report (CSR) for an FDA NDA submission based on the content extracted from the provided file (given at the end).
+
+Please generate a comprehensive Clinical Study Report (CSR) with the following structure:
+
+1. Structure & Table of Contents
+• Title Page
+• Synopsis
+• Table of Contents (detailing every major section)
+• List of Abbreviations and Definitions of Terms
+• Ethics
+• IRB/IEC approvals
+• Ethical conduct statement
+• Investigators and Study Administrative Structure
+• Introduction
+• Study Objectives
+• Primary Objectives
+• Secondary Objectives
+• Exploratory Objectives (if applicable)
+• Investigational Plan
+• Study Design
+• Study Population
+• Treatment/Study Medication Details
+• Efficacy Evaluation
+• Safety Evaluation
+• Statistical Methods
+• Sample Size Rationale
+• Analysis Methods for Efficacy and Safety
+• Results
+• Participant Disposition
+• Demographics and Baseline Characteristics
+• Efficacy Results
+• Safety Results (including AEs/SAEs)
+• Discussion and Conclusions
+• References
+• Appendices (e.g., Protocol, Sample CRFs, Patient Data Listings, etc.)
+
+Note: Please maintain professional, scientific language and present data objectively. Include both positive and negative findings where available.
+
+Content to analyze: {text}""",
+    "isDefault": True,
+    "modelType": "generation",
+    "category": "csr"
+}
+
+PREDEFINED_PROMPTS = [CSR_TEMPLATE, COMPLIANCE_TEMPLATE]
@@ -0,0 +1,229 @@
+import os
+import hashlib
+import logging
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Union
+from fastapi import HTTPException, Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13 只提供 multipart 包名
+    from multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# 流式读写的块大小
+CHUNK_SIZE = 1024 * 1024
+
+# 翻译上传的大小上限
+MAX_UPLOAD_SIZE = 500 * 1024 * 1024
+
+# 数据集（CSV）上传的大小上限
+MAX_DATASET_SIZE = 1024 * 1024 * 1024
+
+# PDF文件头
+PDF_MAGIC = b"%PDF-"
+
+# 所有按内容哈希派生的产物（提取文本、分块、向量、翻译等）的根目录
+ARTIFACT_DIR = Path(__file__).parent.resolve() / "artifacts"
+
+
+# multipart边界、表单字段等请求体中文件以外的开销上限
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+@dataclass
+class StoredBlob:
+    content_hash: str
+    path: Path
+    size: int
+    existed: bool  # 相同内容此前已存储（本次未重复写入）
+    filename: Optional[str] = None
+
+
+def blob_name(content_hash: str, filename: str) -> str:
+    """内容寻址的存储文件名：<sha256><扩展名>"""
+    return f"{content_hash}{os.path.splitext(filename)[1].lower()}"
+
+
+def _commit_blob(tmp_path: str, store_dir: Path, content_hash: str, filename: str, size: int) -> StoredBlob:
+    """将临时文件放到内容寻址路径；内容已存在时丢弃临时文件"""
+    target = store_dir / blob_name(content_hash, filename)
+    if target.exists():
+        os.unlink(tmp_path)
+        logger.info(f"检测到重复内容，复用已存储文件: {target.name}")
+        return StoredBlob(content_hash, target, size, existed=True)
+    os.replace(tmp_path, target)
+    return StoredBlob(content_hash, target, size, existed=False)
+
+
+class _SpoolWriter:
+    """
+    写入已打开的文件，同时计算SHA-256
+    超过max_size或文件头与magic不符时立即抛出HTTPException
+    """
+
+    def __init__(self, out, max_size: Optional[int] = None, magic: Optional[bytes] = None):
+        self.out = out
+        self.max_size = max_size
+        self.magic = magic
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"文件大小超过{self.max_size // (1024 * 1024)}MB"
+            )
+        magic = self.magic
+        if magic and len(self.head) < len(magic):
+            self.head += chunk[:len(magic) - len(self.head)]
+            if not magic.startswith(self.head):
+                raise HTTPException(status_code=400, detail="文件内容与类型不符")
+        self.digest.update(chunk)
+        self.out.write(chunk)
+
+    def finish(self) -> tuple:
+        """返回 (哈希, 大小)"""
+        if self.magic and self.size and self.head != self.magic:
+            raise HTTPException(status_code=400, detail="文件内容与类型不符")
+        return self.digest.hexdigest(), self.size
+
+
+async def spool_request_upload(
+    request: Request,
+    field: str = "file",
+    spool_dir: Optional[Union[str, Path]] = None,
+    max_size: Optional[int] = MAX_UPLOAD_SIZE,
+    magic: Optional[bytes] = None,
+    check_filename: Optional[Callable[[str], None]] = None,
+) -> StoredBlob:
+    """
+    直接解析请求体（multipart/form-data）中名为field的文件，边接收边写入临时文件（调用方负责删除）
+    不经过框架的表单解析：超过大小上限、文件头不符或文件名未通过check_filename时，
+    在收到剩余数据之前立即中止；分块传输（无Content-Length）的请求同样受限
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="需要multipart/form-data格式的上传")
+
+    state = {"headers": {}, "field": b"", "value": b"", "writer": None, "tmp": None, "result": None}
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data: bytes, start: int, end: int):
+        state["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"], state["value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("utf-8", "replace")
+        if name != field or b"filename" not in disposition or state["result"] is not None:
+            return
+        filename = disposition[b"filename"].decode("utf-8", "replace")
+        if check_filename is not None:
+            check_filename(filename)
+        suffix = os.path.splitext(filename)[1].lower()
+        fd, tmp_path = tempfile.mkstemp(dir=spool_dir, prefix=".spool-", suffix=suffix)
+        state["tmp"] = (tmp_path, filename)
+        state["writer"] = _SpoolWriter(os.fdopen(fd, "wb"), max_size=max_size, magic=magic)
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if state["writer"] is not None:
+            state["writer"].write(data[start:end])
+
+    def on_part_end():
+        writer = state["writer"]
+        if writer is None:
+            return
+        state["writer"] = None
+        writer.out.close()
+        content_hash, size = writer.finish()
+        tmp_path, filename = state["tmp"]
+        state["result"] = StoredBlob(content_hash, Path(tmp_path), size, existed=False, filename=filename)
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    # 文件以外的部分（边界、其他字段）也计入上限，防止无文件的超大请求体
+    body_limit = None if max_size is None else max_size + MULTIPART_OVERHEAD
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if body_limit is not None and received > body_limit:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"文件大小超过{max_size // (1024 * 1024)}MB"
+                )
+            try:
+                parser.write(chunk)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="上传内容格式错误")
+        parser.finalize()
+        result = state["result"]
+        if result is None:
+            raise HTTPException(status_code=400, detail="缺少上传文件")
+        if result.size == 0:
+            raise HTTPException(status_code=400, detail="文件为空")
+        return result
+    except BaseException:
+        if state["writer"] is not None:
+            state["writer"].out.close()
+        if state["tmp"] is not None and os.path.exists(state["tmp"][0]):
+            os.unlink(state["tmp"][0])
+        raise
+
+
+async def store_upload(request: Request, store_dir: Union[str, Path], max_size: Optional[int] = MAX_UPLOAD_SIZE) -> StoredBlob:
+    """流式解析上传并同时计算SHA-256，按内容哈希存储"""
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    spooled = await spool_request_upload(request, spool_dir=store_dir, max_size=max_size)
+    try:
+        blob = _commit_blob(str(spooled.path), store_dir, spooled.content_hash, spooled.filename, spooled.size)
+    except BaseException:
+        if spooled.path.exists():
+            spooled.path.unlink()
+        raise
+    blob.filename = spooled.filename
+    return blob
+
+
+def hash_file(path: Union[str, Path]) -> str:
+    """流式计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_dir(content_hash: str) -> Path:
+    """某一内容的派生产物目录"""
+    path = ARTIFACT_DIR / content_hash[:2] / content_hash
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def artifact_path(content_hash: str, name: str) -> Path:
+    return artifact_dir(content_hash) / name
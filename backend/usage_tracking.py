@@ -0,0 +1,295 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+from fastapi import HTTPException
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 为可选依赖，缺失时退回到估算
+    tiktoken = None
+
+# 本地Ollama模型运行时的上下文窗口（num_ctx，token数），创建模型时显式传入
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+
+# 各模型的上下文窗口（token数）；Ollama模型以实际使用的num_ctx为准，否则超出部分会先被Ollama静默截断
+MODEL_CONTEXT_LIMITS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4": 8192,
+    "gpt-35-turbo": 16384,
+    "mistral": OLLAMA_NUM_CTX,
+    "mistral:latest": OLLAMA_NUM_CTX,
+    "llama3.2-vision:11b": OLLAMA_NUM_CTX,
+}
+DEFAULT_CONTEXT_LIMIT = 8192
+
+# 中日韩字符大致一个字一个token，其余按约4个字符一个token估算
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+_encoders: Dict[str, Any] = {}
+
+
+def _get_encoder(model: str):
+    if tiktoken is None:
+        return None
+    if model not in _encoders:
+        try:
+            _encoders[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encoders[model] = tiktoken.get_encoding("cl100k_base")
+    return _encoders[model]
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """统计文本的token数（无tiktoken时为估算值）"""
+    if not text:
+        return 0
+    encoder = _get_encoder(model)
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _truncate_to_tokens(text: str, model: str, budget: int) -> str:
+    encoder = _get_encoder(model)
+    if encoder is not None:
+        return encoder.decode(encoder.encode(text, disallowed_special=())[:budget])
+    # 估算模式下按比例截断后再逐步收紧
+    end = max(0, int(len(text) * budget / max(count_tokens(text, model), 1)))
+    while end > 0 and count_tokens(text[:end], model) > budget:
+        end -= max(1, (end // 50))
+    return text[:end]
+
+
+def preflight(
+    prompt: str,
+    model: str,
+    max_tokens: int = 0,
+    policy: str = "truncate",
+    context_limit: Optional[int] = None,
+) -> Tuple[str, int]:
+    """
+    发送前检查提示词长度
+    policy=truncate时截断超出上下文的部分，policy=reject时直接拒绝
+    返回 (处理后的提示词, 提示词token数)
+    """
+    limit = context_limit or MODEL_CONTEXT_LIMITS.get(model, DEFAULT_CONTEXT_LIMIT)
+    budget = limit - max_tokens
+    if budget <= 0:
+        raise HTTPException(
+            status_code=400,
+            detail=f"max_tokens ({max_tokens}) exceeds context window of {model} ({limit})"
+        )
+
+    prompt_tokens = count_tokens(prompt, model)
+    if prompt_tokens <= budget:
+        return prompt, prompt_tokens
+
+    if policy == "reject":
+        logger.warning(f"提示词超出上下文: {prompt_tokens} > {budget} ({model})")
+        raise HTTPException(
+            status_code=413,
+            detail=f"Prompt too long: {prompt_tokens} tokens exceeds budget of {budget} for {model}"
+        )
+
+    logger.warning(f"提示词超出上下文，已截断: {prompt_tokens} -> {budget} ({model})")
+    truncated = _truncate_to_tokens(prompt, model, budget)
+    return truncated, count_tokens(truncated, model)
+
+
+def fit_to_prompt(
+    text: str,
+    rest: str,
+    model: str,
+    max_tokens: int = 0,
+    context_limit: Optional[int] = None,
+) -> str:
+    """
+    只截断提示词中可变的长文本（如文档内容），说明和问题等其余部分rest保持完整
+    返回在上下文中能放下的文本；其余部分本身就超出时拒绝
+    """
+    limit = context_limit or MODEL_CONTEXT_LIMITS.get(model, DEFAULT_CONTEXT_LIMIT)
+    # 拼接处的分词可能与分别计数略有出入，留出少量余量
+    budget = limit - max_tokens - count_tokens(rest, model) - 16
+    if budget <= 0:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Prompt too long: instructions and question exceed the context window of {model} ({limit})"
+        )
+    text_tokens = count_tokens(text, model)
+    if text_tokens <= budget:
+        return text
+    logger.warning(f"文档内容超出上下文，已截断: {text_tokens} -> {budget} ({model})")
+    return _truncate_to_tokens(text, model, budget)
+
+
+class UsageTracker:
+    """按接口/模型聚合token用量，并批量写入SQLite（写入在后台线程中进行，不阻塞事件循环）"""
+
+    def __init__(self, batch_size: int = 50, flush_interval: float = 30.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[tuple] = []
+        self._totals = defaultdict(lambda: {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "latency_ms": 0.0,
+        })
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+
+    def record(
+        self,
+        endpoint: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_ms: float,
+    ):
+        """记录一次模型调用"""
+        row = (
+            endpoint,
+            model,
+            int(prompt_tokens),
+            int(completion_tokens),
+            float(latency_ms),
+            datetime.now().isoformat(),
+        )
+        with self._lock:
+            self._pending.append(row)
+            totals = self._totals[(endpoint, model)]
+            totals["requests"] += 1
+            totals["prompt_tokens"] += row[2]
+            totals["completion_tokens"] += row[3]
+            totals["latency_ms"] += row[4]
+            should_flush = len(self._pending) >= self.batch_size
+        if should_flush:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """攒满一批时交给后台刷新任务；事件循环中未启动后台任务时放到线程中写入，其他线程中直接写入"""
+        if self._task is not None and not self._task.done():
+            self._loop.call_soon_threadsafe(self._batch_ready.set)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        loop.run_in_executor(None, self.flush)
+
+    def record_local(self, endpoint: str, model: str, prompt: str, response: str, started_at: float):
+        """记录本地模型调用（无usage返回，按文本估算token）"""
+        self.record(
+            endpoint,
+            model,
+            count_tokens(prompt, model),
+            count_tokens(response or "", model),
+            (time.perf_counter() - started_at) * 1000,
+        )
+
+    def flush(self) -> int:
+        """将缓冲的记录批量写入数据库"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+        try:
+            with get_db() as conn:
+                conn.executemany('''
+                    INSERT INTO usage_records
+                    (endpoint, model, prompt_tokens, completion_tokens, latency_ms, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"写入用量记录失败: {str(e)}")
+            with self._lock:
+                self._pending = rows + self._pending
+            return 0
+        logger.debug(f"已写入 {len(rows)} 条用量记录")
+        return len(rows)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """当前进程内的聚合数据"""
+        with self._lock:
+            return [
+                {"endpoint": endpoint, "model": model, **totals}
+                for (endpoint, model), totals in self._totals.items()
+            ]
+
+    def rollup(self, since: Optional[str] = None, group_by: str = "endpoint") -> List[Dict[str, Any]]:
+        """按接口或模型汇总已持久化的用量"""
+        if group_by not in ("endpoint", "model", "endpoint_model"):
+            raise HTTPException(status_code=400, detail=f"Unsupported group_by: {group_by}")
+        self.flush()
+        columns = "endpoint, model" if group_by == "endpoint_model" else group_by
+        where, params = "", ()
+        if since:
+            where, params = "WHERE created_at >= ?", (since,)
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {columns},
+                       COUNT(*),
+                       SUM(prompt_tokens),
+                       SUM(completion_tokens),
+                       AVG(latency_ms),
+                       MAX(latency_ms)
+                FROM usage_records
+                {where}
+                GROUP BY {columns}
+                ORDER BY SUM(prompt_tokens) + SUM(completion_tokens) DESC
+            ''', params)
+            keys = columns.split(", ")
+            return [
+                {
+                    **dict(zip(keys, row[:len(keys)])),
+                    "requests": row[len(keys)],
+                    "prompt_tokens": row[len(keys) + 1],
+                    "completion_tokens": row[len(keys) + 2],
+                    "total_tokens": row[len(keys) + 1] + row[len(keys) + 2],
+                    "avg_latency_ms": round(row[len(keys) + 3], 1),
+                    "max_latency_ms": round(row[len(keys) + 4], 1),
+                }
+                for row in cursor.fetchall()
+            ]
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await asyncio.to_thread(self.flush)
+
+    def start(self):
+        """启动后台刷新任务：每隔flush_interval秒或攒满一批时写入"""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._batch_ready = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+# 单例实例
+usage_tracker = UsageTracker()
@@ -0,0 +1,135 @@
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+AGGREGATIONS = ("sum", "mean", "count")
+# 未指定聚合方式但需要聚合时（饼图、行数过多的柱状图）使用的方式
+DEFAULT_AGGREGATION = "sum"
+# 折线图默认保留的点数
+DEFAULT_MAX_POINTS = 1000
+# 柱状图最多显示的柱数，超过时自动聚合/分箱
+MAX_BARS = 50
+# 数值型X轴自动分箱的箱数
+DEFAULT_BINS = 30
+# 饼图最多显示的扇区数，其余合并为Other
+MAX_PIE_SLICES = 12
+
+
+def _is_numeric(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def _axis_values(series: pd.Series) -> np.ndarray:
+    """LTTB使用的X坐标：数值和日期取其值，其他类型按行序"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+    if _is_numeric(series):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.arange(len(series), dtype=np.float64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets降采样，返回保留点的下标（升序）
+    首尾点保留，中间按桶各取与相邻桶构成三角形面积最大的点；桶均值用前缀和一次算出
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    # 第j个桶为 [bounds[j], bounds[j+1])，最后一个桶只包含末尾点
+    bounds = np.append((np.arange(threshold - 1) * every).astype(np.int64) + 1, n)
+    bounds[-2] = n - 1
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = bounds[1:] - bounds[:-1]
+    avg_x = (cum_x[bounds[1:]] - cum_x[bounds[:-1]]) / sizes
+    avg_y = (cum_y[bounds[1:]] - cum_y[bounds[:-1]]) / sizes
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = a = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def aggregate(df: pd.DataFrame, x: str, y: str, how: str, bins: Optional[int] = None) -> pd.DataFrame:
+    """按X分组（可先对数值型X等宽分箱）聚合Y，结果按X排序"""
+    if how not in AGGREGATIONS:
+        raise ValueError(f"Unsupported aggregation: {how}")
+    keys = df[x]
+    if bins:
+        if not _is_numeric(keys):
+            raise ValueError(f"Column {x} must be numeric for binning")
+        keys = pd.cut(keys, bins=bins)
+    grouped = df[y].groupby(keys, observed=True, sort=True).agg(how)
+    result = pd.DataFrame({x: grouped.index, y: grouped.to_numpy()})
+    if bins:
+        result[x] = result[x].astype(str)
+    return result
+
+
+def downsample_line(df: pd.DataFrame, x: str, y: str, max_points: int) -> pd.DataFrame:
+    if len(df) <= max_points:
+        return df
+    values = df[y].to_numpy(dtype=np.float64, na_value=np.nan)
+    keep = lttb_indices(_axis_values(df[x]), values, max_points)
+    return df.iloc[keep]
+
+
+def top_categories(df: pd.DataFrame, x: str, y: str, limit: int, other: bool) -> pd.DataFrame:
+    """保留Y最大的limit个类别（保持原顺序）；other为True时其余合并为一项"""
+    if len(df) <= limit:
+        return df
+    keep = limit - 1 if other else limit
+    order = np.argsort(-df[y].to_numpy(dtype=np.float64, na_value=-np.inf), kind="stable")
+    top = df.iloc[np.sort(order[:keep])]
+    if not other:
+        return top
+    rest = df[y].iloc[order[keep:]].sum()
+    return pd.concat([top, pd.DataFrame({x: ["Other"], y: [rest]})], ignore_index=True)
+
+
+def prepare_chart_data(
+    df: pd.DataFrame,
+    chart_type: str,
+    x: str,
+    y: str,
+    aggregation: Optional[str] = None,
+    bins: Optional[int] = None,
+    max_points: Optional[int] = None,
+    x_distinct: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    绘图前把数据缩减到图表能显示的规模：
+    指定aggregation/bins时先分组聚合；折线图按X排序后用LTTB降采样到max_points；
+    饼图按X汇总并合并小扇区；柱状图超过MAX_BARS时自动聚合（数值型X先分箱）
+    x_distinct为数据集画像中X列的去重数，提供时不再重新计算
+    """
+    if aggregation == "none":
+        aggregation = None
+    grouped = bool(aggregation or bins)
+    if grouped:
+        df = aggregate(df, x, y, aggregation or DEFAULT_AGGREGATION, bins)
+
+    if chart_type == "line":
+        if not grouped and (_is_numeric(df[x]) or pd.api.types.is_datetime64_any_dtype(df[x])):
+            df = df.sort_values(x, kind="stable")
+        df = df.dropna(subset=[x, y])
+        return downsample_line(df, x, y, max_points or DEFAULT_MAX_POINTS)
+    if chart_type == "pie":
+        if not grouped:
+            df = aggregate(df, x, y, DEFAULT_AGGREGATION)
+        return top_categories(df, x, y, MAX_PIE_SLICES, other=True)
+    if chart_type == "bar":
+        if not grouped and len(df) > MAX_BARS:
+            distinct = x_distinct if x_distinct is not None else df[x].nunique()
+            auto_bins = DEFAULT_BINS if _is_numeric(df[x]) and distinct > MAX_BARS else None
+            df = aggregate(df, x, y, DEFAULT_AGGREGATION, auto_bins)
+        return top_categories(df, x, y, MAX_BARS, other=False)
+    return df
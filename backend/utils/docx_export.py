@@ -0,0 +1,105 @@
+import os
+import re
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Inches
+from fastapi.responses import StreamingResponse
+from utils.file_response import READ_CHUNK_SIZE, content_disposition
+
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# 生成的文档在内存中保留的上限，超过后转存到临时文件
+EXPORT_SPOOL_SIZE = int(os.getenv("EXPORT_SPOOL_SIZE", str(8 * 1024 * 1024)))
+
+
+def sanitize_xml(text: str) -> str:
+    # 移除控制字符（ASCII 0-31，除了换行和制表符）
+    cleaned = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]', '', text)
+    # 替换非法XML字符
+    return cleaned.encode('utf-8', 'ignore').decode('utf-8')
+
+
+def build_report(content: str, date: Optional[str] = None) -> Document:
+    """合规检查报告：标题、日期，缩进两格的行作为子项"""
+    doc = Document()
+
+    title = doc.add_heading('Compliance Check Report', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    date_paragraph = doc.add_paragraph()
+    date_paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    date_paragraph.add_run(date or datetime.now().strftime("%Y-%m-%d")).italic = True
+
+    for line in content.split('\n'):
+        if line.strip():
+            if line.startswith('  '):
+                p = doc.add_paragraph()
+                p.paragraph_format.left_indent = Inches(0.5)
+                p.add_run(line.strip())
+            else:
+                doc.add_paragraph(line)
+    return doc
+
+
+def build_chat_export(messages: List[Dict[str, Any]], document_text: str = "") -> Document:
+    """聊天记录导出（消息与文档内容先清洗非法XML字符）"""
+    doc = Document()
+    doc.add_heading('Chat Export', 0)
+
+    for msg in messages:
+        role = "User" if msg.get('isUser') else "AI"
+        doc.add_paragraph(f"{role}: {sanitize_xml(msg.get('content', 'No content'))}")
+
+    document_text = sanitize_xml(document_text)
+    if document_text.strip():
+        doc.add_heading('Current Document', 1)
+        doc.add_paragraph(document_text)
+    return doc
+
+
+def save_spooled(doc: Document) -> tempfile.SpooledTemporaryFile:
+    """保存到SpooledTemporaryFile（小文档只在内存中），返回已回到开头的文件对象，调用方负责关闭"""
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE, prefix=".export-")
+    try:
+        doc.save(spool)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+def spool_size(spool: tempfile.SpooledTemporaryFile) -> int:
+    position = spool.tell()
+    spool.seek(0, os.SEEK_END)
+    size = spool.tell()
+    spool.seek(position)
+    return size
+
+
+def iter_spooled(spool: tempfile.SpooledTemporaryFile, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """按块读出并在结束（或客户端断开）时关闭"""
+    try:
+        while True:
+            chunk = spool.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
+
+
+def spooled_response(spool: tempfile.SpooledTemporaryFile, filename: str,
+                     media_type: str = DOCX_MEDIA_TYPE) -> StreamingResponse:
+    """直接从临时文件流式返回，不再复制成bytes"""
+    return StreamingResponse(
+        iter_spooled(spool),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": content_disposition(filename),
+            "Content-Length": str(spool_size(spool)),
+        }
+    )
@@ -0,0 +1,142 @@
+import os
+import re
+import logging
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+import anyio
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# 每次读取的字节数（每块需一次线程切换，块太小时吞吐受限）
+READ_CHUNK_SIZE = 1024 * 1024
+
+EXPOSED_HEADERS = "Content-Disposition, Content-Range, Accept-Ranges, ETag, Last-Modified"
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class _FileResponse(FileResponse):
+    chunk_size = READ_CHUNK_SIZE
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """由修改时间和大小生成的强ETag，文件被覆盖后自动变化"""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def content_disposition(filename: str) -> str:
+    if filename.isascii():
+        return f'attachment; filename="{filename}"'
+    return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段Range请求头，返回闭区间 (start, end)
+    多段或格式错误时返回None（按完整文件响应），范围不可满足时抛出416
+    """
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # 后缀范围：最后N个字节
+        length = int(last)
+        if length == 0 or size == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match是否包含当前ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _not_modified(request: Request, etag: str, stat: os.stat_result) -> bool:
+    if request.headers.get("if-none-match") is not None:
+        return etag_matches(request, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _range_allowed(request: Request, etag: str, last_modified: str) -> bool:
+    """If-Range与当前版本不一致时忽略Range，返回完整文件"""
+    if_range = request.headers.get("if-range")
+    return if_range is None or if_range.strip() in (etag, last_modified)
+
+
+async def _iter_file_range(path: str, start: int, end: int):
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    filename: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    支持条件请求与断点续传的文件下载响应
+    完整文件交给FileResponse（支持pathsend的服务器可零拷贝发送），Range请求按块读取指定区间
+    """
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    response_headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+        "Access-Control-Expose-Headers": EXPOSED_HEADERS,
+        **(headers or {}),
+    }
+    if filename:
+        response_headers["Content-Disposition"] = content_disposition(filename)
+
+    if _not_modified(request, etag, stat):
+        return Response(status_code=304, headers={
+            k: v for k, v in response_headers.items() if k in ("ETag", "Last-Modified", "Access-Control-Expose-Headers")
+        })
+
+    range_header = request.headers.get("range")
+    if range_header and _range_allowed(request, etag, last_modified):
+        byte_range = parse_range(range_header, stat.st_size)
+        if byte_range is not None:
+            start, end = byte_range
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response_headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                _iter_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=response_headers
+            )
+
+    return _FileResponse(path, media_type=media_type, headers=response_headers, stat_result=stat)
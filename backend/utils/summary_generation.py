@@ -1,31 +1,156 @@
+import os
+import json
+import time
+import asyncio
 import logging
-from typing import Optional
+from functools import lru_cache
+from typing import List, Optional
 from langchain_community.chat_models import ChatOllama
+from artifact_cache import artifact_cache, SUMMARY_CHUNKS, SUMMARY_INPUT_TOKENS
+from upload_store import artifact_path
+from usage_tracking import OLLAMA_NUM_CTX, count_tokens, usage_tracker
 
 logger = logging.getLogger(__name__)
 
-async def generate_summary(text: str, max_length: Optional[int] = 500) -> str:
-    """生成文本摘要"""
-    try:
-        # 初始化 Ollama LLM
-        llm = ChatOllama(
-            model="mistral",
-            temperature=0.7
-        )
-        
-        # 构建提示词
-        prompt = f"""请为以下文本生成一个简短的摘要（不超过{max_length}字）：
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "mistral")
+# 同一文档同时进行的摘要请求数
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+# 中间层（片段/章节）摘要的长度
+PARTIAL_SUMMARY_LENGTH = 200
+
+CHUNK_PROMPT = """请概括以下文档片段的要点（不超过{max_length}字），保留关键数据、结论和术语：
+
+{text}
+
+要点："""
+
+SECTION_PROMPT = """以下是同一文档中连续若干部分的要点，请合并为一段连贯的摘要（不超过{max_length}字）：
+
+{text}
+
+摘要："""
+
+DOCUMENT_PROMPT = """请根据以下各部分的摘要，为整篇文档生成一个简短的摘要（不超过{max_length}字）：
 
 {text}
 
 摘要："""
-        
-        # 生成摘要
-        response = await llm.ainvoke({"content": prompt})
-        summary = response.content
-        
-        return summary.strip()
-        
+
+SINGLE_PROMPT = """请为以下文本生成一个简短的摘要（不超过{max_length}字）：
+
+{text}
+
+摘要："""
+
+
+@lru_cache(maxsize=8)
+def get_chat_model(model: str = SUMMARY_MODEL, temperature: float = 0.3) -> ChatOllama:
+    """按模型复用的ChatOllama实例"""
+    return ChatOllama(model=model, temperature=temperature, num_ctx=OLLAMA_NUM_CTX)
+
+
+async def _complete(prompt: str, model: str) -> str:
+    started_at = time.perf_counter()
+    response = await get_chat_model(model).ainvoke(prompt)
+    usage_tracker.record_local("ingestion:summarize", model, prompt, response.content, started_at)
+    return response.content.strip()
+
+
+def pack_groups(texts: List[str], model: str, budget: Optional[int] = None) -> List[List[str]]:
+    """按token预算把连续文本打包成组（每组至少一条）"""
+    budget = budget or SUMMARY_INPUT_TOKENS
+    groups, current, used = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text, model)
+        if current and used + tokens > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def split_to_budget(text: str, model: str, budget: Optional[int] = None) -> List[str]:
+    """超出token预算的文本在中点附近的换行/句末处对半拆分，直到每段都在预算内"""
+    budget = budget or SUMMARY_INPUT_TOKENS
+    if len(text) <= 1 or count_tokens(text, model) <= budget:
+        return [text]
+    middle = len(text) // 2
+    cut = max(text.rfind(separator, 0, middle) + len(separator) for separator in ("\n", "。", ". "))
+    if cut <= len(text) // 4:
+        cut = middle
+    return split_to_budget(text[:cut], model, budget) + split_to_budget(text[cut:], model, budget)
+
+
+async def hierarchical_summary(
+    chunks: List[str],
+    max_length: int = 500,
+    model: str = SUMMARY_MODEL,
+    concurrency: int = SUMMARY_CONCURRENCY,
+) -> str:
+    """
+    分层摘要：片段 → 章节 → 文档
+    片段摘要并行生成（受concurrency限制），再按token预算逐层合并，直到能一次生成全文摘要
+    """
+    # 分块按字符切分，token数取决于文字和分词器，超出预算的片段再拆分
+    chunks = [piece for c in chunks if c.strip() for piece in split_to_budget(c, model)]
+    if not chunks:
+        return ""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def summarize(template: str, text: str, length: int) -> str:
+        async with semaphore:
+            return await _complete(template.format(max_length=length, text=text), model)
+
+    # 全文放得下时直接一次生成
+    if len(pack_groups(chunks, model)) == 1:
+        return await summarize(SINGLE_PROMPT, "\n\n".join(chunks), max_length)
+
+    summaries = await asyncio.gather(*(summarize(CHUNK_PROMPT, c, PARTIAL_SUMMARY_LENGTH) for c in chunks))
+    level = 1
+    while True:
+        groups = pack_groups(summaries, model)
+        if len(groups) == 1 and count_tokens(groups[0][0], model) <= SUMMARY_INPUT_TOKENS:
+            return await summarize(DOCUMENT_PROMPT, "\n\n".join(summaries), max_length)
+        if len(groups) == len(summaries):
+            # 模型输出的摘要过长，两两之间已无法合并：截断到预算的一半，保证下一层能继续合并
+            logger.warning(f"摘要过长无法合并，截断到 {SUMMARY_INPUT_TOKENS // 2} tokens")
+            summaries = [split_to_budget(s, model, SUMMARY_INPUT_TOKENS // 2)[0] for s in summaries]
+            continue
+        level += 1
+        logger.info(f"摘要合并第 {level} 层: {len(summaries)} → {len(groups)}")
+        summaries = await asyncio.gather(*(
+            summarize(SECTION_PROMPT, "\n\n".join(group), PARTIAL_SUMMARY_LENGTH) for group in groups
+        ))
+
+
+async def summarize_document(
+    content_hash: str,
+    chunks: List[str],
+    max_length: int = 500,
+    model: str = SUMMARY_MODEL,
+) -> str:
+    """按内容哈希和模型缓存的文档摘要；失败时抛出异常，不缓存"""
+    cache_file = artifact_path(content_hash, f"summary-{model.replace(':', '_').replace('/', '_')}.json")
+    if cache_file.exists():
+        with open(cache_file, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("max_length") == max_length:
+            return cached["summary"]
+    summary = await hierarchical_summary(chunks, max_length=max_length, model=model)
+    with open(cache_file, "w", encoding="utf-8") as f:
+        json.dump({"model": model, "max_length": max_length, "summary": summary}, f, ensure_ascii=False)
+    return summary
+
+
+async def generate_summary(text: str, max_length: Optional[int] = 500, model: str = SUMMARY_MODEL) -> str:
+    """生成文本摘要（超长文本自动分层）"""
+    try:
+        chunks = artifact_cache.text_chunks(text, SUMMARY_CHUNKS).texts
+        return await hierarchical_summary(chunks, max_length=max_length, model=model)
+
     except Exception as e:
         logger.error(f"Summary generation failed: {str(e)}")
-        return "Failed to generate summary" 
\ No newline at end of file
+        return "Failed to generate summary"
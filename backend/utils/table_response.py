@@ -0,0 +1,127 @@
+import json
+import datetime
+import decimal
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pyarrow as pa
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+COLUMNS_JSON_TYPE = "application/vnd.dataset.columns+json"
+META_HEADER = "X-Dataset-Meta"
+
+# format查询参数 → 媒体类型；Accept头中的类型按此映射协商
+TABLE_FORMATS = {
+    "records": "application/json",
+    "columns": COLUMNS_JSON_TYPE,
+    "arrow": ARROW_STREAM_TYPE,
+}
+
+
+def negotiate_format(request: Request, explicit: Optional[str] = None) -> str:
+    """显式的format参数优先，其次按Accept头（忽略q值，按出现顺序）；默认records"""
+    if explicit:
+        if explicit not in TABLE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {explicit}")
+        return explicit
+    accepted = [item.split(";")[0].strip().lower() for item in request.headers.get("accept", "").split(",")]
+    for media_type in accepted:
+        for name, candidate in TABLE_FORMATS.items():
+            if media_type == candidate:
+                return name
+    return "records"
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def column_values(column: pa.ChunkedArray) -> List[Any]:
+    """
+    列转为Python列表：数值/布尔列经NumPy整体转换（比逐个单元格转换快一个数量级），空值为None
+    """
+    data_type = column.type
+    if not (pa.types.is_integer(data_type) or pa.types.is_floating(data_type) or pa.types.is_boolean(data_type)):
+        return column.to_pylist()
+    if pa.types.is_floating(data_type):
+        # 空值转为NaN；NaN和无穷值都不是合法JSON，统一输出为None
+        array = column.to_numpy()
+        missing = ~np.isfinite(array)
+    elif column.null_count:
+        array = column.fill_null(False if pa.types.is_boolean(data_type) else 0).to_numpy()
+        missing = column.is_null().to_numpy()
+    else:
+        return column.to_numpy().tolist()
+    values = array.tolist()
+    for i in np.flatnonzero(missing):
+        values[i] = None
+    return values
+
+
+def _dumps(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+class ChunkSink:
+    """收集流式写入的字节（Arrow IPC流、ZIP归档等），每写完一段取出一次"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _iter_arrow_stream(table: pa.Table, batch_rows: int = 64 * 1024):
+    sink = ChunkSink()
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            writer.write_batch(batch)
+            yield sink.take()
+    yield sink.take()
+
+
+def table_response(
+    table: pa.Table,
+    fmt: str,
+    meta: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    按协商的格式返回表格数据：
+    records  {...meta, "data": [{列: 值}, ...]}（默认，兼容旧客户端）
+    columns  {...meta, "data": {列: [值, ...]}}
+    arrow    Arrow IPC流，按批流式输出；meta放在 X-Dataset-Meta 响应头中
+    """
+    meta = meta or {}
+    headers = {"Vary": "Accept", **(headers or {})}
+    if fmt == "arrow":
+        # 列信息已在Arrow结构中，其余元数据以JSON放在响应头
+        scalars = {k: v for k, v in meta.items() if not isinstance(v, (list, dict))}
+        headers[META_HEADER] = json.dumps(scalars, separators=(",", ":"), default=_json_default)
+        return StreamingResponse(_iter_arrow_stream(table), media_type=ARROW_STREAM_TYPE, headers=headers)
+    columns = {name: column_values(table.column(name)) for name in table.column_names}
+    if fmt == "columns":
+        data = columns
+    else:
+        data = [dict(zip(columns, row)) for row in zip(*columns.values())] if columns else []
+    return Response(content=_dumps({**meta, "data": data}), media_type=TABLE_FORMATS[fmt], headers=headers)
@@ -1,37 +1,162 @@
 import io
+import os
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Union
 from pypdf import PdfReader
 from docx import Document
+from docx.table import Table
+from docx.text.paragraph import Paragraph
 from fastapi import HTTPException
-import logging
 
 logger = logging.getLogger(__name__)
 
-def extract_text(file_obj: io.BytesIO, filename: str) -> str:
-    """从文件中提取文本内容"""
+# 段落之间的分隔符，offset按此计算
+SEGMENT_SEPARATOR = "\n"
+
+# 每个子进程一次解析的PDF页数
+PDF_PAGES_PER_TASK = 16
+
+Source = Union[str, os.PathLike, bytes, io.IOBase]
+
+
+@dataclass
+class TextSegment:
+    """提取出的一段文本：PDF为一页，Word/TXT为一个段落"""
+    text: str
+    page: Optional[int]  # 从1开始的页码，非PDF为None
+    index: int           # 段落序号（从0开始）
+    offset: int          # 在全文中的字符偏移
+
+
+def parse_page_range(spec: Optional[str], page_count: int) -> List[int]:
+    """解析页码范围，如 "1-3,7"，返回从0开始的页索引"""
+    if not spec:
+        return list(range(page_count))
+    pages = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, dash, end = part.partition("-")
+        first = int(start) if start else 1
+        last = int(end) if end else (page_count if dash else first)
+        pages.extend(range(max(first, 1) - 1, min(last, page_count)))
+    return sorted(set(pages))
+
+
+@contextmanager
+def _open_binary(source: Source):
+    """打开二进制来源，仅关闭由本函数打开的文件"""
+    if isinstance(source, (bytes, bytearray)):
+        yield io.BytesIO(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield f
+    else:
+        yield source
+
+
+def _extract_pdf_pages(source: Union[str, bytes], pages: Sequence[int]) -> List[str]:
+    """子进程入口：独立打开PDF并提取指定页"""
+    with _open_binary(source) as stream:
+        reader = PdfReader(stream)
+        return [reader.pages[i].extract_text() or "" for i in pages]
+
+
+def _iter_pdf(source: Source, page_range: Optional[str], workers: int) -> Iterator[tuple]:
+    if workers > 1 and not isinstance(source, (str, os.PathLike, bytes, bytearray)):
+        # 子进程需要可序列化的来源
+        source = source.read()
+    with _open_binary(source) as stream:
+        reader = PdfReader(stream)
+        pages = parse_page_range(page_range, len(reader.pages))
+        if workers <= 1 or len(pages) <= PDF_PAGES_PER_TASK:
+            for i in pages:
+                yield i + 1, reader.pages[i].extract_text() or ""
+            return
+
+    # 多进程按页段并行解析，按原顺序产出
+    batches = [pages[i:i + PDF_PAGES_PER_TASK] for i in range(0, len(pages), PDF_PAGES_PER_TASK)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch, texts in zip(batches, executor.map(_extract_pdf_pages, [source] * len(batches), batches)):
+            for i, text in zip(batch, texts):
+                yield i + 1, text
+
+
+def _iter_docx(source: Source) -> Iterator[tuple]:
+    with _open_binary(source) as stream:
+        doc = Document(stream)
+    # 按正文顺序输出段落和表格（表格按行拼接单元格）
+    for child in doc.element.body.iterchildren():
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag == "p":
+            yield None, Paragraph(child, doc).text
+        elif tag == "tbl":
+            for row in Table(child, doc).rows:
+                cells = [cell.text.strip() for cell in row.cells]
+                # 合并单元格会重复出现，去重后拼接
+                yield None, " | ".join(dict.fromkeys(c for c in cells if c))
+
+
+def _iter_txt(source: Source, encoding: str) -> Iterator[tuple]:
+    with _open_binary(source) as stream:
+        reader = io.TextIOWrapper(stream, encoding=encoding, newline=None)
+        try:
+            for line in reader:
+                yield None, line.rstrip("\n")
+        finally:
+            reader.detach()
+
+
+def iter_segments(
+    source: Source,
+    filename: Optional[str] = None,
+    page_range: Optional[str] = None,
+    workers: int = 1,
+    skip_empty: bool = True,
+    encoding: str = "utf-8",
+) -> Iterator[TextSegment]:
+    """
+    统一的文本提取入口，逐段产出文本
+    source可以是文件路径、bytes或二进制文件对象；page_range仅对PDF有效
+    """
+    name = (filename or str(source)).lower()
+    if name.endswith('.pdf'):
+        raw = _iter_pdf(source, page_range, workers)
+    elif name.endswith(('.docx', '.doc')):
+        raw = _iter_docx(source)
+    elif name.endswith('.txt'):
+        raw = _iter_txt(source, encoding)
+    else:
+        raise ValueError(f"Unsupported file type: {filename or source}")
+
+    offset = 0
+    index = 0
+    for page, text in raw:
+        if skip_empty and not text.strip():
+            continue
+        yield TextSegment(text=text, page=page, index=index, offset=offset)
+        offset += len(text) + len(SEGMENT_SEPARATOR)
+        index += 1
+
+
+def join_segments(segments) -> str:
+    """线性时间拼接全文（与offset计算方式一致）"""
+    return SEGMENT_SEPARATOR.join(segment.text for segment in segments)
+
+
+def extract_text(file_obj: Source, filename: str, page_range: Optional[str] = None, workers: int = 1) -> str:
+    """从文件中提取文本内容（保留空段落/空行，段落之间的空行是分块和摘要依赖的边界）"""
     try:
-        if filename.lower().endswith('.pdf'):
-            # 处理PDF文件
-            reader = PdfReader(file_obj)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text()
-            return text
-            
-        elif filename.lower().endswith(('.docx', '.doc')):
-            # 处理Word文档
-            doc = Document(file_obj)
-            return "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            
-        elif filename.lower().endswith('.txt'):
-            # 处理文本文件
-            return file_obj.read().decode('utf-8')
-            
-        else:
-            raise ValueError(f"Unsupported file type: {filename}")
-            
+        return join_segments(
+            iter_segments(file_obj, filename, page_range=page_range, workers=workers, skip_empty=False)
+        )
     except Exception as e:
         logger.error(f"Text extraction failed for {filename}: {str(e)}")
         raise HTTPException(
             status_code=400,
             detail=f"Failed to extract text from {filename}: {str(e)}"
-        ) 
\ No newline at end of file
+        )
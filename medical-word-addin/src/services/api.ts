@@ -207,6 +207,52 @@ export const getTemplates = async (): Promise<Template[]> => {
   return response.data;
 };
 
+export interface DatasetQuery {
+  columns?: string[];
+  filters?: { column: string; op: string; value?: any }[];
+  sort?: { column: string; descending?: boolean }[];
+  limit?: number;
+  offset?: number;
+  cursor?: string;
+}
+
+export interface DatasetPage {
+  datasetId: string;
+  columns: string[];
+  data: Record<string, any>[];
+  total: number;
+  offset: number | null;
+  nextCursor: string | null;
+}
+
+export interface ColumnProfile {
+  name: string;
+  type: string;
+  kind: 'numeric' | 'temporal' | 'boolean' | 'string';
+  nulls: number;
+  min: any;
+  max: any;
+  distinct: number;
+  distinctExact: boolean;
+  numericRatio?: number;
+  histogram?: { edges: any[]; counts: number[] };
+  topValues?: { value: any; count: number }[];
+}
+
+export interface DatasetProfile {
+  datasetId: string;
+  rows: number;
+  columns: ColumnProfile[];
+}
+
+export interface ExportSpec {
+  type: 'report' | 'chat';
+  fileName?: string;
+  content?: string;
+  messages?: { isUser?: boolean; content: string }[];
+  documentText?: string;
+}
+
 // 导出整合后的API对象
 export const api = {
   // 基础方法
@@ -263,6 +309,24 @@ export const api = {
     }
   },
 
+  queryDataset: async (datasetId: string, query: DatasetQuery) => {
+    const response = await axiosInstance.post<DatasetPage>(`/api/datasets/${datasetId}/query`, query);
+    return response.data;
+  },
+
+  // 批量导出报告/聊天记录，返回ZIP
+  exportBulk: async (exports: ExportSpec[], archiveName?: string) => {
+    const response = await axiosInstance.post('/api/export-bulk', { exports, archiveName }, {
+      responseType: 'blob'
+    });
+    return response.data as Blob;
+  },
+
+  getDatasetProfile: async (datasetId: string) => {
+    const response = await axiosInstance.get<DatasetProfile>(`/api/datasets/${datasetId}/profile`);
+    return response.data;
+  },
+
   uploadDataset: async (formData: FormData) => {
     try {
       const response = await axiosInstance.post('/api/datasets/upload', formData, {
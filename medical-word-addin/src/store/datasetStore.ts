@@ -14,6 +14,9 @@ interface VisualizationConfig {
   xAxis?: string;
   yAxis?: string;
   grouping?: string;
+  aggregation?: 'none' | 'sum' | 'mean' | 'count';
+  bins?: number;
+  maxPoints?: number;
 }
 
 interface DatasetState {
@@ -40,14 +43,14 @@ export const useDatasetStore = create<DatasetState>((set) => ({
     }
     
     const response = await api.post('/api/generate-visualization', {
-      dataset: {
-        data: state.currentDataset.previewData,
-        columns: state.currentDataset.columns
-      },
+      datasetId: state.currentDataset.id,
       config: {
         chartType: state.visualizationConfig.chartType,
         xAxis: state.visualizationConfig.xAxis,
-        yAxis: state.visualizationConfig.yAxis
+        yAxis: state.visualizationConfig.yAxis,
+        aggregation: state.visualizationConfig.aggregation,
+        bins: state.visualizationConfig.bins,
+        maxPoints: state.visualizationConfig.maxPoints
       }
     });
     set({ generatedImage: response.data.image });
@@ -62,7 +65,9 @@ export const useDatasetStore = create<DatasetState>((set) => ({
       if (response.data) {
         set({ 
           currentDataset: {
+            id: response.data.datasetId,
             name: file.name,
+            type: 'table',
             columns: response.data.columns,
             previewData: response.data.preview
           }
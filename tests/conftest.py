@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# 后端模块以 backend/ 为根目录导入（与 uvicorn main:app 的启动方式一致）
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """将数据库重定向到临时文件"""
+    import database
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "test.db")
+    database.init_db()
+    return database.DB_PATH
@@ -0,0 +1,64 @@
+"""
+本地模拟的 Azure OpenAI 服务，用于测试批量生成的并发与重试逻辑
+
+也可以独立运行后将 AZURE_API_BASE 指向它：
+    uvicorn mock_azure_openai:app --port 9100
+提示词中的指令控制返回结果：
+    throttle:N  前N次请求返回429（附带Retry-After）
+    error:CODE  总是返回指定状态码
+"""
+import asyncio
+import re
+import time
+from collections import defaultdict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+app.state.attempts = defaultdict(int)
+app.state.in_flight = 0
+app.state.max_in_flight = 0
+app.state.latency = 0.01
+app.state.retry_after = "0"
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    app.state.attempts[prompt] += 1
+
+    app.state.in_flight += 1
+    app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+    try:
+        await asyncio.sleep(app.state.latency)
+    finally:
+        app.state.in_flight -= 1
+
+    throttle = re.search(r"throttle:(\d+)", prompt)
+    if throttle and app.state.attempts[prompt] <= int(throttle.group(1)):
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"code": "429", "message": "Rate limit exceeded"}},
+            headers={"Retry-After": app.state.retry_after},
+        )
+    error = re.search(r"error:(\d+)", prompt)
+    if error:
+        return JSONResponse(
+            status_code=int(error.group(1)),
+            content={"error": {"code": error.group(1), "message": "Mock failure"}},
+        )
+
+    return {
+        "id": f"chatcmpl-{app.state.attempts[prompt]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": f"echo: {prompt}"},
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
@@ -0,0 +1,68 @@
+import pytest
+
+pytest.importorskip("langchain")
+
+import artifact_cache as artifact_cache_module
+import upload_store
+from artifact_cache import ArtifactCache, ChunkConfig, read_records, write_records
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_store, "ARTIFACT_DIR", tmp_path / "artifacts")
+    return ArtifactCache(memory_size=2)
+
+
+def test_records_round_trip(tmp_path):
+    path = tmp_path / "records.bin"
+    write_records(path, ["第一页", "", "page three"], [1, None, 3])
+    records = read_records(path)
+    assert len(records) == 3
+    assert records.texts == ["第一页", "", "page three"]
+    assert [records.page(i) for i in range(3)] == [1, None, 3]
+
+
+def test_document_is_parsed_once_per_config(cache, tmp_path):
+    doc = tmp_path / "doc.txt"
+    doc.write_text("alpha beta gamma\n" * 200, encoding="utf-8")
+    content_hash = cache.hash_for_path(str(doc))
+
+    small = ChunkConfig(chunk_size=100, chunk_overlap=0)
+    first = cache.chunks(content_hash, str(doc), "doc.txt", config=small)
+    assert len(first) > 1 and all(first.page(i) is None for i in range(len(first)))
+
+    # 产物已落盘：新的缓存实例无需访问原文件
+    doc.unlink()
+    fresh = ArtifactCache()
+    assert fresh.chunks(content_hash, "missing.txt", "doc.txt", config=small).texts == first.texts
+    assert fresh.text(content_hash, "missing.txt", "doc.txt").startswith("alpha beta gamma")
+
+    # 不同的分块配置生成独立产物（基于已缓存的提取文本）
+    large = fresh.chunks(content_hash, "missing.txt", "doc.txt", config=ChunkConfig(chunk_size=1000, chunk_overlap=0))
+    assert len(large) < len(first)
+
+
+def test_text_chunks_are_keyed_by_content(cache):
+    config = ChunkConfig(chunk_size=50, chunk_overlap=0)
+    text = "lorem ipsum dolor sit amet " * 20
+    assert cache.text_chunks(text, config) is cache.text_chunks(text, config)
+    assert cache.text_chunks(text + "!", config) is not cache.text_chunks(text, config)
+    assert len(cache.text_chunks(text, config)) > 1
+    # 直接传入的文本不落盘，内存中按LRU淘汰
+    assert not upload_store.ARTIFACT_DIR.exists()
+    for i in range(3):
+        cache.text_chunks(f"revision {i}", config)
+    assert len(cache._memory) == 2
+    assert not cache._key_locks
+
+
+def test_path_hashes_are_bounded(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_cache_module, "PATH_HASH_CACHE_SIZE", 2)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(str(i))
+        paths.append(str(path))
+        cache.hash_for_path(str(path))
+    assert len(cache._path_hashes) == 2
+    assert cache.hash_for_path(paths[0]) == cache.hash_for_path(paths[0])
@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import pytest
+
+import mock_azure_openai
+from azure_model_service import AzureModelService
+
+
+@pytest.fixture
+def service(monkeypatch, temp_db):
+    monkeypatch.setenv("AZURE_API_KEY", "test-key")
+    monkeypatch.setenv("AZURE_API_BASE", "http://mock-azure")
+    mock_azure_openai.app.state.attempts.clear()
+    mock_azure_openai.app.state.max_in_flight = 0
+    service = AzureModelService(max_concurrency=3, max_retries=3, backoff_base=0.01)
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=mock_azure_openai.app),
+        base_url="http://mock-azure",
+    )
+    asyncio.run(service.initialize(http_client=client))
+    return service
+
+
+def test_batch_preserves_order_and_limits_concurrency(service):
+    prompts = [f"prompt {i}" for i in range(10)]
+    results = asyncio.run(service.generate_batch(prompts))
+
+    assert [r["index"] for r in results] == list(range(10))
+    assert [r["response"] for r in results] == [f"echo: prompt {i}" for i in range(10)]
+    assert mock_azure_openai.app.state.max_in_flight <= 3
+
+
+def test_batch_retries_throttled_requests(service):
+    results = asyncio.run(service.generate_batch(["throttle:2 a", "b"]))
+
+    assert results[0]["status"] == "success"
+    assert results[0]["attempts"] == 3
+    assert mock_azure_openai.app.state.attempts["throttle:2 a"] == 3
+
+
+def test_batch_reports_per_item_errors(service):
+    results = asyncio.run(service.generate_batch(["ok", "error:400", "throttle:9 x"]))
+
+    assert results[0]["status"] == "success"
+    assert results[1]["status"] == "error"
+    assert results[1]["error"]["status_code"] == 400
+    # 不可重试的错误只请求一次
+    assert mock_azure_openai.app.state.attempts["error:400"] == 1
+    assert results[2]["error"]["status_code"] == 429
+    assert mock_azure_openai.app.state.attempts["throttle:9 x"] == 4
+
+
+def test_concurrency_limit_is_shared_across_batches(service):
+    async def run():
+        return await asyncio.gather(
+            service.generate_batch([f"a {i}" for i in range(6)]),
+            service.generate_batch([f"b {i}" for i in range(6)], concurrency=2),
+            service.generate_response("single"),
+        )
+
+    first, second, single = asyncio.run(run())
+    assert all(r["status"] == "success" for r in first + second)
+    assert single["response"] == "echo: single"
+    # 两个批次和单条调用合计也不超过服务级上限
+    assert mock_azure_openai.app.state.max_in_flight <= 3
+
+
+def test_long_retry_after_fails_instead_of_retrying_early(service, monkeypatch):
+    monkeypatch.setattr(mock_azure_openai.app.state, "retry_after", "120")
+    results = asyncio.run(service.generate_batch(["throttle:1 wait"]))
+    assert results[0]["status"] == "error" and results[0]["error"]["status_code"] == 429
+    assert mock_azure_openai.app.state.attempts["throttle:1 wait"] == 1
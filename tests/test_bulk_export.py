@@ -0,0 +1,95 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+pytest.importorskip("docx")
+
+from docx import Document
+
+from bulk_export import ERRORS_ENTRY, BulkExporter, entry_names
+from export_store import ExportStore, chat_export_key
+
+
+@pytest.fixture
+def exporter(tmp_path):
+    exporter = BulkExporter(workers=2, store=ExportStore(export_dir=tmp_path / "exports", upload_dir=tmp_path))
+    yield exporter
+    exporter.shutdown()
+
+
+def collect(exporter, specs):
+    async def run():
+        return [chunk async for chunk in exporter.stream(specs)]
+    return asyncio.run(run())
+
+
+def report(content, fileName=None):
+    return {"type": "report", "content": content, "fileName": fileName, "messages": [],
+            "documentText": "No document content"}
+
+
+def chat(messages, documentText="doc", fileName=None):
+    return {"type": "chat", "content": None, "fileName": fileName, "messages": messages,
+            "documentText": documentText}
+
+
+def test_entry_names_are_unique_and_safe():
+    specs = [report("a", "../r.docx"), report("b", "r.docx"), chat([], fileName="ERRORS.txt"), chat([])]
+    assert entry_names(specs) == ["r.docx", "r (2).docx", "ERRORS.txt.docx", "004_ChatExport.docx"]
+
+
+def test_stream_builds_zip_in_chunks(exporter, tmp_path):
+    specs = [report(f"Finding {i}", f"report_{i}.docx") for i in range(5)]
+    specs.append(chat([{"isUser": True, "content": "hi"}], fileName="chat.docx"))
+    chunks = collect(exporter, specs)
+    assert len(chunks) > len(specs)
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.testzip() is None
+    assert sorted(archive.namelist()) == sorted([f"report_{i}.docx" for i in range(5)] + ["chat.docx"])
+    paragraphs = [p.text for p in Document(io.BytesIO(archive.read("report_3.docx"))).paragraphs]
+    assert paragraphs[-1] == "Finding 3"
+
+    # 报告的临时文件已删除，聊天导出保存为内容寻址文件供复用
+    key = chat_export_key(specs[-1]["messages"], "doc")
+    assert [p.name for p in (tmp_path / "exports").iterdir()] == [f"{key}.docx"]
+
+
+def test_reuses_stored_chat_exports(exporter):
+    messages = [{"isUser": False, "content": "stored"}]
+    exporter.store.put(chat_export_key(messages, "doc"), io.BytesIO(b"cached docx"))
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(collect(exporter, [chat(messages, fileName="c.docx")]))))
+    assert archive.read("c.docx") == b"cached docx"
+
+
+def test_failed_entries_are_listed(exporter):
+    specs = [report("ok", "ok.docx"), chat(["not a message"], fileName="bad.docx")]
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(collect(exporter, specs))))
+    assert sorted(archive.namelist()) == [ERRORS_ENTRY, "ok.docx"]
+    assert archive.read(ERRORS_ENTRY).decode().startswith("bad.docx: ")
+
+
+def test_rerenders_stored_export_deleted_before_open(exporter, monkeypatch):
+    messages = [{"isUser": True, "content": "race"}]
+    path = exporter.store.put(chat_export_key(messages, "doc"), io.BytesIO(b"stale"))
+    get = exporter.store.get
+
+    def get_then_prune(key, suffix=".docx"):
+        found = get(key, suffix)
+        path.unlink()
+        return found
+
+    monkeypatch.setattr(exporter.store, "get", get_then_prune)
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(collect(exporter, [chat(messages, fileName="c.docx")]))))
+    assert archive.namelist() == ["c.docx"]
+    assert [p.text for p in Document(io.BytesIO(archive.read("c.docx"))).paragraphs][1] == "User: race"
+
+
+def test_adopt_keeps_exports_in_use(tmp_path):
+    store = ExportStore(export_dir=tmp_path, upload_dir=tmp_path / "uploads", export_limit=150)
+    store.put("a", io.BytesIO(b"x" * 100))
+    (tmp_path / ".export-bulk-new.docx").write_bytes(b"y" * 100)
+    store.adopt("b", str(tmp_path / ".export-bulk-new.docx"), keep={"a.docx"})
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.docx", "b.docx"]
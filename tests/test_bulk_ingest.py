@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip("langchain_huggingface")
+pytest.importorskip("torch")
+pytest.importorskip("faiss")
+
+import bulk_ingest
+import upload_store
+from bulk_ingest import EmbeddingBatcher, StageTimer, iter_documents, prepare_document
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        return [[float(len(t))] for t in texts]
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch, temp_db):
+    monkeypatch.setattr(upload_store, "ARTIFACT_DIR", tmp_path / "artifacts")
+    root = tmp_path / "corpus"
+    (root / "nested").mkdir(parents=True)
+    for i in range(3):
+        (root / f"doc{i}.txt").write_text(f"document {i} " * 300, encoding="utf-8")
+    (root / "nested" / "copy.txt").write_text("document 0 " * 300, encoding="utf-8")
+    (root / "ignored.csv").write_text("a,b\n1,2\n")
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    return root, uploads
+
+
+def test_iter_documents_walks_supported_files(corpus):
+    root, _ = corpus
+    assert sorted(p.name for p in iter_documents(root)) == ["copy.txt", "doc0.txt", "doc1.txt", "doc2.txt"]
+
+
+def test_embeddings_are_batched_across_files(corpus, monkeypatch):
+    root, uploads = corpus
+    embeddings = FakeEmbeddings()
+    indexed = []
+    monkeypatch.setattr(bulk_ingest, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(bulk_ingest, "index_stage", lambda job: indexed.append((job["content_hash"], len(job["vectors"]))))
+
+    batcher = EmbeddingBatcher(batch_size=5, timer=StageTimer())
+    docs = [prepare_document(str(p), str(uploads)) for p in iter_documents(root)]
+    for doc in docs:
+        batcher.add(doc)
+    batcher.flush()
+
+    # 内容相同的文件只存储和索引一次
+    assert len({doc["content_hash"] for doc in docs}) == 3
+    assert len(list(uploads.iterdir())) == 3
+    assert sorted(h for h, _ in indexed) == sorted({doc["content_hash"] for doc in docs})
+    # 除最后一批外每批都是满的，且跨越多个文件
+    total_chunks = sum(n for _, n in indexed)
+    assert sum(embeddings.batches) == total_chunks
+    assert all(size == 5 for size in embeddings.batches[:-1])
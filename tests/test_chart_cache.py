@@ -0,0 +1,57 @@
+import os
+import asyncio
+
+import chart_cache as chart_cache_module
+from chart_cache import ChartCache, chart_key
+
+
+def test_chart_key_normalizes_config():
+    base = {"chartType": "bar", "xAxis": "site", "yAxis": "value"}
+    key = chart_key("d1", 1, base, "png")
+    assert chart_key("d1", 1, {**base, "bins": None, "aggregation": "none"}, "png") == key
+    assert chart_key("d1", 1, dict(reversed(list(base.items()))), "png") == key
+    assert chart_key("d1", 2, base, "png") != key
+    assert chart_key("d1", 1, base, "svg") != key
+    assert chart_key("d1", 1, {**base, "aggregation": "sum"}, "png") != key
+
+
+def test_byte_bounded_lru_spills_to_disk(tmp_path):
+    cache = ChartCache(max_bytes=10, directory=tmp_path)
+    cache.put("d1", "a", "png", b"x" * 6)
+    cache.put("d1", "b", "png", b"y" * 6)
+    # a被淘汰到磁盘，读取时重新载入内存
+    assert (tmp_path / "d1" / "a.png").read_bytes() == b"x" * 6
+    assert cache.get("d1", "a", "png") == b"x" * 6
+    assert cache.get("d1", "missing", "png") is None
+    cache.invalidate("d1")
+    assert cache.get("d1", "a", "png") is None and cache.get("d1", "b", "png") is None
+    assert not (tmp_path / "d1").exists()
+
+
+def test_concurrent_requests_render_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(chart_cache_module.upload_store, "ARTIFACT_DIR", tmp_path)
+    cache = ChartCache(max_bytes=1024)
+    calls = []
+
+    async def render():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return b"png"
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_render("d1", "k", "png", render) for _ in range(5)))
+
+    assert asyncio.run(main()) == [b"png"] * 5
+    assert len(calls) == 1
+    assert cache.directory == tmp_path / "charts"
+
+
+def test_spill_directory_is_capped(tmp_path):
+    cache = ChartCache(max_bytes=6, directory=tmp_path, spill_bytes=12)
+    for i, key in enumerate("abcde"):
+        cache.put("d1", key, "png", bytes([i]) * 6)
+        for n, path in enumerate(sorted((tmp_path / "d1").glob("*.png"))):
+            os.utime(path, (n, n))
+    # 溢出目录超出上限时删除最久未使用的图表，刚溢出的保留
+    spilled = sorted(p.name for p in (tmp_path / "d1").iterdir())
+    assert spilled == ["c.png", "d.png"]
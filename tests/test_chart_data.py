@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.chart_data import MAX_BARS, MAX_PIE_SLICES, aggregate, lttb_indices, prepare_chart_data
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(10000, dtype=float)
+    y = np.zeros_like(x)
+    y[4321] = 100.0
+    keep = lttb_indices(x, y, 100)
+    assert len(keep) == 100
+    assert keep[0] == 0 and keep[-1] == 9999
+    assert np.all(np.diff(keep) > 0)
+    assert 4321 in keep
+    assert list(lttb_indices(x[:50], y[:50], 100)) == list(range(50))
+
+
+def test_aggregate_and_binning():
+    df = pd.DataFrame({"site": ["a", "b", "a", "c"], "value": [1.0, 2.0, 3.0, 4.0]})
+    assert aggregate(df, "site", "value", "sum").to_dict("list") == {"site": ["a", "b", "c"], "value": [4.0, 2.0, 4.0]}
+    assert aggregate(df, "site", "value", "count")["value"].tolist() == [2, 1, 1]
+    binned = aggregate(pd.DataFrame({"age": [1, 2, 9, 10], "value": [1, 1, 1, 1]}), "age", "value", "sum", bins=2)
+    assert binned["value"].tolist() == [2, 2]
+    with pytest.raises(ValueError):
+        aggregate(df, "site", "value", "sum", bins=2)
+    with pytest.raises(ValueError):
+        aggregate(df, "site", "value", "median")
+
+
+def test_prepare_chart_data_bounds_output_size():
+    n = 100000
+    df = pd.DataFrame({"t": np.arange(n)[::-1], "v": np.random.default_rng(0).random(n),
+                       "subject": np.arange(n), "arm": np.arange(n) % 40})
+    line = prepare_chart_data(df, "line", "t", "v", max_points=500)
+    assert len(line) == 500 and line["t"].is_monotonic_increasing
+    assert len(prepare_chart_data(df, "bar", "subject", "v")) <= MAX_BARS
+    pie = prepare_chart_data(df, "pie", "arm", "v")
+    assert len(pie) == MAX_PIE_SLICES and pie["arm"].iloc[-1] == "Other"
+    assert pie["v"].sum() == pytest.approx(df["v"].sum())
+    mean = prepare_chart_data(df, "bar", "arm", "v", aggregation="mean")
+    assert len(mean) == 40
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+from chart_rendering import ChartRenderer, render_chart
+
+CONFIG = {"chartType": "line", "xAxis": "t", "yAxis": "v", "maxPoints": 200}
+
+
+@pytest.fixture
+def frame():
+    n = 5000
+    return pd.DataFrame({"t": np.arange(n), "v": np.sin(np.arange(n) / 50.0)})
+
+
+def test_concurrent_renders_are_identical(frame):
+    reference = render_chart(frame, CONFIG)
+    assert reference.startswith(b"\x89PNG")
+    renderer = ChartRenderer(workers=4)
+
+    async def main():
+        configs = [CONFIG, {**CONFIG, "chartType": "bar", "xAxis": "v", "yAxis": "t"}] * 8
+        return await asyncio.gather(*(renderer.run(render_chart, frame, c) for c in configs))
+
+    results = asyncio.run(main())
+    assert all(r == reference for r in results[::2])
+    assert len(set(results[1::2])) == 1 and results[1] != reference
+    pie = {"chartType": "pie", "xAxis": "t", "yAxis": "v"}
+    assert render_chart(frame.assign(v=frame["v"].abs()), pie, "svg").lstrip().startswith(b"<?xml")
+
+
+def test_invalid_data_raises_value_error(frame):
+    with pytest.raises(ValueError):
+        render_chart(frame.assign(v="text"), CONFIG)
+
+
+def test_timeout_and_queue_limit():
+    release = threading.Event()
+    renderer = ChartRenderer(workers=1, timeout=0.2, max_pending=1)
+
+    def slow():
+        release.wait(5)
+        return b"done"
+
+    async def main():
+        first = asyncio.ensure_future(renderer.run(slow))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(renderer.run(slow))
+        await asyncio.sleep(0.01)
+        # 一个在渲染、一个在排队，第三个直接拒绝
+        with pytest.raises(HTTPException) as busy:
+            await renderer.run(slow)
+        assert busy.value.status_code == 503
+        results = await asyncio.gather(first, second, return_exceptions=True)
+        release.set()
+        return results
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, HTTPException) and r.status_code == 504 for r in results)
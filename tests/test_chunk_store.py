@@ -0,0 +1,54 @@
+from array import array
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from chunk_store import CHUNK_RECORD, ChunkStore, ChunkStoreDocstore, IndexToDocstoreId
+
+HASH_A = "a" * 64
+HASH_B = "b" * 64
+
+
+def test_append_and_read_back(tmp_path):
+    store = ChunkStore(tmp_path)
+    first = store.append(HASH_A, [("第一段", 1), ("second chunk", 2)])
+    second = store.append(HASH_B, [("plain text", None)])
+    assert first == range(0, 2) and second == range(2, 3)
+    assert store.get(0) == ("第一段", 1, HASH_A)
+    assert store.get(2) == ("plain text", None, HASH_B)
+    # 同一内容只写入一次
+    assert store.append(HASH_A, [("ignored", None)]) == first
+    assert len(store) == 3
+
+
+def test_reopen_and_see_appends_from_other_instances(tmp_path):
+    writer = ChunkStore(tmp_path)
+    reader = ChunkStore(tmp_path)
+    writer.append(HASH_A, [("x" * 1000, None)] * 3)
+    assert reader.get(2)[0] == "x" * 1000
+    assert reader.document_ids(HASH_A) == range(0, 3)
+    assert ChunkStore(tmp_path).get(1) == ("x" * 1000, None, HASH_A)
+
+
+def test_partial_index_record_is_discarded(tmp_path):
+    store = ChunkStore(tmp_path)
+    store.append(HASH_A, [("one", None)])
+    with open(store.index_path, "ab") as f:
+        f.write(b"\x00" * (CHUNK_RECORD.size - 3))
+    reopened = ChunkStore(tmp_path)
+    assert reopened.append(HASH_B, [("two", 5)]) == range(1, 2)
+    assert reopened.get(1) == ("two", 5, HASH_B)
+
+
+def test_docstore_adapter(tmp_path):
+    store = ChunkStore(tmp_path)
+    store.append(HASH_A, [("alpha", 3), ("beta", 4)])
+    mapping = IndexToDocstoreId(array("Q", [1, 0]))
+    docstore = ChunkStoreDocstore(store)
+    doc = docstore.search(mapping[0])
+    assert doc.page_content == "beta" and doc.metadata == {"content_hash": HASH_A, "page": 4}
+    assert len(mapping) == 2
+    assert isinstance(docstore.search("99"), str)
+    # 只读：FAISS.add_texts 会因docstore不可写而报错，而不是写入后再失败
+    assert not hasattr(docstore, "add")
@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from dataset_profile import DistinctSketch, coercible_to_numeric, profile_parquet
+from dataset_registry import DatasetRegistry
+
+
+@pytest.fixture
+def parquet_path(tmp_path):
+    rng = np.random.default_rng(0)
+    rows = 50000
+    value = rng.normal(100, 15, rows)
+    value[::10] = np.nan
+    table = pa.table({
+        "id": np.arange(rows),
+        "value": pa.array(value, from_pandas=True),
+        "arm": rng.choice(["Placebo", "Low", "High"], rows),
+        "code": [str(i % 7) if i % 3 else "x" for i in range(rows)],
+        "visit_date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+    })
+    path = tmp_path / "data.parquet"
+    pq.write_table(table, path, row_group_size=8000)
+    return path
+
+
+def test_distinct_sketch_exact_and_estimate():
+    small = DistinctSketch()
+    small.add(np.array([1, 2, 2, 3]))
+    assert small.exact and small.estimate() == 3
+
+    large = DistinctSketch()
+    for chunk in np.array_split(np.arange(200000), 7):
+        large.add(chunk)
+    assert not large.exact
+    assert abs(large.estimate() - 200000) / 200000 < 0.1
+
+
+def test_profile_columns(parquet_path):
+    profile = profile_parquet(parquet_path)
+    assert profile["rows"] == 50000
+    columns = {c["name"]: c for c in profile["columns"]}
+
+    value = columns["value"]
+    assert value["kind"] == "numeric" and value["nulls"] == 5000
+    # 直方图覆盖全部非空值
+    assert sum(value["histogram"]["counts"]) == 45000
+    assert value["histogram"]["edges"][0] == value["min"]
+    assert value["histogram"]["edges"][-1] == pytest.approx(value["max"])
+
+    assert columns["id"]["min"] == 0 and columns["id"]["max"] == 49999
+    assert abs(columns["id"]["distinct"] - 50000) / 50000 < 0.1
+
+    arm = columns["arm"]
+    assert arm["kind"] == "string" and arm["distinct"] == 3 and arm["distinctExact"]
+    assert sorted(v["value"] for v in arm["topValues"]) == ["High", "Low", "Placebo"]
+    assert sum(v["count"] for v in arm["topValues"]) == 50000
+
+    # 约三分之一为"x"，其余可转为数值
+    assert 0.6 < columns["code"]["numericRatio"] < 0.7
+
+    visit_date = columns["visit_date"]
+    assert visit_date["kind"] == "temporal"
+    assert visit_date["histogram"]["edges"][0] == visit_date["min"]
+    assert sum(visit_date["histogram"]["counts"]) == 50000
+
+
+def test_profile_skips_non_finite_and_scans_all_rows(tmp_path):
+    rows = 30000
+    score = np.arange(rows, dtype=np.float64)
+    score[5], score[6], score[7] = np.inf, -np.inf, np.nan
+    table = pa.table({
+        "score": pa.array(score),
+        # 数值只出现在最后一个行组中
+        "late": ["n/a"] * 25000 + [str(i) for i in range(5000)],
+    })
+    path = tmp_path / "raw.parquet"
+    pq.write_table(table, path, row_group_size=12000)
+    columns = {c["name"]: c for c in profile_parquet(path)["columns"]}
+
+    score = columns["score"]
+    assert score["min"] == 0 and score["max"] == rows - 1
+    assert all(np.isfinite(score["histogram"]["edges"]))
+    assert sum(score["histogram"]["counts"]) == rows - 3
+    assert min(score["histogram"]["counts"]) >= 0
+
+    assert columns["late"]["numericRatio"] == pytest.approx(5000 / rows, abs=1e-4)
+    assert coercible_to_numeric(columns["late"])
+
+
+def test_coercible_to_numeric():
+    assert coercible_to_numeric(None)
+    assert coercible_to_numeric({"kind": "numeric"})
+    assert coercible_to_numeric({"kind": "temporal"})
+    assert coercible_to_numeric({"kind": "string", "numericRatio": 0.5})
+    assert not coercible_to_numeric({"kind": "string", "numericRatio": 0.0})
+
+
+def test_registry_stores_profile(tmp_path, temp_db):
+    registry = DatasetRegistry(tmp_path / "datasets")
+    csv_path = tmp_path / "data.csv"
+    csv_path.write_text("visit,value,label\n1,2.5,a\n2,,b\n3,4.0,a\n")
+    record = registry.register_csv(csv_path, "data.csv", "h" * 64)
+    profile_file = tmp_path / "datasets" / f"{record['id']}.profile.json"
+    assert profile_file.exists()
+
+    profile = registry.profile(record["id"])
+    assert profile["rows"] == 3
+    assert registry.column_profile(record["id"], "value")["nulls"] == 1
+    assert registry.column_profile(record["id"], "label")["topValues"][0] == {"value": "a", "count": 2}
+
+    # 旧数据集没有画像文件时首次访问生成
+    os.remove(profile_file)
+    assert registry.profile(record["id"]) == profile
+    assert profile_file.exists()
+
+    registry.delete(record["id"])
+    assert not profile_file.exists()
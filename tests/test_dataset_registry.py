@@ -0,0 +1,178 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import dataset_registry
+from dataset_registry import DatasetRegistry, write_csv_as_parquet
+
+CSV = "visit,value,label\n1,2.5,a\n2,inf,b\n3,,c\n4,7.0,NA\n"
+
+
+@pytest.fixture
+def registry(tmp_path, temp_db):
+    return DatasetRegistry(tmp_path / "datasets")
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text(CSV)
+    return path
+
+
+def test_register_csv_writes_parquet_and_catalog(registry, csv_path):
+    record = registry.register_csv(csv_path, "data.csv", "h" * 64)
+    assert record["row_count"] == 4 and record["column_count"] == 3
+    assert [f["name"] for f in record["schema"]] == ["visit", "value", "label"]
+    assert registry.get(record["id"])["schema"] == record["schema"]
+    assert [r["id"] for r in registry.list()] == [record["id"]]
+    # 相同内容复用已有数据集
+    assert registry.register_csv(csv_path, "copy.csv", "h" * 64)["id"] == record["id"]
+
+
+
+def test_concurrent_registration_of_same_content(registry, csv_path):
+    with ThreadPoolExecutor(4) as pool:
+        records = list(pool.map(lambda i: registry.register_csv(csv_path, f"{i}.csv", "h" * 64), range(4)))
+    # 并发导入相同内容只登记一次，多余的文件被清理
+    assert len({r["id"] for r in records}) == 1
+    assert len(registry.list()) == 1
+    assert [p.name for p in registry.directory.glob("*.parquet")] == [f"{records[0]['id']}.parquet"]
+
+def test_preview_and_projection(registry, csv_path):
+    dataset_id = registry.register_csv(csv_path, "data.csv", "h" * 64)["id"]
+    rows = registry.preview(dataset_id, 3)
+    # 无限值和缺失值都以null返回
+    assert rows == [
+        {"visit": 1, "value": 2.5, "label": "a"},
+        {"visit": 2, "value": None, "label": "b"},
+        {"visit": 3, "value": None, "label": "c"},
+    ]
+    table = registry.read(dataset_id, ["value"])
+    assert table.column_names == ["value"] and table.num_rows == 4
+    with pytest.raises(ValueError):
+        registry.read(dataset_id, ["missing"])
+
+
+def test_delete(registry, csv_path):
+    record = registry.register_csv(csv_path, "data.csv", "h" * 64)
+    assert registry.delete(record["id"])
+    assert registry.get(record["id"]) is None
+    assert not registry.delete(record["id"])
+    with pytest.raises(KeyError):
+        registry.read(record["id"])
+
+
+def test_streaming_import_widens_types_seen_after_sample(tmp_path, monkeypatch):
+    source = tmp_path / "big.csv"
+    lines = ["id,dose,site"] + [f"{i},{i % 7},s{i % 3}" for i in range(20000)]
+    lines += ["20000,2.5,s0", "20001,n/a,"]
+    source.write_text("\n".join(lines) + "\n")
+    monkeypatch.setattr(dataset_registry, "_block_size", lambda limit: 64 * 1024)
+    target = tmp_path / "out.parquet"
+
+    rows, schema = write_csv_as_parquet(source, target, sample_bytes=1024)
+    assert rows == 20002
+    # dose在样本中为整数，之后出现小数时放宽为浮点
+    assert str(schema.field("dose").type) == "double"
+    parquet = pq.ParquetFile(target)
+    assert parquet.metadata.num_row_groups > 1
+    tail = parquet.read().slice(20000).to_pylist()
+    assert tail == [{"id": 20000, "dose": 2.5, "site": "s0"}, {"id": 20001, "dose": None, "site": None}]
+
+
+def test_widening_several_columns_takes_one_extra_pass(tmp_path, monkeypatch):
+    source = tmp_path / "late.csv"
+    lines = ["id,dose,flag,site"] + [f"{i},{i % 7},{'true' if i % 2 else 'false'},{i % 3}" for i in range(20000)]
+    lines += ["20000,2.5,maybe,s0"]
+    source.write_text("\n".join(lines) + "\n")
+    monkeypatch.setattr(dataset_registry, "_block_size", lambda limit: 64 * 1024)
+    passes = []
+    open_csv = dataset_registry.pacsv.open_csv
+
+    def counting_open_csv(*args, **kwargs):
+        passes.append(kwargs["read_options"].block_size)
+        return open_csv(*args, **kwargs)
+
+    monkeypatch.setattr(dataset_registry.pacsv, "open_csv", counting_open_csv)
+    rows, schema = write_csv_as_parquet(source, tmp_path / "out.parquet", sample_bytes=1024)
+    assert rows == 20001
+    assert [str(field.type) for field in schema] == ["int64", "double", "string", "string"]
+    # 样本推断 + 首次导入 + 一遍类型检查 + 重新导入
+    assert len(passes) == 4
+
+
+def test_memory_limit_aborts_import(registry, csv_path):
+    with pytest.raises(MemoryError):
+        registry.register_csv(csv_path, "data.csv", "h" * 64, memory_limit=1)
+    assert registry.list() == []
+    assert list(registry.directory.iterdir()) == []
+
+
+def test_memory_limit_ignores_other_arrow_allocations(registry, csv_path):
+    # 进程中其他Arrow数据占用的内存不计入导入的上限
+    held = pa.allocate_buffer(96 * 1024 * 1024)
+    assert pa.total_allocated_bytes() > 64 * 1024 * 1024
+    record = registry.register_csv(csv_path, "data.csv", "h" * 64, memory_limit=64 * 1024 * 1024)
+    assert record["row_count"] == 4
+    del held
+
+
+@pytest.fixture
+def listing(registry, tmp_path, monkeypatch):
+    source = tmp_path / "listing.csv"
+    source.write_text("id,site,value\n" + "".join(f"{i},s{i % 4},{(i * 7919) % 1000}\n" for i in range(20000)))
+    monkeypatch.setattr(dataset_registry, "_block_size", lambda limit: 64 * 1024)
+    record = registry.register_csv(source, "listing.csv", "l" * 64)
+    assert pq.ParquetFile(record["path"]).metadata.num_row_groups > 2
+    return record["id"]
+
+
+def test_query_offset_and_cursor_pagination(registry, listing):
+    page = registry.query(listing, columns=["id"], offset=12345, limit=3)
+    assert page["table"].to_pydict() == {"id": [12345, 12346, 12347]}
+    assert page["total"] == 20000 and page["offset"] == 12345
+    following = registry.query(listing, columns=["id"], cursor=page["next_cursor"], limit=2)
+    assert following["table"].to_pydict() == {"id": [12348, 12349]}
+    assert registry.query(listing, offset=19999, limit=5)["next_cursor"] is None
+
+
+def test_query_filters_and_sort(registry, listing):
+    filters = [{"column": "site", "op": "eq", "value": "s1"}, {"column": "id", "op": "ge", "value": 10000}]
+    page = registry.query(listing, columns=["id", "site"], filters=filters, limit=2)
+    assert page["total"] == 2500
+    assert page["table"].to_pylist() == [{"id": 10001, "site": "s1"}, {"id": 10005, "site": "s1"}]
+    rows = []
+    cursor = None
+    while True:
+        result = registry.query(listing, columns=["id"], filters=filters, limit=1000, cursor=cursor)
+        rows += result["table"].column("id").to_pylist()
+        cursor = result["next_cursor"]
+        if cursor is None:
+            break
+    assert rows == list(range(10001, 20000, 4))
+
+    ordered = registry.query(listing, columns=["id"], sort=[("value", True), ("id", False)], limit=3, offset=1)
+    assert ordered["table"].column("id").to_pylist() == [1321, 2321, 3321]
+    assert registry.query(listing, columns=["id"], sort=[("value", True), ("id", False)], limit=2,
+                          cursor=ordered["next_cursor"])["table"].column("id").to_pylist() == [4321, 5321]
+
+
+def test_query_rejects_bad_input(registry, listing):
+    with pytest.raises(ValueError):
+        registry.query(listing, columns=["missing"])
+    with pytest.raises(ValueError):
+        registry.query(listing, filters=[{"column": "id", "op": "in", "value": 3}])
+    with pytest.raises(ValueError):
+        registry.query(listing, cursor="bogus")
+    # 过滤值与列类型不符
+    with pytest.raises(ValueError):
+        registry.query(listing, filters=[{"column": "id", "op": "eq", "value": "abc"}])
+    with pytest.raises(ValueError):
+        registry.query(listing, filters=[{"column": "id", "op": "in", "value": [1, "x"]}])
+    with pytest.raises(ValueError):
+        registry.query(listing, filters=[{"column": "id", "op": "contains", "value": "1"}])
+    with pytest.raises(ValueError):
+        registry.query(listing, filters=[{"column": "id", "op": "gt"}])
@@ -0,0 +1,50 @@
+from document_catalog import document_catalog
+
+
+def add(doc_id, upload_time, content_hash="h1", doc_type="document", origin="upload"):
+    return document_catalog.add({
+        "id": doc_id,
+        "filename": f"{doc_id}.pdf",
+        "content_hash": content_hash,
+        "blob": f"{content_hash}.pdf",
+        "file_size": 10,
+        "type": doc_type,
+        "origin": origin,
+        "upload_time": upload_time,
+    })
+
+
+def test_cursor_pagination_is_stable_and_filtered(temp_db):
+    for i in range(7):
+        add(f"doc-{i}", f"2024-01-0{i + 1}T00:00:00", content_hash=f"h{i}",
+            doc_type="report" if i % 2 else "document")
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = document_catalog.list_page(limit=3, cursor=cursor)
+        seen.extend(r["id"] for r in page)
+        if cursor is None:
+            break
+    assert seen == [f"doc-{i}" for i in reversed(range(7))]
+
+    reports, _ = document_catalog.list_page(doc_type="report")
+    assert [r["id"] for r in reports] == ["doc-5", "doc-3", "doc-1"]
+
+
+def test_unbounded_listing_returns_everything(temp_db):
+    for i in range(60):
+        add(f"doc-{i:02d}", f"2024-01-01T00:00:{i:02d}", content_hash=f"h{i}")
+    items, cursor = document_catalog.list_page(limit=None)
+    assert len(items) == 60 and cursor is None
+
+
+def test_status_is_shared_by_hash_and_delete_counts_references(temp_db):
+    add("a", "2024-01-01T00:00:00")
+    add("b", "2024-01-02T00:00:00")
+    document_catalog.update_status("h1", extracted=True, summary="short")
+
+    assert document_catalog.get("b")["extracted"] is True
+    assert document_catalog.get("a")["summary"] == "short"
+    assert document_catalog.delete("a") == 1
+    assert document_catalog.delete("b") == 0
+    assert document_catalog.get("b") is None
@@ -0,0 +1,102 @@
+import io
+import os
+import time
+
+import pytest
+
+pytest.importorskip("docx")
+
+from docx import Document
+
+from document_catalog import document_catalog
+from export_store import ExportStore, export_key, prune_directory
+from utils.docx_export import build_chat_export, build_report, iter_spooled, save_spooled
+
+
+def write(path, size, age=0):
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_prune_directory_ttl_cap_and_keep(tmp_path):
+    write(tmp_path / "expired.docx", 10, age=7200)
+    write(tmp_path / "old.docx", 100, age=600)
+    write(tmp_path / "new.docx", 100, age=60)
+    write(tmp_path / "kept.pdf", 100, age=9000)
+    write(tmp_path / ".DS_Store", 10, age=9000)
+    write(tmp_path / ".export-abc.tmp", 10, age=7200)
+    write(tmp_path / ".upload-live", 10, age=10)
+
+    removed, freed = prune_directory(tmp_path, max_bytes=250, ttl=3600, keep={"kept.pdf"})
+    # 过期文件和过期临时文件先删除，其后超出上限时删除最旧的old.docx
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".DS_Store", ".upload-live", "kept.pdf", "new.docx"]
+    assert removed == 3 and freed == 120
+
+
+def test_prune_directory_never_removes_kept_files(tmp_path):
+    write(tmp_path / "source.pdf", 500)
+    assert prune_directory(tmp_path, max_bytes=100, keep={"source.pdf"}) == (0, 0)
+    assert (tmp_path / "source.pdf").exists()
+
+
+def test_export_key_is_content_addressed():
+    payload = {"messages": [[True, "hi"]], "documentText": "doc"}
+    assert export_key("chat", payload) == export_key("chat", dict(reversed(payload.items())))
+    assert export_key("chat", payload) != export_key("report", payload)
+
+
+def test_store_reuses_exports_and_refreshes_mtime(tmp_path):
+    store = ExportStore(export_dir=tmp_path / "exports", upload_dir=tmp_path / "uploads")
+    assert store.get("k") is None
+    path = store.put("k", io.BytesIO(b"docx bytes"))
+    assert path.read_bytes() == b"docx bytes"
+    old = time.time() - 3600
+    os.utime(path, (old, old))
+    assert store.get("k") == path
+    assert path.stat().st_mtime > old + 1800
+    # 不留下临时文件
+    assert [p.name for p in (tmp_path / "exports").iterdir()] == ["k.docx"]
+
+
+def test_put_enforces_export_limit(tmp_path):
+    store = ExportStore(export_dir=tmp_path / "exports", upload_dir=tmp_path / "uploads", export_limit=150)
+    first = store.put("a", io.BytesIO(b"x" * 100))
+    old = time.time() - 60
+    os.utime(first, (old, old))
+    second = store.put("b", io.BytesIO(b"y" * 100))
+    assert not first.exists() and second.exists()
+
+
+def test_cleanup_keeps_catalogued_uploads(tmp_path, temp_db):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    write(uploads / "source.pdf", 100, age=9000)
+    write(uploads / "translated_abc.docx", 100, age=9000)
+    document_catalog.add({
+        "id": "source", "filename": "source.pdf", "content_hash": "h" * 64,
+        "blob": "source.pdf", "file_size": 100, "upload_time": "2024-01-01T00:00:00",
+    })
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    write(exports / "stale.docx", 10, age=7200)
+
+    store = ExportStore(export_dir=exports, upload_dir=uploads, ttl=3600, upload_limit=150)
+    assert store.cleanup() == {"exports": 1, "uploads": 1, "freed_bytes": 110}
+    assert [p.name for p in uploads.iterdir()] == ["source.pdf"]
+
+
+def test_spooled_documents_round_trip():
+    spool = save_spooled(build_report("Finding\n  detail\n\n"))
+    data = b"".join(iter_spooled(spool, chunk_size=1024))
+    assert spool.closed
+    paragraphs = [p.text for p in Document(io.BytesIO(data)).paragraphs]
+    assert paragraphs[0] == "Compliance Check Report"
+    assert paragraphs[-2:] == ["Finding", "detail"]
+
+    spool = save_spooled(build_chat_export(
+        [{"isUser": True, "content": "hi\x00"}, {"content": "hello"}], "doc text"
+    ))
+    paragraphs = [p.text for p in Document(spool).paragraphs]
+    assert paragraphs == ["Chat Export", "User: hi", "AI: hello", "Current Document", "doc text"]
@@ -0,0 +1,64 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from utils.file_response import file_response, parse_range
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "translated_abc.txt"
+    path.write_bytes(bytes(range(256)) * 40)
+    app = FastAPI()
+
+    @app.get("/downloads/{filename}")
+    async def download(filename: str, request: Request):
+        return file_response(request, str(tmp_path / filename), "text/plain", filename=filename)
+
+    return TestClient(app), path.read_bytes()
+
+
+def test_full_download_has_validators(client):
+    client, content = client
+    response = client.get("/downloads/translated_abc.txt")
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] and response.headers["last-modified"]
+    assert response.headers["content-disposition"] == 'attachment; filename="translated_abc.txt"'
+
+
+def test_if_none_match_returns_304(client):
+    client, _ = client
+    etag = client.get("/downloads/translated_abc.txt").headers["etag"]
+    response = client.get("/downloads/translated_abc.txt", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/downloads/translated_abc.txt", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_range_requests(client):
+    client, content = client
+    response = client.get("/downloads/translated_abc.txt", headers={"Range": "bytes=100-1099"})
+    assert response.status_code == 206
+    assert response.content == content[100:1100]
+    assert response.headers["content-range"] == f"bytes 100-1099/{len(content)}"
+
+    tail = client.get("/downloads/translated_abc.txt", headers={"Range": "bytes=-10"})
+    assert tail.status_code == 206 and tail.content == content[-10:]
+
+    # If-Range与当前版本不一致时返回完整文件
+    stale = client.get("/downloads/translated_abc.txt", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert stale.status_code == 200 and stale.content == content
+
+    unsatisfiable = client.get("/downloads/translated_abc.txt", headers={"Range": f"bytes={len(content)}-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(content)}"
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-", 10) == (0, 9)
+    assert parse_range("bytes=5-100", 10) == (5, 9)
+    assert parse_range("bytes=-100", 10) == (0, 9)
+    # 多段范围按完整文件处理
+    assert parse_range("bytes=0-1,4-5", 10) is None
@@ -0,0 +1,220 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_huggingface")
+pytest.importorskip("faiss")
+
+from langchain_core.embeddings import Embeddings
+
+import ingestion_pipeline as ingestion_pipeline_module
+import upload_store
+from chunk_store import get_chunk_store
+from database import get_db
+from document_catalog import document_catalog
+from ingestion_pipeline import IngestionPipeline, Stage, index_stage, load_vectorstore, retrieve_chunks
+from upload_store import artifact_path
+
+
+class Recorder:
+    """记录各阶段的调用；gate未放行前embed阶段阻塞，用于检查处理中的状态"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = set()
+
+    def sync_stage(self, name):
+        def run(job):
+            if name == "embed":
+                self.gate.wait(5)
+            if name in self.fail:
+                raise RuntimeError("boom")
+            self.calls.append((name, job["content_hash"]))
+        return run
+
+    def async_stage(self, name):
+        async def run(job):
+            self.calls.append((name, job["content_hash"]))
+        return run
+
+
+@pytest.fixture
+def pipeline(temp_db):
+    recorder = Recorder()
+    stages = [
+        Stage("extract", recorder.sync_stage("extract"), 2, "extracted"),
+        Stage("embed", recorder.sync_stage("embed"), 1),
+        Stage("index", recorder.sync_stage("index"), 1, "vectorized"),
+        Stage("summarize", recorder.async_stage("summarize"), 1, "analyzed"),
+    ]
+    pipeline = IngestionPipeline(stages)
+    pipeline.recorder = recorder
+    yield pipeline
+    pipeline.shutdown()
+
+
+def add_document(content_hash, tmp_path):
+    path = tmp_path / f"{content_hash}.txt"
+    path.write_text("text")
+    document_catalog.add({
+        "id": content_hash, "filename": path.name, "content_hash": content_hash,
+        "blob": path.name, "file_size": 4, "upload_time": "2024-01-01T00:00:00",
+    })
+    return str(path)
+
+
+async def drain(pipeline):
+    while pipeline._tasks:
+        await asyncio.gather(*list(pipeline._tasks.values()))
+
+
+def test_submit_runs_stages_in_order(pipeline, tmp_path):
+    path = add_document("a", tmp_path)
+
+    async def run():
+        job = pipeline.submit("a", path, "a.txt")
+        assert job["status"] == "queued" and job["stage"] == "extract"
+        await drain(pipeline)
+
+    asyncio.run(run())
+    assert pipeline.recorder.calls == [("extract", "a"), ("embed", "a"), ("index", "a"), ("summarize", "a")]
+    job = pipeline.get_job("a")
+    assert job["status"] == "done" and job["progress"] == 1.0 and job["finished_at"]
+    record = document_catalog.find_by_hash("a")[0]
+    assert record["extracted"] and record["vectorized"] and record["analyzed"]
+
+
+def test_resubmission_is_idempotent(pipeline, tmp_path):
+    path = add_document("a", tmp_path)
+    pipeline.recorder.gate.clear()
+
+    async def run():
+        pipeline.submit("a", path, "a.txt")
+        await asyncio.sleep(0.05)
+        # 处理中重复提交返回当前状态，不再启动新任务
+        running = pipeline.submit("a", path, "a.txt")
+        assert running["status"] == "running" and running["stage"] == "embed"
+        assert len(pipeline._tasks) == 1
+        pipeline.recorder.gate.set()
+        await drain(pipeline)
+        # 已完成的内容不重复处理，force时重新处理
+        assert pipeline.submit("a", path, "a.txt")["status"] == "done"
+        assert not pipeline._tasks
+        pipeline.submit("a", path, "a.txt", force=True)
+        await drain(pipeline)
+
+    asyncio.run(run())
+    assert [name for name, _ in pipeline.recorder.calls].count("extract") == 2
+
+
+def test_failed_stage_is_recorded(pipeline, tmp_path):
+    path = add_document("a", tmp_path)
+    pipeline.recorder.fail.add("index")
+
+    async def run():
+        pipeline.submit("a", path, "a.txt")
+        await drain(pipeline)
+
+    asyncio.run(run())
+    job = pipeline.get_job("a")
+    assert job["status"] == "failed" and job["stage"] == "index" and job["error"] == "index: boom"
+    assert ("summarize", "a") not in pipeline.recorder.calls
+    record = document_catalog.find_by_hash("a")[0]
+    assert record["extracted"] and not record["vectorized"]
+
+
+def test_resume_picks_up_unfinished_jobs(pipeline, tmp_path):
+    path = add_document("a", tmp_path)
+    with get_db() as conn:
+        conn.executemany(
+            "INSERT INTO ingestion_jobs (content_hash, path, filename, stage, status) VALUES (?, ?, ?, ?, ?)",
+            [("a", path, "a.txt", "index", "running"),
+             ("gone", str(tmp_path / "missing.txt"), "missing.txt", "extract", "queued")]
+        )
+        conn.commit()
+
+    async def run():
+        pipeline.resume()
+        await drain(pipeline)
+
+    asyncio.run(run())
+    assert pipeline.get_job("a")["status"] == "done"
+    # 原文件已不存在的任务不恢复
+    assert pipeline.get_job("gone")["status"] == "queued"
+    assert {content_hash for _, content_hash in pipeline.recorder.calls} == {"a"}
+
+
+def test_stats(pipeline, tmp_path):
+    paths = {content_hash: add_document(content_hash, tmp_path) for content_hash in ("a", "b")}
+
+    async def run():
+        for content_hash, path in paths.items():
+            pipeline.submit(content_hash, path, f"{content_hash}.txt")
+        assert pipeline.stats()["active"] == 2
+        await drain(pipeline)
+
+    asyncio.run(run())
+    stats = pipeline.stats()
+    assert stats["active"] == 0 and stats["completed"] == 2
+    assert stats["docs_per_minute"] > 0 and stats["avg_doc_seconds"] is not None
+    assert stats["stages"]["extract"]["workers"] == 2
+    assert all(stage["runs"] == 2 for stage in stats["stages"].values())
+
+
+class KeywordEmbeddings(Embeddings):
+    """按关键词出现次数构造向量"""
+    WORDS = ("aspirin", "insulin", "placebo")
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(text.count(word)) for word in self.WORDS]
+
+
+@pytest.fixture
+def artifacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_store, "ARTIFACT_DIR", tmp_path / "artifacts")
+    monkeypatch.setattr(ingestion_pipeline_module, "get_embeddings", KeywordEmbeddings)
+    get_chunk_store.cache_clear()
+    yield
+    get_chunk_store.cache_clear()
+
+
+def index_job(content_hash, texts):
+    chunks = [{"text": text, "page": i + 1} for i, text in enumerate(texts)]
+    return {"content_hash": content_hash, "chunks": chunks, "vectors": KeywordEmbeddings().embed_documents(texts)}
+
+
+def test_index_stage_and_load_vectorstore(artifacts):
+    content_hash = "c" * 64
+    assert load_vectorstore(content_hash) is None
+    index_stage(index_job(content_hash, ["aspirin dose", "insulin dose", "placebo arm"]))
+    index_dir = artifact_path(content_hash, "faiss")
+    assert sorted(p.name for p in index_dir.iterdir()) == ["ids.bin", "index.faiss"]
+    assert not index_dir.with_name("faiss.tmp").exists()
+    # 已有索引时直接跳过
+    index_stage({"content_hash": content_hash})
+
+    hits = load_vectorstore(content_hash).similarity_search("insulin", k=1)
+    assert hits[0].page_content == "insulin dose"
+    assert hits[0].metadata == {"content_hash": content_hash, "page": 2}
+    assert [doc.page_content for doc in retrieve_chunks(content_hash, "placebo", k=1)] == ["placebo arm"]
+
+
+def test_indexes_share_the_chunk_store(artifacts):
+    index_stage(index_job("a" * 64, ["aspirin only"]))
+    index_stage(index_job("b" * 64, ["insulin only", "placebo only"]))
+    assert [doc.page_content for doc in retrieve_chunks("b" * 64, "placebo", k=1)] == ["placebo only"]
+    assert [doc.page_content for doc in retrieve_chunks("a" * 64, "placebo", k=5)] == ["aspirin only"]
+
+
+def test_empty_document_has_no_vectorstore(artifacts):
+    content_hash = "e" * 64
+    index_stage(index_job(content_hash, []))
+    assert (artifact_path(content_hash, "faiss") / "ids.bin").exists()
+    assert load_vectorstore(content_hash) is None
+    assert retrieve_chunks(content_hash, "aspirin") is None
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+import model_pool as model_pool_module
+from model_pool import ModelPool, PooledModel
+
+GB = 1024 ** 3
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = ModelPool(memory_budget_bytes=10 * GB, max_workers=1, idle_seconds=60)
+    sizes = {"small": 3 * GB, "medium": 4 * GB, "large": 6 * GB}
+    loads = []
+
+    def fake_load(model_name, device):
+        # 加载时已腾出的空间须能容纳新模型
+        loads.append((model_name, pool.used_bytes))
+        return PooledModel(model=None, tokenizer=None, generator=None, size_bytes=sizes[model_name])
+
+    monkeypatch.setattr(pool, "_load", fake_load)
+    monkeypatch.setattr(model_pool_module, "estimate_model_bytes", lambda name: sizes[name])
+    pool.loads = loads
+    yield pool
+    pool.shutdown()
+
+
+def use(pool, name):
+    pool.release(pool.acquire(name, "cpu"))
+
+
+def test_cached_models_are_reused(pool):
+    use(pool, "small")
+    use(pool, "small")
+    assert [name for name, _ in pool.loads] == ["small"]
+
+
+def test_lru_eviction_happens_before_loading(pool):
+    use(pool, "small")
+    use(pool, "medium")
+    use(pool, "small")  # small变为最近使用
+    use(pool, "large")
+    # 淘汰最久未使用的medium，且在加载large之前完成（加载期间large的估算大小已预占）
+    assert pool.loads[-1] == ("large", 9 * GB)
+    assert [m["model"] for m in pool.stats()["models"]] == ["small", "large"]
+    assert pool.stats()["used_bytes"] <= pool.memory_budget_bytes
+
+
+def test_models_in_use_are_not_evicted(pool):
+    held = pool.acquire("medium", "cpu")
+    use(pool, "small")
+    use(pool, "large")
+    models = {m["model"]: m["in_use"] for m in pool.stats()["models"]}
+    assert models == {"medium": 1, "large": 0}
+    pool.release(held)
+    assert pool.stats()["models"][0]["in_use"] == 0
+
+
+def test_refcount_tracks_concurrent_users(pool):
+    first = pool.acquire("small", "cpu")
+    second = pool.acquire("small", "cpu")
+    assert first is second and first.in_use == 2
+    pool.release(first)
+    pool.release(second)
+    assert first.in_use == 0
+
+
+def test_idle_models_are_unloaded(pool):
+    held = pool.acquire("small", "cpu")
+    use(pool, "medium")
+
+    now = pool._models[("medium", "cpu")].last_used + 61
+    assert pool.unload_idle(now=now) == 1
+    # 仍在使用的模型不卸载
+    assert [m["model"] for m in pool.stats()["models"]] == ["small"]
+    pool.release(held)
+
+
+def test_concurrent_loads_reserve_their_estimates(pool, monkeypatch):
+    use(pool, "small")
+    load = pool._load
+    large_loading = threading.Event()
+
+    def slow_load(model_name, device):
+        if model_name == "medium":
+            # medium加载期间开始加载large，large须把medium的预占计入预算
+            large_loading.wait(5)
+        else:
+            large_loading.set()
+        return load(model_name, device)
+
+    monkeypatch.setattr(pool, "_load", slow_load)
+    threads = [threading.Thread(target=use, args=(pool, name)) for name in ("medium", "large")]
+    threads[0].start()
+    while ("medium", "cpu") not in pool._reserved:
+        time.sleep(0.001)
+    threads[1].start()
+    for thread in threads:
+        thread.join(5)
+    assert all(used <= pool.memory_budget_bytes for _, used in pool.loads)
+    assert sorted(m["model"] for m in pool.stats()["models"]) == ["large", "medium"]
+    assert not pool._reserved
+
+
+def test_idle_task_unloads_models(pool, monkeypatch):
+    monkeypatch.setattr(model_pool_module, "LOCAL_MODEL_IDLE_CHECK_SECONDS", 0.01)
+    pool.idle_seconds = 0.01
+    use(pool, "small")
+
+    async def run():
+        pool.start()
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert pool.stats()["models"] == []
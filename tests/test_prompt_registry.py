@@ -0,0 +1,67 @@
+import json
+
+from prompt_registry import CompiledTemplate, PromptRegistry
+from database import get_db
+
+PREDEFINED = [{
+    "id": "csr-generation",
+    "title": "CSR",
+    "content": "Instructions.\n\nContent: {text}",
+    "modelType": "generation",
+}]
+
+
+def insert_prompt(prompt_id, content):
+    with get_db() as conn:
+        conn.execute(
+            "INSERT INTO prompts (id, title, content, model_type, scope, task, templates, created_at) "
+            "VALUES (?, ?, ?, 'generation', 'team', NULL, ?, '2024-01-01')",
+            (prompt_id, prompt_id, content, json.dumps([])),
+        )
+        conn.commit()
+
+
+def test_compiled_template_keeps_unknown_braces():
+    template = CompiledTemplate('Return JSON like {"a": 1} for {text} ({lang})')
+    assert template.placeholders == ["text", "lang"]
+    assert template.render(text="X") == 'Return JSON like {"a": 1} for X ({lang})'
+
+
+def test_registry_indexes_predefined_and_user_prompts(temp_db):
+    insert_prompt("user-1", "Summarize {text}")
+    registry = PromptRegistry()
+    registry.load(PREDEFINED)
+
+    assert registry.render("csr-generation", text="abc").endswith("Content: abc")
+    assert registry.render("user-1", text="abc") == "Summarize abc"
+    listing = registry.list_prompts()
+    assert [p["id"] for p in listing["defaultPrompts"]] == ["csr-generation"]
+    assert [p["id"] for p in listing["userPrompts"]] == ["user-1"]
+
+
+def test_registry_write_through_refresh_and_remove(temp_db):
+    registry = PromptRegistry()
+    registry.load(PREDEFINED)
+
+    insert_prompt("user-2", "Translate {text}")
+    registry.refresh("user-2")
+    assert registry.render("user-2", text="hi") == "Translate hi"
+
+    with get_db() as conn:
+        conn.execute("DELETE FROM prompts WHERE id = 'user-2'")
+        conn.commit()
+    registry.refresh("user-2")
+    assert registry.get("user-2") is None
+
+    registry.remove("csr-generation")  # 预定义模板不可删除
+    assert registry.get("csr-generation") is not None
+
+
+def test_user_prompts_render_in_original_order(temp_db):
+    content = "Translate the document below into English.\n\nDocument:\n{text}\n\nReturn only the translation."
+    insert_prompt("user-3", content)
+    registry = PromptRegistry()
+    registry.load(PREDEFINED)
+
+    assert registry.render("user-3", text="DOC") == content.replace("{text}", "DOC")
+    assert registry.render("csr-generation", text="DOC") == "Instructions.\n\nContent: DOC"
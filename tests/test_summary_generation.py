@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+import upload_store
+from utils import summary_generation
+from utils.summary_generation import hierarchical_summary, pack_groups, summarize_document
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """记录每次调用的提示词，返回固定长度的摘要"""
+    calls = []
+
+    async def complete(prompt, model):
+        calls.append(prompt)
+        return f"summary-{len(calls)}"
+
+    monkeypatch.setattr(summary_generation, "_complete", complete)
+    monkeypatch.setattr(summary_generation, "count_tokens", lambda text, model: len(text))
+    return calls
+
+
+def test_pack_groups_respects_budget(fake_llm):
+    groups = pack_groups(["a" * 4, "b" * 4, "c" * 4, "d" * 20], "mistral", budget=10)
+    assert groups == [["a" * 4, "b" * 4], ["c" * 4], ["d" * 20]]
+
+
+def test_short_text_uses_single_call(fake_llm):
+    assert asyncio.run(hierarchical_summary(["short text"])) == "summary-1"
+    assert len(fake_llm) == 1
+
+
+def test_long_text_is_summarized_in_levels(fake_llm, monkeypatch):
+    monkeypatch.setattr(summary_generation, "SUMMARY_INPUT_TOKENS", 25)
+    chunks = [f"chunk {i} " * 3 for i in range(6)]
+    result = asyncio.run(hierarchical_summary(chunks, concurrency=2))
+    # 6个片段摘要 + 至少一层合并 + 最终文档摘要
+    assert result == f"summary-{len(fake_llm)}"
+    assert len(fake_llm) > len(chunks) + 1
+    assert all(f"chunk {i}" in "".join(fake_llm[:6]) for i in range(6))
+
+
+def test_summary_is_cached_per_hash_and_model(fake_llm, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_store, "ARTIFACT_DIR", tmp_path)
+    first = asyncio.run(summarize_document("ab" * 32, ["some text"], model="mistral"))
+    again = asyncio.run(summarize_document("ab" * 32, ["some text"], model="mistral"))
+    other = asyncio.run(summarize_document("ab" * 32, ["some text"], model="llama3.2-vision:11b"))
+    assert first == again == "summary-1"
+    assert other == "summary-2"
+    assert len(fake_llm) == 2
+
+
+def test_cjk_prompts_stay_within_token_budget(monkeypatch):
+    """中文按一个字一个token计数：超长片段先拆分，过长的中间摘要截断后继续合并"""
+    budget = 300
+    monkeypatch.setattr(summary_generation, "SUMMARY_INPUT_TOKENS", budget)
+    inputs = []
+
+    async def complete(prompt, model):
+        text = prompt.split("\n\n", 1)[1].rsplit("\n\n", 1)[0]
+        inputs.append(summary_generation.count_tokens(text, model))
+        # 模拟不遵守长度要求的模型：每次都返回接近预算的摘要
+        return "摘" * (budget - 20)
+
+    monkeypatch.setattr(summary_generation, "_complete", complete)
+    chunks = ["临床试验结果显示疗效显著。" * 100, "安全性良好，未见严重不良事件。\n" * 60]
+    result = asyncio.run(hierarchical_summary(chunks, model="mistral"))
+
+    assert result == "摘" * (budget - 20)
+    assert len(inputs) > 4
+    assert max(inputs) <= budget
+
+
+def test_split_to_budget_prefers_sentence_boundaries():
+    text = "第一句。" * 50 + "第二段。" * 50
+    pieces = summary_generation.split_to_budget(text, "mistral", budget=120)
+    assert "".join(pieces) == text
+    assert all(summary_generation.count_tokens(p, "mistral") <= 120 for p in pieces)
+    assert all(p.endswith("。") for p in pieces)
@@ -0,0 +1,56 @@
+import asyncio
+import datetime
+import json
+
+import pyarrow as pa
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from utils.table_response import ARROW_STREAM_TYPE, COLUMNS_JSON_TYPE, META_HEADER, negotiate_format, table_response
+
+TABLE = pa.table({
+    "id": [1, 2, None],
+    "value": [1.5, float("nan"), None],
+    "arm": ["A", None, "B"],
+    "day": [datetime.date(2024, 1, 1), None, datetime.date(2024, 1, 3)],
+})
+
+
+def request(accept: str = "") -> Request:
+    return Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+
+
+def test_negotiate_format():
+    assert negotiate_format(request()) == "records"
+    assert negotiate_format(request("text/html, */*")) == "records"
+    assert negotiate_format(request(f"{ARROW_STREAM_TYPE}, application/json;q=0.5")) == "arrow"
+    assert negotiate_format(request(COLUMNS_JSON_TYPE)) == "columns"
+    assert negotiate_format(request(ARROW_STREAM_TYPE), "records") == "records"
+    with pytest.raises(HTTPException):
+        negotiate_format(request(), "xml")
+
+
+def test_json_layouts():
+    records = json.loads(table_response(TABLE, "records", {"total": 3}).body)
+    assert records["total"] == 3
+    assert records["data"][1] == {"id": 2, "value": None, "arm": None, "day": None}
+    assert records["data"][0]["day"] == "2024-01-01"
+    response = table_response(TABLE, "columns", {"total": 3})
+    assert response.media_type == COLUMNS_JSON_TYPE
+    assert json.loads(response.body)["data"] == {
+        "id": [1, 2, None], "value": [1.5, None, None], "arm": ["A", None, "B"],
+        "day": ["2024-01-01", None, "2024-01-03"],
+    }
+
+
+def test_arrow_stream_round_trip():
+    response = table_response(TABLE, "arrow", {"total": 3, "columns": ["id"], "nextCursor": None})
+    assert json.loads(response.headers[META_HEADER]) == {"total": 3, "nextCursor": None}
+
+    async def collect():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    result = pa.ipc.open_stream(asyncio.run(collect())).read_all()
+    assert result.schema == TABLE.schema
+    assert result.column("arm").to_pylist() == ["A", None, "B"]
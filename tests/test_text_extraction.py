@@ -0,0 +1,51 @@
+import io
+
+from docx import Document
+
+from utils.text_extraction import extract_text, iter_segments, join_segments, parse_page_range
+
+
+def make_docx():
+    doc = Document()
+    doc.add_paragraph("Introduction")
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "Dose"
+    table.cell(0, 1).text = "AUC"
+    table.cell(1, 0).text = "10 mg"
+    table.cell(1, 1).text = "42"
+    doc.add_paragraph("")
+    doc.add_paragraph("Conclusion")
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def test_docx_segments_follow_body_order_with_offsets():
+    segments = list(iter_segments(make_docx(), "report.docx"))
+    text = join_segments(segments)
+
+    assert [s.text for s in segments] == ["Introduction", "Dose | AUC", "10 mg | 42", "Conclusion"]
+    assert all(text[s.offset:s.offset + len(s.text)] == s.text for s in segments)
+    assert all(s.page is None for s in segments)
+
+
+def test_txt_extraction_keeps_paragraph_breaks():
+    content = "line one\n\nline two\n".encode("utf-8")
+    assert extract_text(io.BytesIO(content), "notes.txt") == "line one\n\nline two"
+
+
+def test_docx_paragraphs_round_trip_with_blank_line():
+    doc = Document()
+    doc.add_paragraph("First paragraph.")
+    doc.add_paragraph("")
+    doc.add_paragraph("Second paragraph.")
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    assert extract_text(io.BytesIO(buffer.getvalue()), "two.docx") == "First paragraph.\n\nSecond paragraph."
+
+
+def test_parse_page_range():
+    assert parse_page_range(None, 3) == [0, 1, 2]
+    assert parse_page_range("2-3, 5", 10) == [1, 2, 4]
+    assert parse_page_range("8-", 10) == [7, 8, 9]
+    assert parse_page_range("4-20", 5) == [3, 4]
@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+
+import pytest
+from fastapi import HTTPException, Request
+
+from upload_store import CHUNK_SIZE, PDF_MAGIC, spool_request_upload, store_upload
+
+
+BOUNDARY = "testboundary"
+
+
+def multipart_body(content: bytes, filename: str, field: str = "file") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="note"\r\n\r\nhello\r\n'
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def streaming_request(body: bytes, chunk_size: int = 64 * 1024):
+    """按块推送请求体（不带Content-Length），记录已被读取的块数"""
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    state = {"sent": 0}
+
+    async def receive():
+        i = state["sent"]
+        state["sent"] += 1
+        return {"type": "http.request", "body": chunks[i], "more_body": i + 1 < len(chunks)}
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/upload",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+    }
+    return Request(scope, receive), state, len(chunks)
+
+
+def test_spool_request_upload_parses_stream(tmp_path):
+    content = PDF_MAGIC + b"1.7\n" + b"z" * (CHUNK_SIZE + 5)
+    request, _, _ = streaming_request(multipart_body(content, "报告.pdf"))
+    spooled = asyncio.run(spool_request_upload(request, spool_dir=tmp_path, magic=PDF_MAGIC))
+    try:
+        assert spooled.filename == "报告.pdf"
+        assert spooled.content_hash == hashlib.sha256(content).hexdigest()
+        assert spooled.path.read_bytes() == content
+    finally:
+        spooled.path.unlink()
+
+
+def test_spool_request_upload_rejects_before_reading_the_rest(tmp_path):
+    request, state, total = streaming_request(multipart_body(b"x" * (4 * 1024 * 1024), "big.csv"))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(spool_request_upload(request, spool_dir=tmp_path, max_size=1024 * 1024))
+    assert exc.value.status_code == 413
+    assert state["sent"] < total / 2
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spool_request_upload_checks_filename_and_field(tmp_path):
+    def only_pdf(filename):
+        if not filename.endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="只支持PDF文件")
+
+    request, state, total = streaming_request(multipart_body(b"a,b\n" * 100000, "data.csv"))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(spool_request_upload(request, spool_dir=tmp_path, check_filename=only_pdf))
+    assert exc.value.detail == "只支持PDF文件" and state["sent"] == 1
+
+    request, _, _ = streaming_request(multipart_body(b"data", "a.pdf", field="other"))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(spool_request_upload(request, spool_dir=tmp_path))
+    assert exc.value.status_code == 400
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_store_upload_is_content_addressed_and_deduplicated(tmp_path):
+    content = b"%PDF-1.4 " + b"x" * (3 * 1024 * 1024)
+    first = asyncio.run(store_upload(streaming_request(multipart_body(content, "Protocol.PDF"))[0], tmp_path))
+    second = asyncio.run(store_upload(streaming_request(multipart_body(content, "copy of protocol.pdf"))[0], tmp_path))
+
+    expected = hashlib.sha256(content).hexdigest()
+    assert first.content_hash == expected
+    assert first.path.name == f"{expected}.pdf"
+    assert first.size == len(content) and first.filename == "Protocol.PDF"
+    assert not first.existed
+    assert second.existed and second.path == first.path
+    # 临时文件不会残留
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"{expected}.pdf"]
+
+
+def test_store_upload_rejects_oversized_stream(tmp_path):
+    request, state, total = streaming_request(multipart_body(b"x" * (4 * 1024 * 1024), "big.pdf"))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(store_upload(request, tmp_path, max_size=1024 * 1024))
+    assert exc.value.status_code == 413 and state["sent"] < total / 2
+    assert list(tmp_path.iterdir()) == []
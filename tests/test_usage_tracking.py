@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from usage_tracking import UsageTracker, count_tokens, fit_to_prompt, preflight
+
+
+def test_count_tokens_estimates_cjk_per_character():
+    assert count_tokens("") == 0
+    assert count_tokens("临床研究报告", "mistral") >= 6
+
+
+def test_preflight_truncates_to_budget():
+    prompt = "word " * 5000
+    truncated, tokens = preflight(prompt, "mistral", max_tokens=100, context_limit=1000)
+    assert tokens <= 900
+    assert prompt.startswith(truncated)
+
+
+def test_preflight_rejects_when_requested():
+    with pytest.raises(HTTPException) as exc:
+        preflight("word " * 5000, "mistral", policy="reject", context_limit=1000)
+    assert exc.value.status_code == 413
+
+
+def test_fit_to_prompt_keeps_the_question():
+    document = "文献内容。" * 3000
+    rest = "说明\n\n医学文献内容：\n\n\n用户问题：这项研究的主要终点是什么？\n"
+    fitted = fit_to_prompt(document, rest, "mistral", context_limit=1000)
+    assert document.startswith(fitted) and len(fitted) < len(document)
+    prompt = rest.replace("医学文献内容：\n", "医学文献内容：\n" + fitted)
+    # 截断后的完整提示词不会再被preflight截断，问题仍在结尾
+    assert preflight(prompt, "mistral", context_limit=1000)[0] == prompt
+    assert fit_to_prompt("短文", rest, "mistral", context_limit=1000) == "短文"
+    with pytest.raises(HTTPException) as exc:
+        fit_to_prompt(document, rest * 200, "mistral", context_limit=1000)
+    assert exc.value.status_code == 413
+
+
+def test_usage_is_batched_and_rolled_up(temp_db):
+    tracker = UsageTracker(batch_size=3)
+    tracker.record("/api/qa", "mistral", 10, 5, 120.0)
+    tracker.record("/api/qa", "mistral", 20, 5, 80.0)
+    assert tracker._pending  # 未达到批量阈值前不落库
+    tracker.record("/api/generate", "gpt-4o", 100, 50, 300.0)
+    assert not tracker._pending
+
+    rollups = {r["endpoint"]: r for r in tracker.rollup()}
+    assert rollups["/api/qa"]["requests"] == 2
+    assert rollups["/api/qa"]["total_tokens"] == 40
+    assert rollups["/api/generate"]["avg_latency_ms"] == 300.0
+    assert list(rollups) == ["/api/generate", "/api/qa"]
+
+
+def test_full_batch_is_written_off_the_event_loop(temp_db, monkeypatch):
+    tracker = UsageTracker(batch_size=2, flush_interval=60)
+    flushed = []
+    flush = tracker.flush
+
+    def recording_flush():
+        flushed.append(threading.current_thread() is threading.main_thread())
+        return flush()
+
+    monkeypatch.setattr(tracker, "flush", recording_flush)
+
+    async def run():
+        tracker.start()
+        tracker.record("/api/qa", "mistral", 10, 5, 1.0)
+        tracker.record("/api/qa", "mistral", 10, 5, 1.0)
+        # 攒满一批时只通知后台任务，不在事件循环中写库
+        assert flushed == [] and len(tracker._pending) == 2
+        for _ in range(100):
+            if not tracker._pending:
+                break
+            await asyncio.sleep(0.01)
+        assert not tracker._pending
+        await tracker.stop()
+
+    asyncio.run(run())
+    assert flushed and not any(flushed)
+    assert tracker.rollup()[0]["requests"] == 2
+
+
+def test_full_batch_without_flusher_uses_a_thread(temp_db):
+    tracker = UsageTracker(batch_size=1)
+
+    async def run():
+        tracker.record("/api/qa", "mistral", 10, 5, 1.0)
+        for _ in range(100):
+            if not tracker._pending:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert not tracker._pending
+    assert tracker.rollup()[0]["requests"] == 1